@@ -2,6 +2,9 @@
 ASGI config for core project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Served this way (e.g. ``uvicorn core.asgi:application``), the
+``graphql/async/`` endpoint executes queries without tying up a thread per
+request, and websocket connections to ``graphql/`` receive subscriptions.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
@@ -13,4 +16,9 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once Django is set up, as it loads the schema
+from core.subscriptions import GraphQLWebSocketApp  # noqa: E402
+
+application = GraphQLWebSocketApp(django_application)
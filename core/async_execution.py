@@ -0,0 +1,62 @@
+"""
+Resolver dispatch for the asynchronous GraphQL endpoint.
+
+graphql-core's executor awaits every field whose resolver returns an
+awaitable and resolves the sibling fields of a selection concurrently, but
+Django's sync ORM must not run on the event loop. ``AsyncBridgeMiddleware``
+picks, for each field, one of:
+
+* the type's ``aresolve_<field>`` coroutine, written against Django's async
+  ORM, when there is one;
+* the regular resolver in the request's sync thread (``sync_to_async``) when
+  it may query the database, i.e. root fields and anything on a model
+  instance other than a plain column. All bridged calls of a request share
+  that one thread, so they share one connection and the batch loaders never
+  run concurrently;
+* the regular resolver inline otherwise (columns, connection edges...).
+"""
+from functools import lru_cache
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Model
+from graphene.utils.str_converters import to_snake_case
+
+
+@lru_cache(maxsize=None)
+def is_column(model, name):
+    """Return whether ``name`` is a non-relational column of ``model``."""
+    try:
+        field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return False
+    return field.concrete and not field.is_relation
+
+
+snake_case = lru_cache(maxsize=None)(to_snake_case)
+
+
+def async_resolver(graphene_type, field_name):
+    """Return the ``aresolve_`` coroutine of a field, or ``None``."""
+    return getattr(graphene_type, f'aresolve_{snake_case(field_name)}', None)
+
+
+class AsyncBridgeMiddleware:
+    """
+    Graphene middleware making every resolver safe on the event loop.
+
+    It must be the innermost middleware (first in the list), so that ``next``
+    is the field's own resolver.
+    """
+
+    def resolve(self, next, root, info, **args):
+        graphene_type = getattr(info.parent_type, 'graphene_type', None)
+        resolver = async_resolver(graphene_type, info.field_name)
+        if resolver is not None:
+            return resolver(root, info, **args)
+        if root is None or (
+            isinstance(root, Model)
+            and not is_column(type(root), snake_case(info.field_name))
+        ):
+            return sync_to_async(next)(root, info, **args)
+        return next(root, info, **args)
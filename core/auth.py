@@ -0,0 +1,220 @@
+"""
+JWT authentication done once per request.
+
+graphql_jwt's middleware runs for every resolved field and, until a user is
+set, calls ``authenticate`` again, which decodes the token and loads the
+user. Here the token is checked at most once per request by
+``authenticate_request``, which remembers the user (or the error) on the
+request; ``JSONWebTokenMiddleware`` only calls it for root fields and lets
+every other field through untouched.
+
+Across requests, ``CachedJSONWebTokenBackend`` keeps a bounded, short-lived
+map of verified token to user snapshot, so a client sending the same token
+again skips decoding and the user query. Entries never outlive the token's
+``exp`` and are dropped on commit when the user is saved, deleted, followed
+or logged out (``forget_user``). The map is per process; ``TIMEOUT`` bounds
+how long another process may serve a stale user.
+"""
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.db import transaction
+from graphql_jwt.backends import JSONWebTokenBackend
+from graphql_jwt.exceptions import JSONWebTokenError
+from graphql_jwt.middleware import (
+    JSONWebTokenMiddleware as BaseJSONWebTokenMiddleware,
+)
+from graphql_jwt.settings import jwt_settings
+from graphql_jwt.utils import (
+    get_credentials, get_http_authorization, get_payload, get_user_by_payload,
+)
+
+DEFAULTS = {
+    'ENABLED': True,
+    # Seconds a verified token is trusted without decoding it again
+    'TIMEOUT': 60,
+    # Tokens kept; the least recently used are evicted first
+    'MAX_SIZE': 1024,
+}
+
+
+def auth_cache_setting(name):
+    """Return an ``AUTH_CACHE`` setting, or its default."""
+    return getattr(settings, 'AUTH_CACHE', {}).get(name, DEFAULTS[name])
+
+
+class TokenCache:
+    """
+    Bounded LRU map of token digest to ``(expires, user)``.
+
+    Attributes:
+        entries (OrderedDict): Entries, least recently used first.
+        digests (dict): Digests of the entries of each user, by id and by
+                        username (tokens name users by username, which a
+                        recreated user may reuse under another id).
+    """
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.digests = {}
+        self.lock = threading.Lock()
+
+    def get(self, digest):
+        """Return a copy of the cached user, or ``None``."""
+        if not auth_cache_setting('ENABLED'):
+            return None
+        with self.lock:
+            entry = self.entries.get(digest)
+            if entry is None:
+                return None
+            expires, user = entry
+            if expires <= time.time():
+                self._discard(digest)
+                return None
+            self.entries.move_to_end(digest)
+        # Requests may change their user; the snapshot stays untouched
+        return copy.copy(user)
+
+    def set(self, digest, user, expires):
+        """Cache ``user`` for the token of ``digest`` until ``expires``."""
+        max_size = auth_cache_setting('MAX_SIZE')
+        if not auth_cache_setting('ENABLED') or max_size <= 0:
+            return
+        with self.lock:
+            self._discard(digest)
+            self.entries[digest] = (expires, copy.copy(user))
+            for key in user_keys(user):
+                self.digests.setdefault(key, set()).add(digest)
+            while len(self.entries) > max_size:
+                self._discard(next(iter(self.entries)))
+
+    def forget(self, user):
+        """Drop the entries of ``user``."""
+        with self.lock:
+            for key in user_keys(user):
+                for digest in list(self.digests.get(key, ())):
+                    self._discard(digest)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.digests.clear()
+
+    def _discard(self, digest):
+        entry = self.entries.pop(digest, None)
+        if entry is None:
+            return
+        for key in user_keys(entry[1]):
+            digests = self.digests.get(key)
+            if digests is not None:
+                digests.discard(digest)
+                if not digests:
+                    del self.digests[key]
+
+
+def user_keys(user):
+    return ('id', user.pk), ('username', user.get_username())
+
+
+token_cache = TokenCache()
+
+
+def forget_user(user):
+    """
+    Drop the cached snapshots of ``user``, now and again once the
+    transaction commits, in case a request cached the old row meanwhile.
+    """
+    token_cache.forget(user)
+    transaction.on_commit(lambda: token_cache.forget(user))
+
+
+def user_changed(sender, instance, **kwargs):
+    """``post_save``/``post_delete`` receiver of the user model."""
+    forget_user(instance)
+
+
+def user_logged_out(sender, request, user, **kwargs):
+    """``user_logged_out`` receiver."""
+    if user is not None:
+        forget_user(user)
+
+
+class CachedJSONWebTokenBackend(JSONWebTokenBackend):
+    """``JSONWebTokenBackend`` going through ``token_cache``."""
+
+    def authenticate(self, request=None, **kwargs):
+        if request is None or getattr(request, '_jwt_token_auth', False):
+            return None
+        token = get_credentials(request, **kwargs)
+        if token is None:
+            return None
+
+        digest = hashlib.sha256(token.encode()).hexdigest()
+        user = token_cache.get(digest)
+        if user is not None:
+            return user
+        payload = get_payload(token, request)
+        user = get_user_by_payload(payload)
+        if user is not None:
+            expires = time.time() + auth_cache_setting('TIMEOUT')
+            if 'exp' in payload:
+                expires = min(expires, payload['exp'])
+            token_cache.set(digest, user, expires)
+        return user
+
+
+def authenticate_request(request):
+    """
+    Set ``request.user`` from the request's token, once per request.
+
+    Returns the user, or ``None`` when the request carries no token or an
+    unknown one. A bad token raises ``JSONWebTokenError``, and raises it
+    again on later calls without being checked again.
+    """
+    state = getattr(request, '_jwt_authentication', None)
+    if state is None:
+        user = getattr(request, 'user', None)
+        if (
+            (user is None or user.is_anonymous)
+            and get_http_authorization(request) is not None
+        ):
+            try:
+                user = authenticate(request=request)
+            except JSONWebTokenError as e:
+                state = (None, e)
+            else:
+                state = (user, None)
+                if user is not None:
+                    request.user = user
+        else:
+            state = (user, None)
+        request._jwt_authentication = state
+    user, error = state
+    if error is not None:
+        raise error
+    return user
+
+
+class JSONWebTokenMiddleware(BaseJSONWebTokenMiddleware):
+    """
+    graphql_jwt's middleware authenticating once per request.
+
+    Root fields authenticate through ``authenticate_request``; nested fields
+    are resolved directly, since the user is set before they run. With
+    ``JWT_ALLOW_ARGUMENT`` tokens may come with any field, so it falls back
+    to graphql_jwt's behaviour.
+    """
+
+    def resolve(self, next, root, info, **kwargs):
+        if info.path.prev is not None:
+            return next(root, info, **kwargs)
+        if jwt_settings.JWT_ALLOW_ARGUMENT:
+            return super().resolve(next, root, info, **kwargs)
+        if self.authenticate_context(info, **kwargs):
+            authenticate_request(info.context)
+        return next(root, info, **kwargs)
@@ -0,0 +1,48 @@
+"""
+Run follow-up work outside the request/response cycle.
+
+Jobs are handed to a small thread pool once the surrounding transaction
+commits, so they never see rows that are later rolled back. The pool is
+per process; work still queued when a worker exits is lost, so jobs must
+be safe to re-run or to skip (a reconcile pass catches anything missed).
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+_executor = None
+
+
+def get_executor():
+    """Return the process wide executor, creating it on first use."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'BACKGROUND_WORKERS', 4),
+            thread_name_prefix='background',
+        )
+    return _executor
+
+
+def _run(func, args, kwargs):
+    try:
+        func(*args, **kwargs)
+    finally:
+        # Worker threads get their own connections; don't leak them.
+        close_old_connections()
+
+
+def submit(func, *args, **kwargs):
+    """
+    Run ``func(*args, **kwargs)`` after the current transaction commits.
+
+    With ``BACKGROUND_TASKS_EAGER`` enabled (as in tests) the job runs
+    synchronously instead, still after commit.
+    """
+    if getattr(settings, 'BACKGROUND_TASKS_EAGER', False):
+        transaction.on_commit(lambda: func(*args, **kwargs))
+    else:
+        transaction.on_commit(
+            lambda: get_executor().submit(_run, func, args, kwargs)
+        )
@@ -0,0 +1,530 @@
+"""
+Benchmarks of the GraphQL operations.
+
+``OPERATIONS`` holds one representative operation for every query and
+mutation root field of the schema, with the most SQL queries it may run
+(its budget). ``benchmark`` seeds a dataset of a given number of posts and
+runs each operation in-process through the GraphQL view, recording the
+wall time, the SQL query count and the peak memory allocated by Python.
+Mutations run in a transaction that is rolled back, so every run sees the
+same data.
+
+Budgets are enforced by ``core.tests.test_query_budgets``, which also
+checks that query counts don't grow with the dataset (N+1 regressions), and
+by the ``benchmark`` management command, which writes a JSON report that
+can be compared between commits. Subscriptions are served over websockets
+and are not covered.
+"""
+import json
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+from collections import namedtuple
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from graphql_jwt.shortcuts import get_token
+from interactions.models import Interaction, ReactionCount
+from posts.models import PATH_SEGMENT, Comment, Post, Share
+from posts.timeline import backfill_timeline
+from posts.trending import rebuild
+from users.models import Follow
+
+User = get_user_model()
+
+PASSWORD = 'benchmark'
+
+# Users followed by the viewer and posts shared with them
+FOLLOWED = 50
+SHARED = 20
+# Reactions seeded per post, cycling through these types; the mutations
+# add ``wow`` reactions, which are never seeded
+REACTIONS = ('thumbs_up', 'haha', 'sad')
+
+BATCH_SIZE = 5000
+
+# One operation of the catalogue. ``variables`` maps a ``Dataset`` to the
+# operation's variables; ``budget`` is the most SQL queries it may run.
+BenchmarkOperation = namedtuple('BenchmarkOperation', [
+    'field', 'document', 'variables', 'budget', 'authenticated',
+])
+
+
+class Dataset:
+    """
+    Rows of a seeded dataset the operations refer to.
+
+    Attributes:
+        size (int): Number of posts.
+        viewer (User): User the operations are run as.
+        followed (list): Users the viewer follows.
+        others (list): Users the viewer doesn't follow.
+        post (Post): Post of another user, with comments and reactions,
+                     loved by the viewer and shared with them.
+        own_post (Post): Post of the viewer, shared with followed users.
+        comment (Comment): Top-level comment of the viewer, with replies.
+    """
+
+    def __init__(self, size, viewer, followed, others, post, own_post,
+                 comment):
+        self.size = size
+        self.viewer = viewer
+        self.followed = followed
+        self.others = others
+        self.post = post
+        self.own_post = own_post
+        self.comment = comment
+
+
+def seed(size):
+    """
+    Seed ``size`` posts by a hundredth as many users (at least
+    ``FOLLOWED + 10``), each post with one comment and reactions from the
+    next users, and return the ``Dataset``. Counters, reaction counts,
+    timelines and trending scores are filled in as the app would.
+    """
+    password = make_password(PASSWORD)
+    user_count = max(size // 100, FOLLOWED + 10)
+    users = User.objects.bulk_create(
+        [
+            User(username=f'bench{i}', password=password,
+                 email=f'bench{i}@example.com')
+            for i in range(user_count)
+        ],
+        batch_size=BATCH_SIZE,
+    )
+    viewer, followed = users[0], users[1:FOLLOWED + 1]
+    others = users[FOLLOWED + 1:]
+
+    for start in range(0, size, BATCH_SIZE):
+        count = min(BATCH_SIZE, size - start)
+        posts = Post.objects.bulk_create([
+            Post(
+                user=users[(start + i) % user_count],
+                title=f'Benchmark post {start + i}',
+                content=f'Seeded benchmark content number {start + i}',
+                interactions_count=len(REACTIONS), comments_count=1,
+            )
+            for i in range(count)
+        ])
+        seed_activity(posts, start, users)
+
+    post = Post.objects.filter(user=others[0]).first()
+    own_post = Post.objects.filter(user=viewer).first()
+    Interaction.objects.create(
+        user=viewer, post=post, interaction_type='love'
+    )
+    ReactionCount.objects.create(
+        post=post, interaction_type='love', count=1
+    )
+    Post.objects.filter(pk=post.pk).update(
+        interactions_count=len(REACTIONS) + 1
+    )
+    comment = Comment.objects.create(
+        post=own_post, user=viewer, content='Seeded thread'
+    )
+    for user in others[:3]:
+        Comment.objects.create(
+            post=own_post, user=user, parent=comment, content='Reply'
+        )
+    Post.objects.filter(pk=own_post.pk).update(comments_count=5)
+
+    Follow.objects.bulk_create(
+        [Follow(follower=viewer, followee=user) for user in followed]
+    )
+    User.objects.filter(pk__in=[user.pk for user in followed]).update(
+        followers_count=1
+    )
+    for user in followed:
+        backfill_timeline(viewer.pk, user.pk)
+
+    # The viewer receives shares of ``post`` and others, and sends some
+    received = [(post.pk, post.user_id)] + list(
+        Post.objects.exclude(user=viewer).exclude(pk=post.pk).values_list(
+            'pk', 'user_id'
+        )[:SHARED - 1]
+    )
+    shares = [
+        Share(post_id=pk, user_id=user_id, shared_with=viewer)
+        for pk, user_id in received
+    ] + [
+        Share(post=own_post, user=viewer, shared_with=user)
+        for user in followed[:SHARED // 4]
+    ]
+    Share.objects.bulk_create(shares)
+    Post.objects.filter(pk__in=[pk for pk, _ in received]).update(
+        shares_count=1
+    )
+    Post.objects.filter(pk=own_post.pk).update(shares_count=SHARED // 4)
+    rebuild()
+    return Dataset(size, viewer, followed, others, post, own_post, comment)
+
+
+def seed_activity(posts, start, users):
+    """
+    Seed the comments and reactions of a batch of posts, the first of
+    which is post number ``start``.
+    """
+    user_count = len(users)
+    comments = Comment.objects.bulk_create([
+        Comment(
+            post=post, user=users[(start + i + 1) % user_count],
+            content=f'Comment on {post.title}',
+        )
+        for i, post in enumerate(posts)
+    ])
+    for comment in comments:
+        comment.path = str(comment.pk).zfill(PATH_SEGMENT)
+    Comment.objects.bulk_update(comments, ['path'])
+
+    interactions, counts = [], []
+    for i, post in enumerate(posts):
+        for offset, kind in enumerate(REACTIONS, start=2):
+            interactions.append(Interaction(
+                post=post, interaction_type=kind,
+                user=users[(start + i + offset) % user_count],
+            ))
+            counts.append(ReactionCount(
+                post=post, interaction_type=kind, count=1
+            ))
+    Interaction.objects.bulk_create(interactions)
+    ReactionCount.objects.bulk_create(counts)
+
+
+POST_FIELDS = '''
+    id title createdAt interactionsCount commentsCount
+    user { username }
+    reactionSummary { interactionType count }
+'''
+
+
+def operation(field, document, variables=None, budget=0,
+              authenticated=True):
+    return BenchmarkOperation(
+        field, document, variables or (lambda dataset: {}), budget,
+        authenticated,
+    )
+
+
+OPERATIONS = [
+    # Queries
+    operation('interactions', '''
+        query Interactions($postId: Int) {
+            interactions(postId: $postId) {
+                interactionType user { username } post { title }
+            }
+        }''', lambda d: {'postId': d.post.pk}, budget=4),
+    operation('allPosts', f'''
+        query AllPosts {{
+            allPosts(first: 20) {{
+                {POST_FIELDS}
+                comments {{ content user {{ username }} }}
+            }}
+        }}''', budget=6),
+    operation('postsConnection', f'''
+        query PostsConnection {{
+            postsConnection(first: 20) {{
+                edges {{ cursor node {{ {POST_FIELDS} }} }}
+                pageInfo {{ hasNextPage endCursor }}
+            }}
+        }}''', budget=4),
+    operation('searchPosts', f'''
+        query SearchPosts {{
+            searchPosts(query: "benchmark content", first: 20) {{
+                edges {{ node {{ {POST_FIELDS} }} }}
+            }}
+        }}''', budget=5),
+    operation('homeFeed', f'''
+        query HomeFeed {{
+            homeFeed(first: 20) {{
+                edges {{ node {{ {POST_FIELDS} }} }}
+                pageInfo {{ hasNextPage }}
+            }}
+        }}''', budget=6),
+    operation('trendingPosts', f'''
+        query TrendingPosts {{
+            trendingPosts(window: DAY, first: 20) {{ {POST_FIELDS} }}
+        }}''', budget=4),
+    operation('sharesInbox', '''
+        query SharesInbox {
+            sharesInbox(first: 20) {
+                edges { node { user { username } post { title } } }
+            }
+        }''', budget=4),
+    operation('sharesSent', '''
+        query SharesSent {
+            sharesSent(first: 20) {
+                edges { node { sharedWith { username } post { title } } }
+            }
+        }''', budget=4),
+    operation('post', f'''
+        query Post($id: ID!) {{
+            post(id: $id) {{
+                {POST_FIELDS}
+                comments {{ content user {{ username }} }}
+                interactions {{ interactionType user {{ username }} }}
+                shares {{ sharedWith {{ username }} }}
+            }}
+        }}''', lambda d: {'id': d.post.pk}, budget=10),
+    operation('commentsForPost', '''
+        query CommentsForPost($postId: ID!) {
+            commentsForPost(postId: $postId, first: 20, replyPreview: 2) {
+                edges { node {
+                    content user { username } replyCount
+                    replyPreview { content user { username } }
+                } }
+            }
+        }''', lambda d: {'postId': d.own_post.pk}, budget=6),
+    operation('commentThread', '''
+        query CommentThread($commentId: ID!) {
+            commentThread(commentId: $commentId, first: 20) {
+                edges { node { content depth user { username } } }
+            }
+        }''', lambda d: {'commentId': d.comment.pk}, budget=4),
+    operation('loggedUser', '''
+        query LoggedUser { loggedUser { username followersCount } }
+    ''', budget=1),
+
+    # Mutations
+    operation('Post_Interaction_Add', '''
+        mutation Add($postId: Int!) {
+            Post_Interaction_Add(postId: $postId, interactionType: WOW) {
+                success error
+            }
+        }''', lambda d: {'postId': d.post.pk}, budget=9),
+    operation('Post_Interaction_Remove', '''
+        mutation Remove($postId: Int!) {
+            Post_Interaction_Remove(postId: $postId, interactionType: LOVE) {
+                success error
+            }
+        }''', lambda d: {'postId': d.post.pk}, budget=6),
+    operation('Post_Interactions_Apply', '''
+        mutation Apply($items: [InteractionInput!]!) {
+            Post_Interactions_Apply(items: $items) {
+                success results { success error }
+            }
+        }''', lambda d: {'items': [
+            {'postId': d.post.pk, 'interactionType': 'WOW'},
+            {'postId': d.own_post.pk, 'interactionType': 'WOW'},
+            {'postId': d.post.pk, 'interactionType': 'LOVE',
+             'action': 'REMOVE'},
+        ]}, budget=13),
+    operation('Post_Reaction_Set', '''
+        mutation Set($postId: Int!) {
+            Post_Reaction_Set(postId: $postId, type: WOW) {
+                success error changed interaction { id }
+            }
+        }''', lambda d: {'postId': d.post.pk}, budget=8),
+    operation('PostCreate', '''
+        mutation Create {
+            PostCreate(title: "Benchmark", content: "New benchmark post") {
+                success error post { id }
+            }
+        }''', budget=2),
+    operation('PostUpdate', '''
+        mutation Update($postId: ID!) {
+            PostUpdate(postId: $postId, title: "Updated", content: "New") {
+                success error post { title }
+            }
+        }''', lambda d: {'postId': d.own_post.pk}, budget=4),
+    operation('PostDelete', '''
+        mutation Delete($postId: ID!) {
+            PostDelete(postId: $postId) { success error }
+        }''', lambda d: {'postId': d.own_post.pk}, budget=13),
+    operation('Post_Comment_Add', '''
+        mutation Comment($postId: ID!) {
+            Post_Comment_Add(postId: $postId, content: "Nice") {
+                success error comment { id path }
+            }
+        }''', lambda d: {'postId': d.post.pk}, budget=6),
+    operation('Post_Comment_update', '''
+        mutation UpdateComment($commentId: ID!) {
+            Post_Comment_update(commentId: $commentId, content: "Edited") {
+                success error comment { content }
+            }
+        }''', lambda d: {'commentId': d.comment.pk}, budget=4),
+    operation('Post_Comment_Delete', '''
+        mutation DeleteComment($commentId: ID!) {
+            Post_Comment_Delete(commentId: $commentId) { success error }
+        }''', lambda d: {'commentId': d.comment.pk}, budget=8),
+    operation('Post_Share', '''
+        mutation Share($postId: Int!, $username: String!) {
+            Post_Share(postId: $postId, username: $username) {
+                success error
+            }
+        }''', lambda d: {
+            'postId': d.post.pk, 'username': d.others[1].username,
+        }, budget=7),
+    operation('Post_Comments_Add', '''
+        mutation Comments($items: [CommentInput!]!) {
+            Post_Comments_Add(items: $items) {
+                success results { success error comment { id } }
+            }
+        }''', lambda d: {'items': [
+            {'postId': d.post.pk, 'content': 'One'},
+            {'postId': d.own_post.pk, 'content': 'Two'},
+            {'postId': d.own_post.pk, 'content': 'Three',
+             'parentId': d.comment.pk},
+        ]}, budget=11),
+    operation('Post_Shares_Add', '''
+        mutation Shares($items: [ShareInput!]!) {
+            Post_Shares_Add(items: $items) {
+                success results { success error }
+            }
+        }''', lambda d: {'items': [
+            {'postId': d.post.pk, 'username': user.username}
+            for user in d.others[1:4]
+        ]}, budget=9),
+    operation('tokenAuth', '''
+        mutation TokenAuth($username: String!, $password: String!) {
+            tokenAuth(username: $username, password: $password) { token }
+        }''', lambda d: {
+            'username': d.viewer.username, 'password': PASSWORD,
+        }, budget=1, authenticated=False),
+    operation('verifyToken', '''
+        mutation Verify($token: String) {
+            verifyToken(token: $token) { payload }
+        }''', lambda d: {
+            'token': get_token(d.viewer),
+        }, budget=0, authenticated=False),
+    operation('refreshToken', '''
+        mutation Refresh($token: String) {
+            refreshToken(token: $token) { token }
+        }''', lambda d: {
+            'token': get_token(d.viewer),
+        }, budget=1, authenticated=False),
+    operation('UserCreate', '''
+        mutation CreateUser {
+            UserCreate(
+                username: "benchmark-new", password: "secret",
+                firstName: "New", lastName: "User",
+                email: "new@example.com"
+            ) { success error }
+        }''', budget=2, authenticated=False),
+    operation('UserToken', '''
+        mutation Login($username: String!, $password: String!) {
+            UserToken(username: $username, password: $password) {
+                success error token
+            }
+        }''', lambda d: {
+            'username': d.viewer.username, 'password': PASSWORD,
+        }, budget=1, authenticated=False),
+    operation('UserFollow', '''
+        mutation Follow($username: String!) {
+            UserFollow(username: $username) { success error }
+        }''', lambda d: {'username': d.others[0].username}, budget=9),
+    operation('UserUnfollow', '''
+        mutation Unfollow($username: String!) {
+            UserUnfollow(username: $username) { success error }
+        }''', lambda d: {'username': d.followed[0].username}, budget=6),
+]
+
+
+def run_operation(client, op, dataset, headers):
+    """
+    Run ``op`` once; return ``(seconds, queries, errors)``. Mutations are
+    rolled back.
+    """
+    body = json.dumps({
+        'query': op.document, 'variables': op.variables(dataset),
+    })
+    with transaction.atomic():
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = client.post(
+                '/graphql/', body, content_type='application/json',
+                **headers
+            )
+            elapsed = time.perf_counter() - started
+        count = len(queries)
+        transaction.set_rollback(True)
+    result = response.json()
+    errors = [error['message'] for error in result.get('errors', ())]
+    data = (result.get('data') or {}).get(op.field)
+    if isinstance(data, dict) and data.get('error'):
+        errors.append(data['error'])
+    return elapsed, count, errors
+
+
+def measure(op, dataset, repeat=5, memory=True):
+    """Run ``op`` ``repeat`` times and return its result entry."""
+    client = Client()
+    headers = {}
+    if op.authenticated:
+        headers['HTTP_AUTHORIZATION'] = f'JWT {get_token(dataset.viewer)}'
+
+    times, counts, errors = [], [], []
+    for _ in range(max(repeat, 1)):
+        elapsed, count, run_errors = run_operation(
+            client, op, dataset, headers
+        )
+        times.append(elapsed)
+        counts.append(count)
+        errors.extend(run_errors)
+
+    peak = None
+    if memory:
+        # A separate run, as tracing allocations slows everything down
+        tracemalloc.start()
+        try:
+            run_operation(client, op, dataset, headers)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    queries = max(counts)
+    return {
+        'operation': op.field,
+        'size': dataset.size,
+        'queries': queries,
+        'budget': op.budget,
+        'within_budget': queries <= op.budget,
+        'errors': sorted(set(errors)),
+        'wall_time': {
+            'min': min(times),
+            'median': statistics.median(times),
+            'max': max(times),
+        },
+        'peak_memory': peak,
+    }
+
+
+def benchmark(size, operations=None, repeat=5, memory=True):
+    """Seed ``size`` posts and measure ``operations`` (all by default)."""
+    dataset = seed(size)
+    return [
+        measure(op, dataset, repeat, memory)
+        for op in (OPERATIONS if operations is None else operations)
+    ]
+
+
+def current_commit():
+    """Return the git commit of the checkout, if there is one."""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def report(results):
+    """Return the JSON report of ``results``."""
+    return {
+        'version': 1,
+        'commit': current_commit(),
+        'created_at': timezone.now().isoformat(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'results': results,
+    }
@@ -0,0 +1,56 @@
+"""
+System checks of the GraphQL settings.
+
+Several features keep state in a Django cache that every process serving
+requests must share: the response cache's invalidation tokens and the
+read-your-writes pins of the replica router. A local memory cache
+(Django's default when ``CACHES`` isn't configured) is private to its
+process, so those features refuse it.
+"""
+from django.conf import settings
+from django.core import checks
+from .replicas import replica_setting
+from .response_cache import response_cache_setting
+
+PROCESS_LOCAL_BACKENDS = {
+    'django.core.cache.backends.locmem.LocMemCache',
+}
+
+
+def is_process_local(alias):
+    """Whether the cache ``alias`` is private to the current process."""
+    backend = settings.CACHES.get(alias, {}).get('BACKEND')
+    return backend in PROCESS_LOCAL_BACKENDS
+
+
+@checks.register(checks.Tags.caches)
+def check_response_cache(app_configs, **kwargs):
+    """Refuse a response cache invalidated in one process only."""
+    alias = response_cache_setting('CACHE_ALIAS')
+    if response_cache_setting('ENABLED') and is_process_local(alias):
+        return [checks.Error(
+            f"RESPONSE_CACHE uses the process-local cache {alias!r}.",
+            hint="Invalidations would not reach the other processes, which "
+                 "would keep serving stale responses. Point CACHE_ALIAS at "
+                 "a shared cache (e.g. set CACHE_URL) or disable it with "
+                 "GRAPHQL_RESPONSE_CACHE=0.",
+            id='core.E001',
+        )]
+    return []
+
+
+@checks.register(checks.Tags.caches, checks.Tags.database)
+def check_replica_pins(app_configs, **kwargs):
+    """Refuse read-your-writes pins visible to one process only."""
+    alias = replica_setting('CACHE_ALIAS')
+    if replica_setting('DATABASES') and is_process_local(alias):
+        return [checks.Error(
+            f"REPLICAS pins users to the primary in the process-local cache "
+            f"{alias!r}.",
+            hint="A user's next request on another process would read "
+                 "from a lagging replica. Point CACHE_ALIAS at a shared "
+                 "cache (e.g. set CACHE_URL) or unset "
+                 "DATABASE_REPLICA_URLS.",
+            id='core.E002',
+        )]
+    return []
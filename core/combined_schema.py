@@ -8,6 +8,8 @@ from users.schema.mutations import Mutation as UsersMutation
 from posts.schema.mutations import Mutation as PostsMutation
 from interactions.schema.mutations import Mutation as InteractionsMutation
 
+from posts.schema.subscriptions import Subscription as PostsSubscription
+
 
 class Query(UsersQuery, PostsQuery, InteractionsQuery, graphene.ObjectType):
     """Combined query class for posts and interactions."""
@@ -24,5 +26,12 @@ class Mutation(
     pass
 
 
+class Subscription(PostsSubscription, graphene.ObjectType):
+    """Combined subscription class, served over websockets."""
+    pass
+
+
 # Create the combined schema
-schema = graphene.Schema(query=Query, mutation=Mutation)
+schema = graphene.Schema(
+    query=Query, mutation=Mutation, subscription=Subscription
+)
@@ -0,0 +1,220 @@
+"""
+Static cost analysis of GraphQL operations.
+
+Every field has a weight: leaves are free, fields returning an object cost
+one unit (roughly one row or one batched query), and a few root fields cost
+more. List fields multiply the cost of their selection by their ``first``/
+``last`` argument, or by a configured size when they are unbounded. An
+operation whose total cost or nesting depth is above the configured budget
+is rejected by a validation rule, before any resolver runs.
+"""
+from django.conf import settings
+from graphql import (
+    FieldNode, FragmentSpreadNode, GraphQLError, InlineFragmentNode,
+    IntValueNode, ValidationRule, VariableNode, get_named_type,
+    is_composite_type, is_list_type, is_non_null_type,
+)
+
+DEFAULTS = {
+    'MAX_COST': 10000,
+    'MAX_DEPTH': 10,
+    # Multiplier of list fields that are called without first/last
+    'DEFAULT_LIST_SIZE': 20,
+    # Cost of a field beyond the default (0 for leaves, 1 for objects)
+    'WEIGHTS': {
+        'Query.searchPosts': 10,
+        'Query.homeFeed': 5,
+        'Query.trendingPosts': 2,
+    },
+    # Assumed size of lists that have no page size argument
+    'LIST_SIZES': {
+        'Query.allPosts': 100,
+        'Query.interactions': 100,
+        'PostType.comments': 50,
+        'PostType.interactions': 50,
+        'PostType.shares': 20,
+        'PostType.reactionSummary': 7,
+        'PostType.imageVariants': 6,
+        'CommentType.replies': 50,
+        'CommentType.replyPreview': 10,
+        'UserType.posts': 50,
+        'UserType.comments': 50,
+        'UserType.interactions': 50,
+        'UserType.sentShares': 50,
+        'UserType.receivedShares': 50,
+    },
+    # Cost of every mutation field, on top of its selection
+    'MUTATION_WEIGHT': 10,
+}
+
+PAGE_ARGUMENTS = ('first', 'last')
+
+
+def cost_setting(name):
+    """Return a ``GRAPHQL_COST`` setting, falling back to the default."""
+    return getattr(settings, 'GRAPHQL_COST', {}).get(name, DEFAULTS[name])
+
+
+def unwrap(graphql_type):
+    """Strip a single non-null wrapper from ``graphql_type``."""
+    if is_non_null_type(graphql_type):
+        return graphql_type.of_type
+    return graphql_type
+
+
+class CostAnalysis:
+    """
+    Compute the cost and depth of operations in one document.
+
+    Attributes:
+        context (ValidationContext): Gives access to schema and fragments.
+        variables (dict): Variable values sent with the request.
+    """
+
+    def __init__(self, context, variables=None):
+        self.context = context
+        self.variables = variables or {}
+        self.weights = cost_setting('WEIGHTS')
+        self.list_sizes = cost_setting('LIST_SIZES')
+
+    def operation(self, node):
+        """Return ``(cost, depth)`` of an operation definition."""
+        schema = self.context.schema
+        root = schema.get_root_type(node.operation)
+        if root is None:
+            return 0, 0
+        return self.selection_set(root, node.selection_set, 0, frozenset())
+
+    def argument(self, node, name):
+        """Return the integer value of argument ``name`` if it is given."""
+        for argument in node.arguments or ():
+            if argument.name.value != name:
+                continue
+            value = argument.value
+            if isinstance(value, IntValueNode):
+                return int(value.value)
+            if isinstance(value, VariableNode):
+                value = self.variables.get(value.name.value)
+                # Ill-typed variables are rejected when they are coerced
+                if isinstance(value, int) and not isinstance(value, bool):
+                    return value
+        return None
+
+    def multiplier(self, parent, node, field):
+        """How many times the selection of ``node`` is resolved."""
+        key = f'{parent.name}.{node.name.value}'
+        for name in PAGE_ARGUMENTS:
+            value = self.argument(node, name)
+            if value is not None:
+                return max(value, 0)
+
+        if not is_list_type(unwrap(field.type)):
+            if any(name in field.args for name in PAGE_ARGUMENTS):
+                # A connection called without a page size
+                return self.list_sizes.get(
+                    key, cost_setting('DEFAULT_LIST_SIZE')
+                )
+            return 1
+        if parent.name.endswith('Connection'):
+            # Already multiplied by the connection's page size
+            return 1
+        return self.list_sizes.get(key, cost_setting('DEFAULT_LIST_SIZE'))
+
+    def weight(self, parent, node, field):
+        """Cost of resolving ``node`` once, excluding its selection."""
+        key = f'{parent.name}.{node.name.value}'
+        if key in self.weights:
+            return self.weights[key]
+        schema = self.context.schema
+        if parent is schema.mutation_type:
+            return cost_setting('MUTATION_WEIGHT')
+        return 1 if is_composite_type(get_named_type(field.type)) else 0
+
+    def selection_set(self, parent, selection_set, depth, fragments):
+        """Return ``(cost, depth)`` of a selection set on ``parent``."""
+        cost, deepest = 0, depth
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                name = selection.name.value
+                fields = getattr(parent, 'fields', {})
+                if name.startswith('__') or name not in fields:
+                    # Introspection is free; unknown fields are reported
+                    # by the standard validation rules.
+                    continue
+                field = fields[name]
+                child_cost, child_depth = 0, depth + 1
+                named = get_named_type(field.type)
+                if selection.selection_set and is_composite_type(named):
+                    child_cost, child_depth = self.selection_set(
+                        named, selection.selection_set, depth + 1, fragments
+                    )
+                cost += self.multiplier(parent, selection, field) * (
+                    self.weight(parent, selection, field) + child_cost
+                )
+                deepest = max(deepest, child_depth)
+                continue
+
+            seen = fragments
+            if isinstance(selection, FragmentSpreadNode):
+                name = selection.name.value
+                fragment = self.context.get_fragment(name)
+                if fragment is None or name in fragments:
+                    # Cycles are reported by NoFragmentCyclesRule
+                    continue
+                seen = fragments | {name}
+            elif isinstance(selection, InlineFragmentNode):
+                fragment = selection
+            else:
+                continue
+
+            target = parent
+            if fragment.type_condition is not None:
+                target = self.context.schema.get_type(
+                    fragment.type_condition.name.value
+                ) or parent
+            fragment_cost, fragment_depth = self.selection_set(
+                target, fragment.selection_set, depth, seen
+            )
+            cost += fragment_cost
+            deepest = max(deepest, fragment_depth)
+        return cost, deepest
+
+
+def cost_rule(variables=None, operation_name=None, report=None):
+    """
+    Return a validation rule enforcing the cost and depth budget.
+
+    The cost of the operation that will run is written to ``report`` (a
+    dict) so it can be returned in the response ``extensions``.
+    """
+    report = {} if report is None else report
+
+    class QueryCostRule(ValidationRule):
+        def enter_operation_definition(self, node, *args):
+            name = node.name.value if node.name else None
+            if operation_name is not None and name != operation_name:
+                return self.SKIP
+
+            cost, depth = CostAnalysis(self.context, variables).operation(
+                node
+            )
+            max_cost = cost_setting('MAX_COST')
+            max_depth = cost_setting('MAX_DEPTH')
+            report.update(
+                requested=cost, maximum=max_cost, depth=depth,
+                max_depth=max_depth,
+            )
+            if cost > max_cost:
+                self.report_error(GraphQLError(
+                    f"Query cost {cost} exceeds the maximum of {max_cost}.",
+                    node,
+                ))
+            if depth > max_depth:
+                self.report_error(GraphQLError(
+                    f"Query depth {depth} exceeds the maximum of "
+                    f"{max_depth}.",
+                    node,
+                ))
+            return self.SKIP
+
+    return QueryCostRule
@@ -0,0 +1,222 @@
+"""
+Automatic persisted queries (APQ) and the parsed document cache.
+
+Clients may send ``extensions.persistedQuery.sha256Hash`` instead of the
+query text. A known hash is looked up in Django's cache; an unknown one is
+answered with ``PersistedQueryNotFound`` and the client retries with both
+the text and the hash, which registers the query for everyone.
+
+Independently, every query string is hashed and its parsed ``DocumentNode``
+is kept in a per-process LRU once it has passed the standard validation
+rules, so repeated operations skip lexing, parsing and validation. Only the
+variable-dependent cost rule still runs per request.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from graphene_django.settings import graphene_settings
+from graphql import GraphQLError, parse, specified_rules, validate
+
+DEFAULTS = {
+    'CACHE_ALIAS': 'default',
+    'TIMEOUT': None,
+    'DOCUMENT_CACHE_SIZE': 1000,
+}
+
+
+def persisted_setting(name):
+    """Return a ``PERSISTED_QUERIES`` setting, or its default."""
+    return getattr(settings, 'PERSISTED_QUERIES', {}).get(
+        name, DEFAULTS[name]
+    )
+
+
+def query_hash(query):
+    """Return the hex sha256 of a query string."""
+    return hashlib.sha256(query.encode('utf-8')).hexdigest()
+
+
+class DocumentCache:
+    """
+    Thread-safe LRU of validated documents keyed by query hash.
+
+    Attributes:
+        maxsize (int): Number of documents kept.
+        hits (int): Lookups answered from the cache.
+        misses (int): Lookups that had to parse and validate.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._documents = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached document for ``key`` or ``None``."""
+        with self._lock:
+            document = self._documents.get(key)
+            if document is None:
+                self.misses += 1
+                return None
+            self._documents.move_to_end(key)
+            self.hits += 1
+            return document
+
+    def put(self, key, document):
+        """Store ``document``, evicting the least recently used one."""
+        with self._lock:
+            self._documents[key] = document
+            self._documents.move_to_end(key)
+            while len(self._documents) > self.maxsize:
+                self._documents.popitem(last=False)
+
+    def clear(self):
+        """Drop every document and reset the counters."""
+        with self._lock:
+            self._documents.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        """Return the cache counters as a dict."""
+        with self._lock:
+            return {
+                'size': len(self._documents),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+class PersistedQueries:
+    """
+    Registry of persisted queries stored in Django's cache framework.
+
+    Attributes:
+        hits (int): Hash-only requests whose query was known.
+        misses (int): Hash-only requests answered PersistedQueryNotFound.
+        registered (int): Queries registered by this process.
+    """
+
+    prefix = 'apq:'
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.registered = 0
+        self._lock = threading.Lock()
+
+    @property
+    def cache(self):
+        return caches[persisted_setting('CACHE_ALIAS')]
+
+    def count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def resolve(self, query, extensions):
+        """
+        Return ``(query, hash)`` for a request.
+
+        Raises ``GraphQLError`` when only an unknown hash was sent, or when
+        the hash does not match the query text.
+        """
+        persisted = (extensions or {}).get('persistedQuery') or {}
+        sha = persisted.get('sha256Hash')
+        if not sha:
+            return query, query_hash(query) if query else None
+
+        if not query:
+            query = self.cache.get(self.prefix + sha)
+            if query is None:
+                self.count('misses')
+                raise GraphQLError(
+                    'PersistedQueryNotFound',
+                    extensions={'code': 'PERSISTED_QUERY_NOT_FOUND'},
+                )
+            self.count('hits')
+            return query, sha
+
+        if query_hash(query) != sha:
+            raise GraphQLError(
+                'provided sha does not match query',
+                extensions={'code': 'BAD_REQUEST'},
+            )
+        if self.cache.add(
+            self.prefix + sha, query, persisted_setting('TIMEOUT')
+        ):
+            self.count('registered')
+        return query, sha
+
+    def stats(self):
+        """Return the registry counters as a dict."""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'registered': self.registered,
+            }
+
+
+document_cache = DocumentCache(persisted_setting('DOCUMENT_CACHE_SIZE'))
+persisted_queries = PersistedQueries()
+
+
+def request_extensions(data):
+    """Return the ``extensions`` object of a GraphQL request body."""
+    extensions = data.get('extensions') if data else None
+    if isinstance(extensions, str):
+        # GET requests carry it JSON encoded in the query string
+        try:
+            extensions = json.loads(extensions)
+        except ValueError:
+            raise GraphQLError("Extensions must be a JSON object.")
+    return extensions if isinstance(extensions, dict) else None
+
+
+def get_document(schema, query, key, timings=None):
+    """
+    Return ``(document, errors)`` for ``query``.
+
+    The document is parsed and checked against the standard validation
+    rules once per ``key``; valid documents are served from the cache after
+    that. When parsing and validation happen, their ``(start, end)``
+    ``perf_counter_ns`` values are put in the ``timings`` dict, if given.
+    """
+    document = document_cache.get(key)
+    if document is not None:
+        return document, []
+
+    if timings is None:
+        timings = {}
+    start = time.perf_counter_ns()
+    try:
+        document = parse(query)
+    except GraphQLError as e:
+        return None, [e]
+    finally:
+        timings['parsing'] = (start, time.perf_counter_ns())
+
+    start = time.perf_counter_ns()
+    errors = validate(
+        schema, document, specified_rules,
+        graphene_settings.MAX_VALIDATION_ERRORS,
+    )
+    timings['validation'] = (start, time.perf_counter_ns())
+    if not errors:
+        document_cache.put(key, document)
+    return document, errors
+
+
+def stats():
+    """Return the counters of both caches."""
+    return {
+        'documents': document_cache.stats(),
+        'persisted_queries': persisted_queries.stats(),
+    }
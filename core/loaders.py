@@ -0,0 +1,168 @@
+"""
+Per-request batch loaders for the combined GraphQL schema.
+
+graphql-core resolves list items depth-first, so a classic promise based
+DataLoader never sees more than one key at a time in the synchronous
+executor. Instead, every list of model instances handed to the executor is
+registered as a *cohort*. The first time a relation is resolved on any
+member of a cohort, the loader fetches that relation for the whole cohort
+with a single ``IN (...)`` query and caches the result for the rest of the
+request. The rows it fetches become the cohort for the next level down.
+"""
+from collections import defaultdict
+
+
+class ForeignKeyLoader:
+    """
+    Batch loader for a forward foreign key such as ``Post.user``.
+
+    Attributes:
+        registry (Loaders): The request registry that owns this loader.
+        attname (str): Column holding the related primary key.
+        related_model (Model): Model the foreign key points at.
+        cache (dict): Loaded instances keyed by primary key.
+    """
+
+    def __init__(self, registry, model, field_name):
+        field = model._meta.get_field(field_name)
+        self.registry = registry
+        self.attname = field.attname
+        self.related_model = field.related_model
+        self.cache = {}
+
+    def prime(self, key, instance):
+        """Store an already loaded instance without querying."""
+        if instance.get_deferred_fields():
+            # A projected row would load each missing column on its own
+            return
+        self.cache.setdefault(key, instance)
+
+    def load(self, instance):
+        """Return the related object of ``instance``."""
+        key = getattr(instance, self.attname)
+        if key is None:
+            return None
+
+        if key not in self.cache:
+            keys = {key}
+            for peer in self.registry.cohort(instance):
+                peer_key = getattr(peer, self.attname, None)
+                if peer_key is not None and peer_key not in self.cache:
+                    keys.add(peer_key)
+
+            found = self.related_model._default_manager.in_bulk(keys)
+            self.registry.register(found.values())
+            for missing in keys:
+                self.cache[missing] = found.get(missing)
+
+        return self.cache[key]
+
+
+class RelatedListLoader:
+    """
+    Batch loader for a reverse foreign key such as ``Post.comments``.
+
+    Attributes:
+        registry (Loaders): The request registry that owns this loader.
+        model (Model): Model holding the foreign key (e.g. ``Comment``).
+        field_name (str): Name of the foreign key on ``model``.
+        cache (dict): Lists of related rows keyed by parent primary key.
+    """
+
+    def __init__(self, registry, model, field_name):
+        field = model._meta.get_field(field_name)
+        self.registry = registry
+        self.model = model
+        self.field_name = field_name
+        self.attname = field.attname
+        self.cache = {}
+
+    def get_queryset(self):
+        """Queryset the rows are loaded from, in the model's ordering."""
+        return self.model._default_manager.all()
+
+    def load(self, instance):
+        """Return the list of rows pointing at ``instance``."""
+        key = instance.pk
+        if key not in self.cache:
+            parents = {key: instance}
+            for peer in self.registry.cohort(instance):
+                if peer.pk not in self.cache:
+                    parents.setdefault(peer.pk, peer)
+
+            rows = list(self.get_queryset().filter(
+                **{f"{self.attname}__in": list(parents)}
+            ))
+            self.registry.register(rows)
+
+            # Every row already knows its parent, so seed the forward loader
+            # to keep ``comments { post { ... } }`` from querying again.
+            back = self.registry.foreign_key(self.model, self.field_name)
+            grouped = defaultdict(list)
+            for row in rows:
+                parent_key = getattr(row, self.attname)
+                grouped[parent_key].append(row)
+                back.prime(parent_key, parents[parent_key])
+
+            for parent_key in parents:
+                self.cache[parent_key] = grouped.get(parent_key, [])
+
+        return self.cache[key]
+
+
+class Loaders:
+    """
+    Registry of the batch loaders used while executing one request.
+
+    A new instance is attached to ``info.context`` for each request so that
+    nothing is shared between users or leaks across requests.
+    """
+
+    def __init__(self):
+        self._loaders = {}
+        self._cohorts = {}
+
+    def register(self, instances):
+        """
+        Record ``instances`` as one cohort and return them as a list.
+
+        Querysets are evaluated here, so resolvers can return the result
+        directly to the executor.
+        """
+        cohort = list(instances)
+        for instance in cohort:
+            self._cohorts[id(instance)] = cohort
+        return cohort
+
+    def cohort(self, instance):
+        """Return the cohort ``instance`` was loaded with."""
+        return self._cohorts.get(id(instance), (instance,))
+
+    def foreign_key(self, model, field_name):
+        """Return the forward loader for ``model.field_name``."""
+        key = ('fk', model, field_name)
+        if key not in self._loaders:
+            self._loaders[key] = ForeignKeyLoader(self, model, field_name)
+        return self._loaders[key]
+
+    def related(self, model, field_name):
+        """Return the reverse loader for ``model`` rows by ``field_name``."""
+        key = ('related', model, field_name)
+        if key not in self._loaders:
+            self._loaders[key] = RelatedListLoader(self, model, field_name)
+        return self._loaders[key]
+
+
+def get_loaders(info):
+    """
+    Return the loaders for the current request.
+
+    The GraphQL view attaches them up front; callers that execute the schema
+    directly (tests, scripts) get a registry created on first use.
+    """
+    context = info.context
+    loaders = getattr(context, 'loaders', None)
+    if loaders is None:
+        loaders = Loaders()
+        context.loaders = loaders
+    return loaders
@@ -0,0 +1,455 @@
+"""
+Operation metrics and tracing of the GraphQL endpoints.
+
+The views start a ``Trace`` per operation. It collects the parsing and
+validation time, the time spent in each resolver (``MetricsMiddleware``),
+the SQL queries run while it is current (counted by a wrapper every
+database connection gets), and finally the response size. Once the
+response is encoded the trace is folded into the process registry, labelled
+by operation name, which ``render`` exposes in the Prometheus text format
+(see the ``/metrics`` view).
+
+A request sending the ``TRACE_HEADER`` also gets the trace back in its
+``extensions``, in the Apollo tracing format, with the SQL totals added.
+Traces are as private as the metrics: the header's value must be the
+``TOKEN``, and without one the header is only honoured while ``DEBUG`` is
+on.
+
+The registry lives in each process; every worker must be scraped.
+"""
+import hmac
+import math
+import threading
+import time
+from contextvars import ContextVar
+from datetime import datetime, timedelta, timezone
+from inspect import isawaitable
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+DEFAULTS = {
+    'ENABLED': True,
+    # Time every resolver; the per-field metrics and traces need it
+    'RESOLVER_TIMING': True,
+    # Requests with this header (set to the TOKEN) get an Apollo tracing
+    # extension
+    'TRACE_HEADER': 'X-GraphQL-Trace',
+    'TRACING': True,
+    # Operation names beyond this many are reported as "other"
+    'MAX_OPERATIONS': 200,
+    # Bearer token required by the /metrics view and the trace header,
+    # which are only honoured without one while DEBUG is on
+    'TOKEN': None,
+    'LATENCY_BUCKETS': (
+        0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+    ),
+    'QUERY_COUNT_BUCKETS': (0, 1, 2, 5, 10, 20, 50, 100, 200, 500),
+    'SIZE_BUCKETS': (
+        256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304,
+    ),
+}
+
+ANONYMOUS = '<anonymous>'
+OTHER = 'other'
+
+current_trace = ContextVar('current_trace', default=None)
+
+
+def metrics_setting(name):
+    """Return a ``METRICS`` setting, or its default."""
+    return getattr(settings, 'METRICS', {}).get(name, DEFAULTS[name])
+
+
+def escape(value):
+    return (
+        str(value).replace('\\', r'\\').replace('\n', r'\n')
+        .replace('"', r'\"')
+    )
+
+
+def format_labels(names, values, extra=''):
+    pairs = [f'{name}="{escape(value)}"' for name, value in
+             zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def format_number(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """
+    Counter metric.
+
+    Attributes:
+        name (str): Metric name.
+        help (str): Description shown by ``render``.
+        labels (tuple): Label names.
+        values (dict): Value of each tuple of label values.
+    """
+
+    kind = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values = {}
+
+    def inc(self, labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        for labels, value in sorted(self.values.items()):
+            yield self.name, format_labels(self.labels, labels), value
+
+
+class Histogram:
+    """
+    Histogram metric with cumulative buckets.
+
+    Attributes:
+        buckets (tuple): Upper bounds, ending with ``+Inf``.
+        values (dict): ``[bucket counts, sum, count]`` of each tuple of
+                       label values.
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self.values = {}
+
+    def observe(self, labels, value):
+        entry = self.values.get(labels)
+        if entry is None:
+            entry = self.values[labels] = [[0] * len(self.buckets), 0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                entry[0][i] += 1
+                break
+        entry[1] += value
+        entry[2] += 1
+
+    def samples(self):
+        for labels, (counts, total, count) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, bucket in zip(self.buckets, counts):
+                cumulative += bucket
+                le = f'le="{format_number(bound)}"'
+                yield (
+                    f'{self.name}_bucket',
+                    format_labels(self.labels, labels, le), cumulative,
+                )
+            label_text = format_labels(self.labels, labels)
+            yield f'{self.name}_sum', label_text, total
+            yield f'{self.name}_count', label_text, count
+
+
+class Registry:
+    """Metrics of the GraphQL operations served by this process."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.operations = set()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.operations.clear()
+            self.duration = Histogram(
+                'graphql_request_duration_seconds',
+                'Time to serve an operation, from parsing to encoding.',
+                ('operation', 'type'), metrics_setting('LATENCY_BUCKETS'),
+            )
+            self.phases = Histogram(
+                'graphql_phase_duration_seconds',
+                'Time spent parsing, validating and executing operations.',
+                ('operation', 'phase'), metrics_setting('LATENCY_BUCKETS'),
+            )
+            self.resolver_seconds = Counter(
+                'graphql_resolver_duration_seconds_total',
+                'Time spent in the resolvers of each field.',
+                ('operation', 'field'),
+            )
+            self.resolver_calls = Counter(
+                'graphql_resolver_calls_total',
+                'Resolver calls of each field.', ('operation', 'field'),
+            )
+            self.sql_queries = Histogram(
+                'graphql_sql_queries',
+                'SQL queries run by an operation.', ('operation',),
+                metrics_setting('QUERY_COUNT_BUCKETS'),
+            )
+            self.sql_duration = Histogram(
+                'graphql_sql_duration_seconds',
+                'Time spent in SQL queries by an operation.', ('operation',),
+                metrics_setting('LATENCY_BUCKETS'),
+            )
+            self.response_size = Histogram(
+                'graphql_response_size_bytes',
+                'Size of the encoded response.', ('operation',),
+                metrics_setting('SIZE_BUCKETS'),
+            )
+            self.metrics = [
+                self.duration, self.phases, self.resolver_seconds,
+                self.resolver_calls, self.sql_queries, self.sql_duration,
+                self.response_size,
+            ]
+
+    def label(self, operation):
+        """Return the label of ``operation``, bounding their number."""
+        if operation in self.operations:
+            return operation
+        if len(self.operations) >= metrics_setting('MAX_OPERATIONS'):
+            return OTHER
+        self.operations.add(operation)
+        return operation
+
+    def record(self, trace):
+        """Fold a finished trace into the metrics."""
+        with self.lock:
+            operation = self.label(trace.operation or ANONYMOUS)
+            self.duration.observe(
+                (operation, trace.operation_type or 'unknown'),
+                trace.duration / 1e9,
+            )
+            for phase, (_, duration) in trace.phases().items():
+                self.phases.observe((operation, phase), duration / 1e9)
+            for field, (calls, duration) in trace.fields.items():
+                self.resolver_calls.inc((operation, field), calls)
+                self.resolver_seconds.inc((operation, field), duration / 1e9)
+            self.sql_queries.observe((operation,), trace.sql_queries)
+            self.sql_duration.observe((operation,), trace.sql_time / 1e9)
+            if trace.response_size is not None:
+                self.response_size.observe(
+                    (operation,), trace.response_size
+                )
+
+    def render(self):
+        """Return the metrics in the Prometheus text format."""
+        lines = []
+        with self.lock:
+            for metric in self.metrics:
+                lines.append(f'# HELP {metric.name} {escape(metric.help)}')
+                lines.append(f'# TYPE {metric.name} {metric.kind}')
+                for name, labels, value in metric.samples():
+                    lines.append(f'{name}{labels} {format_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+class Trace:
+    """
+    Timings of one operation; times are ``perf_counter_ns`` values.
+
+    Attributes:
+        tracing (bool): Whether resolver calls are kept for the response.
+        operation (str): Operation name, once known.
+        operation_type (str): ``query``, ``mutation``...
+        parsing (tuple): ``(start, end)`` of parsing, if it happened.
+        validation (tuple): ``(start, end)`` of validation.
+        execution (tuple): ``(start, end)`` of execution.
+        fields (dict): ``[calls, duration]`` of each ``Type.field``.
+        resolvers (list): Resolver calls, when tracing.
+        sql_queries (int): SQL queries run.
+        sql_time (int): Time spent in them.
+        response_size (int): Size of the encoded response.
+    """
+
+    def __init__(self, tracing=False):
+        self.token = None
+        self.start = time.perf_counter_ns()
+        self.started_at = datetime.now(timezone.utc)
+        self.end = None
+        self.tracing = tracing
+        self.time_fields = tracing or metrics_setting('RESOLVER_TIMING')
+        self.operation = None
+        self.operation_type = None
+        self.parsing = None
+        self.validation = None
+        self.execution = None
+        self.fields = {}
+        self.resolvers = []
+        self.sql_queries = 0
+        self.sql_time = 0
+        self.response_size = None
+
+    @property
+    def duration(self):
+        return (self.end or time.perf_counter_ns()) - self.start
+
+    def set_operation(self, operation_ast, operation_name=None):
+        if operation_ast is not None:
+            self.operation_type = operation_ast.operation.value
+            if operation_ast.name is not None:
+                operation_name = operation_ast.name.value
+        self.operation = operation_name or None
+
+    def add_validation(self, start, end):
+        """Count ``start`` to ``end`` as validation time."""
+        if self.validation is None:
+            self.validation = (start, end)
+        else:
+            first, last = self.validation
+            self.validation = (first, last + end - start)
+
+    def start_execution(self):
+        self.execution = (time.perf_counter_ns(), None)
+
+    def end_execution(self):
+        if self.execution is not None and self.execution[1] is None:
+            self.execution = (self.execution[0], time.perf_counter_ns())
+
+    def phases(self):
+        """Return ``{phase: (start, duration)}`` of the phases that ran."""
+        phases = {}
+        for name in ('parsing', 'validation', 'execution'):
+            span = getattr(self, name)
+            if span is not None and span[1] is not None:
+                phases[name] = (span[0], span[1] - span[0])
+        return phases
+
+    def record_field(self, info, start, end):
+        key = f'{info.parent_type.name}.{info.field_name}'
+        entry = self.fields.get(key)
+        if entry is None:
+            entry = self.fields[key] = [0, 0]
+        entry[0] += 1
+        entry[1] += end - start
+        if self.tracing:
+            self.resolvers.append({
+                'path': info.path.as_list(),
+                'parentType': info.parent_type.name,
+                'fieldName': info.field_name,
+                'returnType': str(info.return_type),
+                'startOffset': start - self.start,
+                'duration': end - start,
+            })
+
+    def finish(self, response_size=None):
+        """
+        Stop the clock, stop being current and record the trace in the
+        registry.
+        """
+        self.end_execution()
+        self.end = time.perf_counter_ns()
+        self.response_size = response_size
+        if self.token is not None:
+            current_trace.reset(self.token)
+            self.token = None
+        registry.record(self)
+
+    def extension(self):
+        """Return the Apollo tracing extension of the trace so far."""
+        now = time.perf_counter_ns()
+        duration = now - self.start
+        phases = self.phases()
+        ended_at = self.started_at + timedelta(microseconds=duration / 1000)
+        tracing = {
+            'version': 1,
+            'startTime': self.started_at.isoformat(),
+            'endTime': ended_at.isoformat(),
+            'duration': duration,
+            'execution': {'resolvers': self.resolvers},
+            'sql': {'queries': self.sql_queries, 'duration': self.sql_time},
+        }
+        for name in ('parsing', 'validation'):
+            if name in phases:
+                start, span = phases[name]
+                tracing[name] = {
+                    'startOffset': start - self.start, 'duration': span,
+                }
+        return tracing
+
+
+def authorized(credential):
+    """
+    Return whether ``credential`` unlocks the metrics and traces: it must
+    be the ``TOKEN`` if one is set, otherwise only ``DEBUG`` unlocks them.
+    """
+    token = metrics_setting('TOKEN')
+    if not token:
+        return settings.DEBUG
+    return credential is not None and hmac.compare_digest(
+        credential.encode(), token.encode()
+    )
+
+
+def start_trace(request):
+    """
+    Start the trace of an operation of ``request`` and make it current.
+    Returns ``None`` when metrics are disabled.
+    """
+    if not metrics_setting('ENABLED'):
+        return None
+    header = request.headers.get(metrics_setting('TRACE_HEADER'))
+    tracing = bool(
+        metrics_setting('TRACING') and header and authorized(header)
+    )
+    trace = Trace(tracing)
+    request.trace = trace
+    trace.token = current_trace.set(trace)
+    # Connections opened earlier in this thread did not get the wrapper
+    for connection in connections.all(initialized_only=True):
+        instrument(connection)
+    return trace
+
+
+def time_sql(execute, sql, params, many, context):
+    """Database execute wrapper adding queries to the current trace."""
+    trace = current_trace.get()
+    if trace is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter_ns()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        trace.sql_queries += 1
+        trace.sql_time += time.perf_counter_ns() - start
+
+
+def instrument(connection, **kwargs):
+    """Install ``time_sql`` on ``connection``, once."""
+    if time_sql not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_sql)
+
+
+connection_created.connect(instrument)
+
+
+class MetricsMiddleware:
+    """
+    Graphene middleware timing each resolver of a traced operation.
+
+    Placed last, so the time of the other middleware counts too. Awaitable
+    results are timed until they resolve.
+    """
+
+    def resolve(self, next, root, info, **args):
+        trace = getattr(info.context, 'trace', None)
+        if trace is None or not trace.time_fields:
+            return next(root, info, **args)
+        start = time.perf_counter_ns()
+        result = next(root, info, **args)
+        if isawaitable(result):
+            return self.await_result(trace, info, start, result)
+        trace.record_field(info, start, time.perf_counter_ns())
+        return result
+
+    async def await_result(self, trace, info, start, result):
+        try:
+            return await result
+        finally:
+            trace.record_field(info, start, time.perf_counter_ns())
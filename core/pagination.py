@@ -0,0 +1,189 @@
+"""
+Keyset (cursor) pagination shared by the connection fields.
+
+Cursors encode the values of the ordering columns of the last row seen, so
+fetching the next page is a range scan that starts at the cursor instead of
+an ``OFFSET`` that reads and discards every earlier row. The ordering keys
+must be unique together (hence the trailing ``id``) and backed by an index
+in the same order.
+"""
+import base64
+import json
+from collections import namedtuple
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Q
+from graphene import relay
+from graphql import GraphQLError
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# Newest first, with the primary key breaking ties between equal timestamps.
+FEED_KEYS = ('created_at', 'id')
+
+Page = namedtuple(
+    'Page', ['rows', 'keys', 'has_next_page', 'has_previous_page']
+)
+
+
+def encode_cursor(instance, keys=FEED_KEYS):
+    """Return the opaque cursor pointing at ``instance``."""
+    values = []
+    for key in keys:
+        value = getattr(instance, key)
+        if hasattr(value, 'isoformat'):
+            value = value.isoformat()
+        values.append(value)
+    raw = json.dumps(values, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(model, cursor, keys=FEED_KEYS):
+    """Return the ordering values encoded in ``cursor``."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if len(values) != len(keys):
+            raise ValueError(cursor)
+        return [
+            to_python(model, key, value)
+            for key, value in zip(keys, values)
+        ]
+    except Exception:
+        raise GraphQLError("Invalid cursor.")
+
+
+def to_python(model, key, value):
+    """Convert a decoded cursor value back to the type of ``key``."""
+    try:
+        field = model._meta.get_field(key)
+    except FieldDoesNotExist:
+        # Annotations such as a search rank are stored as plain JSON
+        return value
+    return field.to_python(value)
+
+
+def keyset_condition(keys, values, descending=True, forward=True):
+    """
+    Build the filter selecting rows strictly past ``values``.
+
+    For ``keys=(a, b)`` walking forward over a descending ordering this is
+    ``a < va OR (a = va AND b < vb)``.
+    """
+    lookup = 'lt' if descending == forward else 'gt'
+    condition = Q()
+    for position, key in enumerate(keys):
+        equal = dict(zip(keys[:position], values[:position]))
+        equal[f'{key}__{lookup}'] = values[position]
+        condition |= Q(**equal)
+    return condition
+
+
+def page_size(value):
+    """Validate a ``first``/``last`` argument and clamp it."""
+    if value is None:
+        return DEFAULT_PAGE_SIZE
+    if value < 0:
+        raise GraphQLError("Page size must not be negative.")
+    return min(value, MAX_PAGE_SIZE)
+
+
+def page_query(
+    queryset,
+    first=None,
+    after=None,
+    last=None,
+    before=None,
+    keys=FEED_KEYS,
+    descending=True,
+):
+    """
+    Return ``(rows, size)`` for one page of ``queryset`` ordered by
+    ``keys``, where ``rows`` is the unevaluated queryset of at most
+    ``size + 1`` rows. Backward pages (``last``) come in reverse order.
+    """
+    if first is not None and last is not None:
+        raise GraphQLError("Pass either first or last, not both.")
+
+    model = queryset.model
+    if after:
+        queryset = queryset.filter(keyset_condition(
+            keys, decode_cursor(model, after, keys), descending, True
+        ))
+    if before:
+        queryset = queryset.filter(keyset_condition(
+            keys, decode_cursor(model, before, keys), descending, False
+        ))
+
+    forward_order = [f'-{key}' if descending else key for key in keys]
+    if last is not None:
+        size = page_size(last)
+        backward_order = [
+            key[1:] if key.startswith('-') else f'-{key}'
+            for key in forward_order
+        ]
+        return queryset.order_by(*backward_order)[:size + 1], size
+    size = page_size(first)
+    return queryset.order_by(*forward_order)[:size + 1], size
+
+
+def make_page(rows, size, after=None, last=None, before=None,
+              keys=FEED_KEYS):
+    """Build the ``Page`` from the rows read by a ``page_query``."""
+    if last is not None:
+        return Page(rows[:size][::-1], keys, bool(before), len(rows) > size)
+    return Page(rows[:size], keys, len(rows) > size, bool(after))
+
+
+def paginate(
+    queryset,
+    first=None,
+    after=None,
+    last=None,
+    before=None,
+    keys=FEED_KEYS,
+    descending=True,
+):
+    """
+    Return one page of ``queryset`` ordered by ``keys``.
+
+    Only ``page size + 1`` rows are read, whichever page is requested.
+    """
+    rows, size = page_query(
+        queryset, first, after, last, before, keys, descending
+    )
+    return make_page(list(rows), size, after, last, before, keys)
+
+
+async def apaginate(
+    queryset,
+    first=None,
+    after=None,
+    last=None,
+    before=None,
+    keys=FEED_KEYS,
+    descending=True,
+):
+    """Asynchronous version of ``paginate``, using the async ORM."""
+    rows, size = page_query(
+        queryset, first, after, last, before, keys, descending
+    )
+    rows = [row async for row in rows]
+    return make_page(rows, size, after, last, before, keys)
+
+
+def to_connection(connection_type, page):
+    """Wrap ``page`` in an instance of the relay ``connection_type``."""
+    edges = [
+        connection_type.Edge(node=row, cursor=encode_cursor(row, page.keys))
+        for row in page.rows
+    ]
+    return connection_type(
+        edges=edges,
+        page_info=relay.PageInfo(
+            start_cursor=edges[0].cursor if edges else None,
+            end_cursor=edges[-1].cursor if edges else None,
+            has_next_page=page.has_next_page,
+            has_previous_page=page.has_previous_page,
+        ),
+    )
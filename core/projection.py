@@ -0,0 +1,83 @@
+"""
+Column projection driven by the GraphQL selection set.
+
+List resolvers restrict their querysets with ``project`` so that
+``allPosts { id title }`` reads two columns instead of every post's content
+and image path. A selected model field loads its column (the ``_id``
+column for a foreign key, which is all the batch loaders of
+``core.loaders`` read); other selected fields load the columns their
+resolvers are declared to read, or nothing. Relations are still resolved
+by the batch loaders, one ``IN (...)`` query per level of the selection,
+which is what ``prefetch_related`` would do without sharing rows between
+the branches of an operation.
+
+Fragments and inline fragments are merged and ``@skip``/``@include`` are
+ignored, so a projection may load a column too many but never one too few.
+"""
+from graphene.utils.str_converters import to_camel_case
+from graphql import FieldNode, FragmentSpreadNode, InlineFragmentNode
+
+
+def _fields(info, selection_set):
+    """Yield the field nodes of ``selection_set``, through fragments."""
+    if selection_set is None:
+        return
+    for selection in selection_set.selections:
+        if isinstance(selection, FieldNode):
+            yield selection
+        elif isinstance(selection, FragmentSpreadNode):
+            fragment = info.fragments[selection.name.value]
+            yield from _fields(info, fragment.selection_set)
+        elif isinstance(selection, InlineFragmentNode):
+            yield from _fields(info, selection.selection_set)
+
+
+def selected_fields(info, *path):
+    """
+    Return the names of the fields selected on the result of the field
+    being resolved, or below ``path`` (e.g. ``'edges', 'node'`` for a
+    connection).
+    """
+    nodes = info.field_nodes
+    for name in path:
+        nodes = [
+            child for node in nodes
+            for child in _fields(info, node.selection_set)
+            if child.name.value == name
+        ]
+    return {
+        child.name.value for node in nodes
+        for child in _fields(info, node.selection_set)
+    }
+
+
+def columns_for(model, selected, columns=None, keys=()):
+    """
+    Return the names of the fields of ``model`` behind ``selected``.
+
+    ``columns`` maps fields that aren't model fields to the model fields
+    their resolvers read (e.g. ``depth`` to ``path``); ``keys`` are always
+    loaded, typically the ordering keys cursors are encoded from.
+    """
+    columns = columns or {}
+    concrete = {
+        to_camel_case(field.name): field.name
+        for field in model._meta.concrete_fields
+    }
+    names = {model._meta.pk.name, *keys}
+    for name in selected:
+        if name in concrete:
+            names.add(concrete[name])
+        names.update(columns.get(name, ()))
+    return names
+
+
+def project(queryset, info, *path, columns=None, keys=()):
+    """
+    Restrict ``queryset`` to the columns the fields selected below
+    ``path`` need; see ``columns_for`` for ``columns`` and ``keys``.
+    """
+    selected = selected_fields(info, *path)
+    return queryset.only(
+        *sorted(columns_for(queryset.model, selected, columns, keys))
+    )
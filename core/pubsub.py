@@ -0,0 +1,247 @@
+"""
+Publish/subscribe layer behind the GraphQL subscriptions.
+
+Mutations call ``publish`` with a channel name (``posts``,
+``post:12:reactions``...) and a small JSON-serializable message, usually an
+id; the message goes out once the transaction commits, so subscribers never
+see rows that are rolled back. Subscription resolvers iterate over
+``listen(channel)``.
+
+The backend is chosen with the ``PUBSUB`` setting. ``InProcessBackend``
+delivers within the current process only, which suits tests and single-node
+deployments; a multi-node deployment plugs in a backend relaying the same
+two calls through a broker.
+
+Channels whose messages only mean "something changed" are followed with
+``watch``, which coalesces each channel once per event loop and loads the
+changed object once for all of its watchers.
+"""
+import asyncio
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+DEFAULTS = {
+    'BACKEND': 'core.pubsub.InProcessBackend',
+    # Messages queued per subscriber before the oldest are dropped
+    'BUFFER_SIZE': 100,
+    # Minimum seconds between two coalesced updates of one channel
+    'COALESCE_INTERVAL': 0.5,
+}
+
+
+def pubsub_setting(name):
+    """Return a ``PUBSUB`` setting, or its default."""
+    return getattr(settings, 'PUBSUB', {}).get(name, DEFAULTS[name])
+
+
+class PubSubBackend:
+    """Interface of the pub/sub backends."""
+
+    def publish(self, channel, message):
+        """Send ``message`` to the subscribers of ``channel``."""
+        raise NotImplementedError
+
+    def listen(self, channel):
+        """Return an async iterator over the messages of ``channel``."""
+        raise NotImplementedError
+
+
+class Subscriber:
+    """
+    Queue of one listener, fed from any thread.
+
+    Attributes:
+        loop (AbstractEventLoop): Loop the listener runs on.
+        queue (asyncio.Queue): Messages not consumed yet.
+    """
+
+    def __init__(self, loop, maxsize):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize)
+
+    def put(self, message):
+        """Queue ``message``; safe to call from other threads."""
+        try:
+            self.loop.call_soon_threadsafe(self._put, message)
+        except RuntimeError:
+            # The listener's loop is closed; it is going away
+            pass
+
+    def _put(self, message):
+        if self.queue.full():
+            # A slow consumer loses its oldest messages, not the newest
+            self.queue.get_nowait()
+        self.queue.put_nowait(message)
+
+
+class InProcessBackend(PubSubBackend):
+    """Backend delivering messages to listeners of this process."""
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscriber in subscribers:
+            subscriber.put(message)
+
+    async def listen(self, channel):
+        subscriber = Subscriber(
+            asyncio.get_running_loop(), pubsub_setting('BUFFER_SIZE')
+        )
+        with self._lock:
+            self._subscribers[channel].add(subscriber)
+        try:
+            while True:
+                yield await subscriber.queue.get()
+        finally:
+            with self._lock:
+                self._subscribers[channel].discard(subscriber)
+                if not self._subscribers[channel]:
+                    del self._subscribers[channel]
+
+    def subscriber_count(self, channel):
+        """Return the number of listeners of ``channel``."""
+        with self._lock:
+            return len(self._subscribers.get(channel, ()))
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """Return the process wide backend, creating it on first use."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = import_string(pubsub_setting('BACKEND'))()
+        return _backend
+
+
+def publish(channel, message):
+    """Publish ``message`` on ``channel`` once the transaction commits."""
+    transaction.on_commit(lambda: get_backend().publish(channel, message))
+
+
+def listen(channel):
+    """Return an async iterator over the messages of ``channel``."""
+    return get_backend().listen(channel)
+
+
+async def coalesce(messages, interval=None):
+    """
+    Throttle an async iterator of messages.
+
+    The first message is yielded at once; after that at most one message is
+    yielded per ``interval`` seconds, the latest one received, and those in
+    between are dropped. Suited to streams where each message means
+    "something changed" rather than carrying data of its own.
+    """
+    if interval is None:
+        interval = pubsub_setting('COALESCE_INTERVAL')
+    latest = []
+    received = asyncio.Event()
+
+    async def pump():
+        async for message in messages:
+            latest[:] = [message]
+            received.set()
+
+    pumping = asyncio.ensure_future(pump())
+    try:
+        while True:
+            waiting = asyncio.ensure_future(received.wait())
+            await asyncio.wait(
+                {waiting, pumping}, return_when=asyncio.FIRST_COMPLETED
+            )
+            if not waiting.done():
+                waiting.cancel()
+                # The source ended (or failed, which this re-raises)
+                pumping.result()
+                return
+            received.clear()
+            yield latest.pop()
+            await asyncio.sleep(interval)
+    finally:
+        pumping.cancel()
+
+
+class SharedFeed:
+    """
+    Coalesced updates of one channel, shared by the watchers of one loop.
+
+    A single task listens to the channel, throttles it with ``coalesce``,
+    loads each update once and queues the result for every watcher.
+
+    Attributes:
+        watchers (set): Queues of the watchers, holding the latest result.
+        task (Task): Task listening to the channel.
+    """
+
+    def __init__(self, channel, load, interval):
+        self.watchers = set()
+        self.task = asyncio.ensure_future(self.run(channel, load, interval))
+
+    async def run(self, channel, load, interval):
+        async for message in coalesce(listen(channel), interval):
+            result = await load(message)
+            for watcher in list(self.watchers):
+                watcher._put(result)
+
+
+_feeds = {}
+_feeds_lock = threading.Lock()
+
+
+async def watch(channel, load, interval=None):
+    """
+    Async iterator over the coalesced updates of ``channel``, each turned
+    into the result of ``await load(message)``.
+
+    The watchers of a channel on one event loop share one listener and one
+    ``load`` per update, so ``load`` must not depend on the watcher. A
+    watcher that falls behind only gets the latest result.
+    """
+    loop = asyncio.get_running_loop()
+    key = (loop, channel)
+    with _feeds_lock:
+        feed = _feeds.get(key)
+        if feed is None or feed.task.done():
+            feed = _feeds[key] = SharedFeed(channel, load, interval)
+        watcher = Subscriber(loop, 1)
+        feed.watchers.add(watcher)
+    try:
+        while True:
+            getting = asyncio.ensure_future(watcher.queue.get())
+            await asyncio.wait(
+                {getting, feed.task}, return_when=asyncio.FIRST_COMPLETED
+            )
+            if not getting.done():
+                getting.cancel()
+                # The feed ended (or failed, which this re-raises)
+                feed.task.result()
+                return
+            yield getting.result()
+    finally:
+        with _feeds_lock:
+            feed.watchers.discard(watcher)
+            if not feed.watchers:
+                feed.task.cancel()
+                if _feeds.get(key) is feed:
+                    del _feeds[key]
+
+
+def watcher_count(channel):
+    """Return the number of watchers of ``channel`` on any loop."""
+    with _feeds_lock:
+        return sum(
+            len(feed.watchers) for (_, watched), feed in _feeds.items()
+            if watched == channel
+        )
@@ -0,0 +1,133 @@
+"""
+Read replicas with read-your-writes stickiness.
+
+``ReplicaRouter`` sends every write to the primary (``default``). Reads go
+to a replica only inside ``replica_reads``, which the GraphQL view wraps
+around the execution of query operations; mutations, subscriptions, the
+admin, background jobs and everything else read from the primary. One
+replica is picked per operation, so an operation sees a single snapshot,
+and once an operation writes, its remaining reads go to the primary.
+
+Replication lags, so a user who just mutated could read the state from
+before their change. ``pin_user`` records that user in the Django cache
+for ``STICKY_SECONDS``; their query operations then read from the primary
+until the pin expires. The pin must reach every process, so a
+process-local ``CACHE_ALIAS`` fails the system checks (see
+``core.checks``).
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+
+DEFAULTS = {
+    # Aliases of DATABASES that replicate the primary
+    'DATABASES': [],
+    # Seconds a user reads from the primary after a mutation
+    'STICKY_SECONDS': 10,
+    # Seconds replicas may lag; replica reads are only cached by the
+    # response cache when no tag changed within that time
+    'MAX_LAG': 5,
+    'CACHE_ALIAS': 'default',
+}
+
+PREFIX = 'replicas:pinned:'
+
+
+def replica_setting(name):
+    """Return a ``REPLICAS`` setting, or its default."""
+    return getattr(settings, 'REPLICAS', {}).get(name, DEFAULTS[name])
+
+
+class Route:
+    """
+    Where the reads of the current operation go.
+
+    Attributes:
+        alias (str): The replica reads go to, or ``None`` for the primary.
+    """
+
+    def __init__(self, alias):
+        self.alias = alias
+
+
+# Shared by the threads resolving one operation, which copy the context
+current_route = ContextVar('current_route', default=None)
+
+
+def _pin_key(user):
+    return f'{PREFIX}{user.pk}'
+
+
+def pin_user(user):
+    """Make ``user`` read from the primary for ``STICKY_SECONDS``."""
+    if user is None or not user.is_authenticated:
+        return
+    if not replica_setting('DATABASES'):
+        return
+    caches[replica_setting('CACHE_ALIAS')].set(
+        _pin_key(user), True, replica_setting('STICKY_SECONDS')
+    )
+
+
+def is_pinned(user):
+    """Whether ``user`` mutated too recently to read from a replica."""
+    if user is None or not user.is_authenticated:
+        return False
+    return caches[replica_setting('CACHE_ALIAS')].get(
+        _pin_key(user), False
+    )
+
+
+def choose_replica(user):
+    """Return the replica ``user`` may read from, or ``None``."""
+    aliases = replica_setting('DATABASES')
+    if not aliases or is_pinned(user):
+        return None
+    return random.choice(aliases)
+
+
+@contextmanager
+def replica_reads(alias):
+    """
+    Route the reads made in the block to the replica ``alias`` (see
+    ``choose_replica``), or to the primary when it's ``None``.
+    """
+    token = current_route.set(Route(alias))
+    try:
+        yield
+    finally:
+        current_route.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Database router of the primary and its replicas.
+
+    Migrations are left to the default behaviour: ``migrate`` only targets
+    the database it is given, and replicas receive the schema through
+    replication.
+    """
+
+    def db_for_read(self, model, **hints):
+        route = current_route.get()
+        if route is None:
+            return None
+        return route.alias or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        route = current_route.get()
+        if route is not None:
+            # Read what was just written from where it was written
+            route.alias = None
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Rows read from a replica are rows of the primary
+        databases = {DEFAULT_DB_ALIAS, *replica_setting('DATABASES')}
+        if {obj1._state.db, obj2._state.db} <= databases:
+            return True
+        return None
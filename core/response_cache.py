@@ -0,0 +1,178 @@
+"""
+Response cache for read-only GraphQL operations.
+
+Query results are stored in Django's cache under a key derived from the
+document hash, the variables, the operation name and the auth scope of the
+caller. While an operation executes, ``CacheTagMiddleware`` records a tag
+for every model instance whose fields are resolved (``post:12``,
+``comment:7``...) and for the collections read by root fields (``posts``,
+``trending``...). Mutations call ``invalidate`` with exactly the tags they
+dirty.
+
+Each tag has a token (the time it was last invalidated). An entry stores the
+tokens of its tags and is only served while all of them are unchanged, so
+invalidation is a single cache write per tag and nothing relies on TTLs. An
+entry whose tags were invalidated while it was being computed is not stored.
+Tokens only reach every process through a shared cache, so a process-local
+``CACHE_ALIAS`` fails the system checks (see ``core.checks``).
+"""
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Model
+from graphql_jwt.exceptions import JSONWebTokenError
+from graphql_jwt.utils import get_http_authorization
+from .auth import authenticate_request
+
+DEFAULTS = {
+    'CACHE_ALIAS': 'default',
+    'TIMEOUT': 300,
+    'ENABLED': True,
+}
+
+PREFIX = 'rc:'
+
+
+def response_cache_setting(name):
+    """Return a ``RESPONSE_CACHE`` setting, or its default."""
+    return getattr(settings, 'RESPONSE_CACHE', {}).get(name, DEFAULTS[name])
+
+
+def get_cache():
+    return caches[response_cache_setting('CACHE_ALIAS')]
+
+
+def tag_for(model, pk):
+    """Return the tag of one model instance, e.g. ``post:12``."""
+    return f'{model._meta.model_name}:{pk}'
+
+
+def _post_lists(args):
+    tags = {'posts'}
+    if {'interaction_type', 'interactions_count_above',
+            'interactions_count_below'} & set(args):
+        # Membership of these lists changes with every reaction
+        tags.add('posts:reactions')
+    return tags
+
+
+# Collections read by each cacheable root field. Root fields missing from
+# this map (homeFeed, loggedUser...) make the operation uncacheable.
+ROOT_FIELD_TAGS = {
+    'allPosts': _post_lists,
+    'postsConnection': _post_lists,
+    'searchPosts': lambda args: {'posts'},
+    'trendingPosts': lambda args: {'trending'},
+    'post': lambda args: {f"post:{args.get('id')}"},
+    'commentsForPost': lambda args: {f"post:{args.get('post_id')}"},
+    'commentThread': lambda args: {f"comment:{args.get('comment_id')}"},
+    'interactions': lambda args: {'interactions'},
+}
+
+
+def auth_scope(request):
+    """
+    Return the part of the cache key that depends on the caller.
+
+    JWT authentication normally happens in the GraphQL middleware, so the
+    token is checked here and ``request.user`` set ahead of execution.
+    Returns ``None`` for a bad token, leaving the error to the resolvers.
+    """
+    try:
+        user = authenticate_request(request)
+    except JSONWebTokenError:
+        return None
+    if user is None and get_http_authorization(request) is not None:
+        return None
+    if user is None or not user.is_authenticated:
+        return 'anonymous'
+    return f'user:{user.pk}'
+
+
+def cache_key(document_key, variables, operation_name, scope):
+    """Return the cache key of one operation for one auth scope."""
+    raw = json.dumps(
+        [document_key, variables or {}, operation_name, scope],
+        sort_keys=True, default=str,
+    )
+    return PREFIX + hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _tag_key(tag):
+    return f'{PREFIX}tag:{tag}'
+
+
+def lookup(key):
+    """Return the cached ``data`` for ``key`` if every tag is current."""
+    cache = get_cache()
+    entry = cache.get(key)
+    if entry is None:
+        return None
+    tokens = cache.get_many([_tag_key(tag) for tag in entry['tags']])
+    for tag, token in entry['tags'].items():
+        if tokens.get(_tag_key(tag)) != token:
+            return None
+    return entry['data']
+
+
+def store(key, data, tags, started):
+    """
+    Cache ``data`` under ``key`` with the current tokens of ``tags``.
+
+    Nothing is stored when a tag was invalidated after ``started``, since
+    the data may predate that change.
+    """
+    cache = get_cache()
+    keys = {_tag_key(tag): tag for tag in tags}
+    tokens = cache.get_many(list(keys))
+    for tag_key in keys:
+        if tag_key not in tokens:
+            # First use of the tag: give it a token that is older than
+            # any change the resolvers could have missed.
+            cache.add(tag_key, started, None)
+            tokens[tag_key] = cache.get(tag_key)
+    if any(token is None or token > started for token in tokens.values()):
+        return False
+    cache.set(
+        key,
+        {'data': data, 'tags': {keys[k]: v for k, v in tokens.items()}},
+        response_cache_setting('TIMEOUT'),
+    )
+    return True
+
+
+def invalidate(*tags):
+    """Evict every cached response tagged with one of ``tags``."""
+    def bump():
+        now = time.time()
+        get_cache().set_many(
+            {_tag_key(tag): now for tag in tags}, timeout=None
+        )
+    # After commit, so a concurrent read cannot re-cache the old rows
+    transaction.on_commit(bump)
+
+
+class CacheTagMiddleware:
+    """
+    Graphene middleware recording the tags of a cacheable operation.
+
+    It only does work when the view has put a ``cache_tags`` set on the
+    request, i.e. for read-only operations that may be cached.
+    """
+
+    def resolve(self, next, root, info, **args):
+        tags = getattr(info.context, 'cache_tags', None)
+        if tags is not None:
+            if root is None and info.parent_type.name == 'Query':
+                rule = ROOT_FIELD_TAGS.get(info.field_name)
+                if rule is None:
+                    info.context.cacheable = False
+                else:
+                    tags.update(rule(args))
+            elif isinstance(root, Model):
+                tags.add(tag_for(type(root), root.pk))
+        return next(root, info, **args)
@@ -0,0 +1,42 @@
+"""
+Test runner of the project.
+
+Tests roll their database back, while the response cache and the token
+cache would outlive them, so both are turned off for the run; tests of
+those caches turn them back on with ``override_settings``. An unreplicated
+SQLite ``replica1`` is added for the replica routing tests, which enable it
+the same way.
+"""
+import dj_database_url
+from django.conf import settings
+from django.db import connections
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+    """``DiscoverRunner`` with the settings described above."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        if 'replica1' not in settings.DATABASES:
+            settings.DATABASES['replica1'] = dj_database_url.parse(
+                'sqlite://:memory:'
+            )
+            connections.settings = connections.configure_settings(
+                settings.DATABASES
+            )
+        self.overrides = override_settings(
+            RESPONSE_CACHE={
+                **getattr(settings, 'RESPONSE_CACHE', {}), 'ENABLED': False,
+            },
+            AUTH_CACHE={
+                **getattr(settings, 'AUTH_CACHE', {}), 'ENABLED': False,
+            },
+            REPLICAS={**getattr(settings, 'REPLICAS', {}), 'DATABASES': []},
+        )
+        self.overrides.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.overrides.disable()
+        super().teardown_test_environment(**kwargs)
@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 import os
 from pathlib import Path
 import dj_database_url
+import environ
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -44,6 +45,7 @@ INSTALLED_APPS = [
     'users',
     'posts',
     'interactions',
+    'core',
 ]
 
 MIDDLEWARE = [
@@ -93,6 +95,39 @@ DATABASES = {
 
 }
 
+# Read replicas of the primary, as comma separated URLs, become the aliases
+# replica1, replica2... Query operations read from them, mutations and
+# everything else use the primary (see core/replicas.py).
+
+for number, url in enumerate(
+    filter(None, os.environ.get('DATABASE_REPLICA_URLS', '').split(',')),
+    start=1,
+):
+    DATABASES[f'replica{number}'] = dj_database_url.parse(url)
+
+DATABASE_ROUTERS = ['core.replicas.ReplicaRouter']
+
+REPLICAS = {
+    "DATABASES": [alias for alias in DATABASES if alias != 'default'],
+    # Users read from the primary this long after a mutation
+    "STICKY_SECONDS": int(os.environ.get('REPLICA_STICKY_SECONDS', '10')),
+    "MAX_LAG": 5,
+    "CACHE_ALIAS": "default",
+}
+
+# A cache shared by every process, such as CACHE_URL=redis://cache:6379/0
+# (any django-environ cache URL). Without one, each process has Django's
+# local memory cache, which the response cache refuses (see core/checks.py).
+
+if os.environ.get('CACHE_URL'):
+    CACHES = {
+        'default': environ.Env.cache_url_config(os.environ['CACHE_URL']),
+    }
+
+# Tests run with the caches outliving a test off (see core/runner.py)
+
+TEST_RUNNER = 'core.runner.TestRunner'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -135,6 +170,43 @@ STATIC_URL = 'static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Media files are named by content hash and stored once (see
+# posts/storage.py)
+
+STORAGES = {
+    "default": {
+        "BACKEND": "posts.storage.ContentAddressedStorage",
+    },
+    "staticfiles": {
+        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
+    },
+}
+
+# Media is served by posts.views.serve_media. With "x-sendfile" or
+# "x-accel-redirect" it only checks the request and lets the web server
+# send the file; nginx needs an internal location at ACCEL_REDIRECT_PREFIX
+# aliased to MEDIA_ROOT.
+
+MEDIA_SERVING = {
+    "BACKEND": os.environ.get('MEDIA_SERVING_BACKEND', 'django'),
+    "ACCEL_REDIRECT_PREFIX": "/protected-media/",
+}
+
+# Pub/sub layer of the GraphQL subscriptions (see core.pubsub); the
+# in-process backend only reaches websockets served by this process
+
+PUBSUB = {
+    "BACKEND": "core.pubsub.InProcessBackend",
+    "COALESCE_INTERVAL": 0.5,
+}
+
+# Stream every upload to a temporary file, which storage then moves into
+# place, instead of holding small ones in memory
+
+FILE_UPLOAD_HANDLERS = [
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -150,11 +222,114 @@ AUTH_USER_MODEL = "users.CustomUser"
 GRAPHENE = {
     "SCHEMA": "core.combined_schema.schema",
     "MIDDLEWARE": [
-        "graphql_jwt.middleware.JSONWebTokenMiddleware",
+        "core.auth.JSONWebTokenMiddleware",
+        "core.response_cache.CacheTagMiddleware",
+        "core.metrics.MetricsMiddleware",
     ],
 }
 
 AUTHENTICATION_BACKENDS = [
-    "graphql_jwt.backends.JSONWebTokenBackend",
+    "core.auth.CachedJSONWebTokenBackend",
     "django.contrib.auth.backends.ModelBackend",
 ]
+
+# Verified tokens are mapped to their user for a short while, so repeated
+# requests skip decoding and the user query (see core/auth.py).
+
+AUTH_CACHE = {
+    "ENABLED": os.environ.get('GRAPHQL_AUTH_CACHE', '1') == '1',
+    "TIMEOUT": 60,
+    "MAX_SIZE": 1024,
+}
+
+# Operation metrics exposed on /metrics in the Prometheus text format, to
+# clients sending "Authorization: Bearer $METRICS_TOKEN" (or to anyone while
+# DEBUG is on and no token is set); requests whose trace header holds the
+# same token get Apollo tracing in their extensions (see core/metrics.py)
+
+METRICS = {
+    "ENABLED": os.environ.get('GRAPHQL_METRICS', '1') == '1',
+    "RESOLVER_TIMING": True,
+    "TRACE_HEADER": "X-GraphQL-Trace",
+    "TOKEN": os.environ.get('METRICS_TOKEN') or None,
+}
+
+# Background jobs run on a per-process thread pool after commit
+
+BACKGROUND_WORKERS = int(os.environ.get('BACKGROUND_WORKERS', '4'))
+
+# Home feed setup
+
+FEED = {
+    # Authors with at least this many followers are merged into home feeds
+    # at read time instead of being fanned out to every follower on write.
+    "CELEBRITY_FOLLOWER_THRESHOLD": int(
+        os.environ.get('FEED_CELEBRITY_FOLLOWER_THRESHOLD', '10000')
+    ),
+    "FANOUT_BATCH_SIZE": 1000,
+    "BACKFILL_POSTS": 50,
+}
+
+# Trending ranking setup
+
+TRENDING = {
+    # Half-life in seconds of the activity decay behind each window
+    "HALF_LIVES": {"hour": 3600, "day": 86400, "week": 604800},
+    "WEIGHTS": {"interaction": 1.0, "comment": 2.0, "share": 3.0},
+    # rescale_trending moves a window's epoch once its scores grew 2**N
+    "RESCALE_HALF_LIVES": 64,
+}
+
+# GraphQL cost analysis: operations above these budgets are rejected
+# during validation, before any resolver runs (see core/cost.py)
+
+GRAPHQL_COST = {
+    "MAX_COST": int(os.environ.get('GRAPHQL_MAX_COST', '10000')),
+    "MAX_DEPTH": int(os.environ.get('GRAPHQL_MAX_DEPTH', '10')),
+}
+
+# Automatic persisted queries live in the Django cache; parsed documents
+# are kept in a per-process LRU (see core/documents.py)
+
+PERSISTED_QUERIES = {
+    "CACHE_ALIAS": "default",
+    "TIMEOUT": None,
+    "DOCUMENT_CACHE_SIZE": 1000,
+}
+
+# Read-only operations are cached per auth scope and evicted by the tags
+# mutations dirty (see core/response_cache.py). Every process must see the
+# same cache, so it is off unless CACHE_URL configures a shared one.
+
+RESPONSE_CACHE = {
+    "CACHE_ALIAS": "default",
+    "TIMEOUT": 300,
+    "ENABLED": os.environ.get(
+        'GRAPHQL_RESPONSE_CACHE', '1' if os.environ.get('CACHE_URL') else '0'
+    ) == '1',
+}
+
+# Post counters: "immediate" applies each delta with one UPDATE; "buffered"
+# sums them in memory and flushes in batches (see posts/counters.py)
+
+COUNTERS = {
+    "MODE": os.environ.get('POST_COUNTERS_MODE', 'immediate'),
+    "FLUSH_INTERVAL": 1.0,
+    "FLUSH_SIZE": 500,
+}
+
+# Post_Reaction_Set: with ONE_PER_USER, setting a reaction replaces the
+# user's other reactions on the post (see interactions/reactions.py)
+
+REACTIONS = {
+    "ONE_PER_USER": os.environ.get('ONE_REACTION_PER_USER', '0') == '1',
+}
+
+# Post images are resized into these variants by a pool of worker
+# processes after the post is created (see posts/images.py)
+
+POST_IMAGES = {
+    "SIZES": {"thumbnail": 160, "medium": 640, "large": 1280},
+    "FORMATS": ("webp", "jpeg"),
+    "PROCESSES": int(os.environ.get('POST_IMAGE_PROCESSES', '2')),
+}
@@ -0,0 +1,298 @@
+"""
+GraphQL subscriptions over websockets.
+
+``GraphQLWebSocketApp`` is a plain ASGI application speaking the
+``graphql-transport-ws`` protocol (the one of the ``graphql-ws`` client
+library), so no extra server package is needed. Each ``subscribe`` message
+starts a task that iterates over the subscription's source stream (fed by
+``core.pubsub``) and executes the selection for every event, with fresh
+batch loaders, on graphql-core's async executor.
+
+The token may be sent as ``Authorization`` in the ``connection_init``
+payload or as the handshake's ``Authorization`` header; without one the
+connection is anonymous.
+"""
+import asyncio
+import json
+from inspect import isawaitable
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.db import close_old_connections
+from graphene_django.settings import graphene_settings
+from graphql import (
+    ExecutionResult, GraphQLError, OperationType, create_source_event_stream,
+    execute, get_operation_ast, validate,
+)
+from graphql_jwt.exceptions import JSONWebTokenError
+from graphql_jwt.settings import jwt_settings
+from graphql_jwt.shortcuts import get_user_by_token
+
+from .async_execution import AsyncBridgeMiddleware
+from .cost import cost_rule
+from .documents import get_document, persisted_queries
+from .loaders import Loaders
+
+PROTOCOL = 'graphql-transport-ws'
+
+# Seconds a client has to send connection_init after connecting
+INIT_TIMEOUT = 10
+
+# Close codes of the protocol
+BAD_REQUEST = 4400
+UNAUTHORIZED = 4401
+FORBIDDEN = 4403
+INIT_TIMED_OUT = 4408
+DUPLICATE_SUBSCRIBER = 4409
+TOO_MANY_INITS = 4429
+
+
+class SubscriptionContext:
+    """
+    ``info.context`` of subscription resolvers, standing in for a request.
+
+    Attributes:
+        user (User): The authenticated user, or an ``AnonymousUser``.
+        scope (dict): ASGI scope of the connection.
+        loaders (Loaders): Batch loaders of one event.
+    """
+
+    def __init__(self, user, scope):
+        self.user = user
+        self.scope = scope
+        self.loaders = Loaders()
+        self.cache_tags = None
+
+
+def token_from(value):
+    """Return the token of an ``Authorization`` value such as ``JWT x``."""
+    if not value:
+        return None
+    prefix, _, token = str(value).partition(' ')
+    if token and prefix.lower() == jwt_settings.JWT_AUTH_HEADER_PREFIX.lower():
+        return token
+    return None
+
+
+class Connection:
+    """One websocket connection and its running subscriptions."""
+
+    def __init__(self, scope, receive, send):
+        self.scope = scope
+        self.receive = receive
+        self.send = send
+        self.schema = graphene_settings.SCHEMA.graphql_schema
+        self.user = AnonymousUser()
+        self.acknowledged = False
+        self.operations = {}
+        self.closed = False
+
+    async def send_json(self, message):
+        if not self.closed:
+            await self.send({
+                'type': 'websocket.send', 'text': json.dumps(message),
+            })
+
+    async def close(self, code, reason=''):
+        if not self.closed:
+            self.closed = True
+            await self.send({
+                'type': 'websocket.close', 'code': code, 'reason': reason,
+            })
+
+    async def run(self):
+        event = await self.receive()
+        if event['type'] != 'websocket.connect':
+            return
+        if PROTOCOL not in self.scope.get('subprotocols', ()):
+            await self.close(BAD_REQUEST, 'Unsupported subprotocol.')
+            return
+        await self.send({'type': 'websocket.accept', 'subprotocol': PROTOCOL})
+
+        timeout = asyncio.get_running_loop().call_later(
+            INIT_TIMEOUT, lambda: asyncio.ensure_future(
+                self.close_unacknowledged()
+            )
+        )
+        try:
+            while not self.closed:
+                event = await self.receive()
+                if event['type'] == 'websocket.disconnect':
+                    self.closed = True
+                elif event['type'] == 'websocket.receive':
+                    await self.handle(event.get('text'))
+        finally:
+            timeout.cancel()
+            for task in self.operations.values():
+                task.cancel()
+            await asyncio.gather(
+                *self.operations.values(), return_exceptions=True
+            )
+
+    async def close_unacknowledged(self):
+        if not self.acknowledged:
+            await self.close(INIT_TIMED_OUT, 'Connection initialisation '
+                                             'timeout')
+
+    async def handle(self, text):
+        try:
+            message = json.loads(text or '')
+            kind = message['type']
+        except (ValueError, TypeError, KeyError):
+            await self.close(BAD_REQUEST, 'Invalid message.')
+            return
+
+        if kind == 'connection_init':
+            await self.initialise(message.get('payload') or {})
+        elif kind == 'ping':
+            await self.send_json({'type': 'pong'})
+        elif kind == 'pong':
+            pass
+        elif kind == 'subscribe':
+            await self.subscribe(message.get('id'), message.get('payload'))
+        elif kind == 'complete':
+            task = self.operations.pop(message.get('id'), None)
+            if task is not None:
+                task.cancel()
+        else:
+            await self.close(BAD_REQUEST, f'Unexpected message {kind!r}.')
+
+    async def initialise(self, payload):
+        if self.acknowledged:
+            await self.close(
+                TOO_MANY_INITS, 'Too many initialisation requests'
+            )
+            return
+        headers = dict(self.scope.get('headers', ()))
+        token = token_from(payload.get('Authorization')) or token_from(
+            headers.get(b'authorization', b'').decode('latin-1')
+        )
+        if token is not None:
+            try:
+                self.user = await sync_to_async(get_user_by_token)(token)
+            except JSONWebTokenError:
+                await self.close(FORBIDDEN, 'Forbidden')
+                return
+        self.acknowledged = True
+        await self.send_json({'type': 'connection_ack'})
+
+    async def subscribe(self, id, payload):
+        if not self.acknowledged:
+            await self.close(UNAUTHORIZED, 'Unauthorized')
+            return
+        if not id or not isinstance(payload, dict):
+            await self.close(BAD_REQUEST, 'Invalid subscribe message.')
+            return
+        if id in self.operations:
+            await self.close(
+                DUPLICATE_SUBSCRIBER, f'Subscriber for {id} already exists'
+            )
+            return
+        self.operations[id] = asyncio.ensure_future(self.operate(id, payload))
+
+    def context(self):
+        return SubscriptionContext(self.user, self.scope)
+
+    async def prepare(self, payload):
+        """Return ``(document, errors)`` for a subscribe payload."""
+        variables = payload.get('variables') or {}
+        operation_name = payload.get('operationName')
+        try:
+            query, key = await sync_to_async(persisted_queries.resolve)(
+                payload.get('query'), payload.get('extensions')
+            )
+        except GraphQLError as e:
+            return None, [e]
+        if not query:
+            return None, [GraphQLError("Must provide query string.")]
+
+        document, errors = get_document(self.schema, query, key)
+        if errors:
+            return None, errors
+        operation_ast = get_operation_ast(document, operation_name)
+        if (
+            operation_ast is None
+            or operation_ast.operation != OperationType.SUBSCRIPTION
+        ):
+            return None, [GraphQLError(
+                "Only subscriptions are served over websockets."
+            )]
+        return document, validate(
+            self.schema, document,
+            [cost_rule(variables, operation_name)],
+        )
+
+    async def operate(self, id, payload):
+        """Run one subscription until it ends or is cancelled."""
+        try:
+            document, errors = await self.prepare(payload)
+            if errors:
+                await self.send_json({
+                    'id': id, 'type': 'error',
+                    'payload': [error.formatted for error in errors],
+                })
+                return
+
+            options = {
+                'variable_values': payload.get('variables') or {},
+                'operation_name': payload.get('operationName'),
+            }
+            stream = await create_source_event_stream(
+                self.schema, document, context_value=self.context(),
+                **options,
+            )
+            if isinstance(stream, ExecutionResult):
+                await self.send_json({
+                    'id': id, 'type': 'error',
+                    'payload': [error.formatted for error in stream.errors],
+                })
+                return
+
+            try:
+                async for event in stream:
+                    result = execute(
+                        self.schema, document, root_value=event,
+                        context_value=self.context(),
+                        middleware=[AsyncBridgeMiddleware()], **options,
+                    )
+                    if isawaitable(result):
+                        result = await result
+                    await self.send_json({
+                        'id': id, 'type': 'next',
+                        'payload': result.formatted,
+                    })
+                    # As at the end of a request
+                    await sync_to_async(close_old_connections)()
+            finally:
+                aclose = getattr(stream, 'aclose', None)
+                if aclose is not None:
+                    await aclose()
+            await self.send_json({'id': id, 'type': 'complete'})
+        except Exception as e:
+            await self.send_json({
+                'id': id, 'type': 'error',
+                'payload': [GraphQLError(str(e)).formatted],
+            })
+        finally:
+            if self.operations.get(id) is asyncio.current_task():
+                del self.operations[id]
+
+
+class GraphQLWebSocketApp:
+    """
+    ASGI application routing websockets on ``path`` to the subscription
+    server and everything else to ``application`` (Django's).
+    """
+
+    def __init__(self, application, path='/graphql/'):
+        self.application = application
+        self.path = path
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'websocket':
+            await self.application(scope, receive, send)
+        elif scope['path'] == self.path:
+            await Connection(scope, receive, send).run()
+        else:
+            await receive()
+            await send({'type': 'websocket.close', 'code': 1000})
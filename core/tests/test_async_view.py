@@ -0,0 +1,161 @@
+import asyncio
+import json
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from graphql_jwt.shortcuts import get_token
+from interactions.models import Interaction
+from interactions.schema.queries import Query as InteractionsQuery
+from posts.models import Comment, Post
+from posts.schema.queries import Query as PostsQuery
+
+User = get_user_model()
+
+FEED = """
+    query Feed($first: Int) {
+        allPosts(first: $first) {
+            title user { username }
+            comments { content user { username } }
+            reactionSummary { interactionType count }
+        }
+        postsConnection(first: $first) {
+            edges { node { title } }
+            pageInfo { hasNextPage endCursor }
+        }
+        interactions { interactionType post { title } }
+    }
+"""
+
+
+class AsyncGraphQLViewTest(TestCase):
+    """
+    Test the asynchronous GraphQL endpoint.
+    """
+
+    def setUp(self):
+        """
+        Create a few posts with comments and reactions.
+        """
+        self.user = User.objects.create_user(
+            username='testuser', password='testpass'
+        )
+        for i in range(3):
+            post = Post.objects.create(
+                user=self.user, title=f'Post {i}', content='content'
+            )
+            Comment.objects.create(
+                post=post, user=self.user, content=f'Comment {i}'
+            )
+            Interaction.objects.create(
+                post=post, user=self.user, interaction_type='love'
+            )
+
+    def execute(self, query, variables=None, user=None, path='/graphql/'):
+        """Post an operation to ``path``; return (response, queries)."""
+        headers = {}
+        if user is not None:
+            headers['HTTP_AUTHORIZATION'] = f'JWT {get_token(user)}'
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                path,
+                json.dumps({'query': query, 'variables': variables or {}}),
+                content_type='application/json',
+                **headers
+            )
+        return response, len(queries)
+
+    def test_same_result_as_sync_endpoint(self):
+        """
+        Test that both endpoints return the same data with as many queries.
+        """
+        variables = {'first': 2}
+        sync, sync_queries = self.execute(FEED, variables)
+        response, queries = self.execute(
+            FEED, variables, path='/graphql/async/'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('errors', response.json())
+        self.assertEqual(response.json()['data'], sync.json()['data'])
+        self.assertEqual(queries, sync_queries)
+
+    def test_sibling_fields_resolve_concurrently(self):
+        """
+        Test that a root field can wait on a sibling resolved after it.
+        """
+        started = asyncio.Event()
+        resolve_post = PostsQuery.aresolve_post
+        resolve_interactions = InteractionsQuery.aresolve_interactions
+
+        async def waiting_post(root, info, id):
+            await asyncio.wait_for(started.wait(), 5)
+            return await resolve_post(root, info, id=id)
+
+        async def signalling_interactions(root, info, **args):
+            started.set()
+            return await resolve_interactions(root, info, **args)
+
+        post = Post.objects.first()
+        with mock.patch.object(PostsQuery, 'aresolve_post', waiting_post), \
+                mock.patch.object(InteractionsQuery, 'aresolve_interactions',
+                                  signalling_interactions):
+            response, _ = self.execute(
+                'query Q($id: ID!) { post(id: $id) { title } '
+                'interactions { id } }',
+                {'id': post.id}, path='/graphql/async/'
+            )
+        body = response.json()
+        self.assertNotIn('errors', body)
+        self.assertEqual(body['data']['post']['title'], post.title)
+        self.assertEqual(len(body['data']['interactions']), 3)
+
+    def test_authenticated_query(self):
+        """
+        Test that the JWT is honoured by sync resolvers behind the bridge.
+        """
+        response, _ = self.execute(
+            '{ loggedUser { username } }', user=self.user,
+            path='/graphql/async/'
+        )
+        self.assertEqual(
+            response.json()['data']['loggedUser']['username'], 'testuser'
+        )
+
+    def test_invalid_token(self):
+        """
+        Test that a bad token is rejected before execution.
+        """
+        response = self.client.post(
+            '/graphql/async/',
+            json.dumps({'query': '{ loggedUser { username } }'}),
+            content_type='application/json',
+            HTTP_AUTHORIZATION='JWT not-a-token',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('errors', response.json())
+
+    def test_mutation_runs_in_sync_thread(self):
+        """
+        Test that mutations are executed through the sync bridge.
+        """
+        response, _ = self.execute(
+            'mutation { PostCreate(title: "Async", content: "body") '
+            '{ success post { title user { username } } } }',
+            user=self.user, path='/graphql/async/'
+        )
+        result = response.json()['data']['PostCreate']
+        self.assertTrue(result['success'])
+        self.assertEqual(result['post']['user']['username'], 'testuser')
+        self.assertTrue(Post.objects.filter(title='Async').exists())
+
+    def test_get_mutation_not_allowed(self):
+        """
+        Test that mutations are refused over GET, as on the sync endpoint.
+        """
+        response = self.client.get(
+            '/graphql/async/',
+            {'query': 'mutation { PostDelete(postId: 1) { success } }'},
+        )
+        self.assertEqual(response.status_code, 405)
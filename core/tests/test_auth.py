@@ -0,0 +1,148 @@
+import json
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from graphql_jwt.shortcuts import get_token
+from graphql_jwt.utils import get_payload
+from posts.models import Post
+from ..auth import token_cache
+
+User = get_user_model()
+
+FEED = '''
+{
+  loggedUser { username followersCount }
+  allPosts { title user { username } comments { content } }
+}
+'''
+ME = '{ loggedUser { firstName followersCount } }'
+
+
+class AuthTest(TestCase):
+    """
+    Test that requests authenticate once and reuse verified tokens.
+    """
+
+    def setUp(self):
+        """
+        Create a user with a few posts and start from an empty cache.
+        """
+        token_cache.clear()
+        self.addCleanup(token_cache.clear)
+        self.user = User.objects.create_user(
+            username='testuser', password='testpass', first_name='Test'
+        )
+        self.token = get_token(self.user)
+        for i in range(5):
+            Post.objects.create(user=self.user, title=f'post {i}', content='c')
+
+    def execute(self, query, token=None):
+        """Post an operation with ``token``, the user's by default."""
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                '/graphql/', json.dumps({'query': query}),
+                content_type='application/json',
+                HTTP_AUTHORIZATION=f'JWT {token or self.token}',
+            ).json()
+
+    def count_decodes(self):
+        return mock.patch('core.auth.get_payload', wraps=get_payload)
+
+    def test_token_decoded_once_per_request(self):
+        """
+        Test that a request with several root and nested fields decodes
+        the token once.
+        """
+        with self.count_decodes() as decode:
+            body = self.execute(FEED)
+        self.assertNotIn('errors', body)
+        self.assertEqual(body['data']['loggedUser']['username'], 'testuser')
+        self.assertEqual(decode.call_count, 1)
+
+    def test_bad_token_errors_without_decoding_again(self):
+        """
+        Test that a bad token fails every root field but is checked once.
+        """
+        with self.count_decodes() as decode:
+            body = self.execute(FEED, token='nonsense')
+        self.assertEqual(
+            {error['path'][0] for error in body['errors']},
+            {'loggedUser', 'allPosts'},
+        )
+        self.assertEqual(decode.call_count, 1)
+
+    @override_settings(AUTH_CACHE={'ENABLED': True})
+    def test_verified_token_reused_across_requests(self):
+        """
+        Test that a second request skips decoding and the user query.
+        """
+        with self.count_decodes() as decode:
+            self.execute(ME)
+            with self.assertNumQueries(0):
+                body = self.execute(ME)
+        self.assertEqual(body['data']['loggedUser']['firstName'], 'Test')
+        self.assertEqual(decode.call_count, 1)
+
+    @override_settings(AUTH_CACHE={'ENABLED': False})
+    def test_disabled_cache(self):
+        """
+        Test that every request decodes its token when the cache is off.
+        """
+        with self.count_decodes() as decode:
+            self.execute(ME)
+            self.execute(ME)
+        self.assertEqual(decode.call_count, 2)
+
+    @override_settings(AUTH_CACHE={'ENABLED': True})
+    def test_saving_user_invalidates(self):
+        """
+        Test that a saved user is not served from the cache.
+        """
+        self.execute(ME)
+        self.user.first_name = 'Changed'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        body = self.execute(ME)
+        self.assertEqual(body['data']['loggedUser']['firstName'], 'Changed')
+
+    @override_settings(AUTH_CACHE={'ENABLED': True})
+    def test_follow_invalidates_followee(self):
+        """
+        Test that the followee's cached follower count is dropped.
+        """
+        fan = User.objects.create_user(username='fan', password='p')
+        self.execute(ME)
+        self.execute(
+            'mutation { UserFollow(username: "testuser") { success } }',
+            token=get_token(fan),
+        )
+        body = self.execute(ME)
+        self.assertEqual(body['data']['loggedUser']['followersCount'], 1)
+
+    @override_settings(AUTH_CACHE={'ENABLED': True, 'MAX_SIZE': 2})
+    def test_cache_is_bounded(self):
+        """
+        Test that the least recently used tokens are evicted.
+        """
+        others = [
+            User.objects.create_user(username=f'user{i}', password='p')
+            for i in range(2)
+        ]
+        self.execute(ME)
+        for other in others:
+            self.execute(ME, token=get_token(other))
+        self.assertEqual(len(token_cache.entries), 2)
+        with self.count_decodes() as decode:
+            self.execute(ME)
+        self.assertEqual(decode.call_count, 1)
+
+    @override_settings(AUTH_CACHE={'ENABLED': True, 'TIMEOUT': 0})
+    def test_entries_expire(self):
+        """
+        Test that expired entries are verified again.
+        """
+        with self.count_decodes() as decode:
+            self.execute(ME)
+            self.execute(ME)
+        self.assertEqual(decode.call_count, 2)
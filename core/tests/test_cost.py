@@ -0,0 +1,66 @@
+import json
+
+from django.test import TestCase, override_settings
+
+
+@override_settings(GRAPHQL_COST={'MAX_COST': 1000, 'MAX_DEPTH': 5})
+class QueryCostTest(TestCase):
+    """
+    Test the validation-phase cost and depth limits.
+    """
+
+    def execute(self, query, variables=None):
+        """Post a query and return the status code and decoded body."""
+        response = self.client.post(
+            '/graphql/',
+            json.dumps({'query': query, 'variables': variables or {}}),
+            content_type='application/json'
+        )
+        return response.status_code, response.json()
+
+    def test_cost_is_reported_in_extensions(self):
+        """
+        Test that a cheap query runs and reports its cost.
+        """
+        status, body = self.execute(
+            'query($n: Int) { allPosts(first: $n) { id user { id } } }',
+            {'n': 10}
+        )
+        self.assertEqual(status, 200)
+        self.assertNotIn('errors', body)
+        # 10 posts, each one unit plus one unit for its user
+        self.assertEqual(body['extensions']['cost']['requested'], 20)
+
+    def test_list_size_multiplies_nested_cost(self):
+        """
+        Test that nested lists are multiplied by their page size.
+        """
+        status, body = self.execute(
+            '{ postsConnection(first: 50) { edges { node { '
+            'comments { user { id } } } } } }'
+        )
+        self.assertEqual(status, 400)
+        self.assertIn('exceeds the maximum', body['errors'][0]['message'])
+        self.assertNotIn('data', body)
+
+    def test_depth_limit(self):
+        """
+        Test that deeply nested queries are rejected before execution.
+        """
+        status, body = self.execute(
+            '{ post(id: 1) { comments { post { comments { post { '
+            'comments { id } } } } } } }'
+        )
+        self.assertEqual(status, 400)
+        messages = [error['message'] for error in body['errors']]
+        self.assertIn('Query depth 7 exceeds the maximum of 5.', messages)
+
+    def test_fragments_are_counted(self):
+        """
+        Test that fields selected through fragments are counted.
+        """
+        _, body = self.execute(
+            'query { allPosts(first: 5) { ...F } } '
+            'fragment F on PostType { user { id } }'
+        )
+        self.assertEqual(body['extensions']['cost']['requested'], 10)
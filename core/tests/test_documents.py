@@ -0,0 +1,76 @@
+import json
+
+from django.core.cache import cache
+from django.test import TestCase
+from ..documents import document_cache, persisted_queries, query_hash
+
+QUERY = '{ allPosts(first: 1) { id } }'
+
+
+class PersistedQueryTest(TestCase):
+    """
+    Test automatic persisted queries and the parsed document cache.
+    """
+
+    def setUp(self):
+        """
+        Start from empty caches.
+        """
+        cache.clear()
+        document_cache.clear()
+
+    def execute(self, query=None, sha=None):
+        """Post a request with an optional query and persisted hash."""
+        body = {}
+        if query is not None:
+            body['query'] = query
+        if sha is not None:
+            body['extensions'] = {
+                'persistedQuery': {'version': 1, 'sha256Hash': sha}
+            }
+        return self.client.post(
+            '/graphql/', json.dumps(body), content_type='application/json'
+        ).json()
+
+    def test_unknown_hash_then_register(self):
+        """
+        Test the APQ round trip: miss, register, then hash-only hit.
+        """
+        sha = query_hash(QUERY)
+        misses = persisted_queries.misses
+        body = self.execute(sha=sha)
+        self.assertEqual(
+            body['errors'][0]['extensions']['code'],
+            'PERSISTED_QUERY_NOT_FOUND'
+        )
+        self.assertEqual(persisted_queries.misses, misses + 1)
+
+        self.assertEqual(self.execute(QUERY, sha)['data'], {'allPosts': []})
+        hits = persisted_queries.hits
+        self.assertEqual(self.execute(sha=sha)['data'], {'allPosts': []})
+        self.assertEqual(persisted_queries.hits, hits + 1)
+
+    def test_hash_must_match_query(self):
+        """
+        Test that a query can't be registered under someone else's hash.
+        """
+        body = self.execute(QUERY, query_hash('{ loggedUser { id } }'))
+        self.assertEqual(body['errors'][0]['extensions']['code'],
+                         'BAD_REQUEST')
+
+    def test_documents_are_parsed_once(self):
+        """
+        Test that a repeated query is served from the document cache.
+        """
+        self.execute(QUERY)
+        self.execute(QUERY)
+        stats = self.client.get('/graphql/stats/').json()['documents']
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+    def test_invalid_documents_are_not_cached(self):
+        """
+        Test that documents failing validation are not cached.
+        """
+        body = self.execute('{ allPosts { missingField } }')
+        self.assertIn('errors', body)
+        self.assertEqual(document_cache.stats()['size'], 0)
@@ -0,0 +1,160 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from posts.models import Comment, Post
+from ..metrics import registry
+
+User = get_user_model()
+
+FEED = '''
+query Feed {
+  allPosts { title user { username } comments { content } }
+}
+'''
+
+
+@override_settings(DEBUG=True)
+class MetricsTest(TestCase):
+    """
+    Test the operation metrics, the /metrics endpoint and tracing.
+    """
+
+    def setUp(self):
+        """
+        Create a few posts and start from empty metrics.
+        """
+        registry.reset()
+        self.addCleanup(registry.reset)
+        user = User.objects.create_user(
+            username='testuser', password='testpass'
+        )
+        for i in range(3):
+            post = Post.objects.create(user=user, title=f'post {i}',
+                                       content='c')
+            Comment.objects.create(post=post, user=user, content='hi')
+
+    def execute(self, query, path='/graphql/', **headers):
+        return self.client.post(
+            path, json.dumps({'query': query}),
+            content_type='application/json', **headers
+        ).json()
+
+    def scrape(self, **headers):
+        response = self.client.get('/metrics', **headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        return response.content.decode()
+
+    def test_operation_metrics(self):
+        """
+        Test that latency, resolvers, SQL and size are labelled by
+        operation.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            self.execute(FEED)
+        # Scraping is a new request, which clears the captured queries
+        count = len(queries)
+        text = self.scrape()
+        self.assertIn(
+            'graphql_request_duration_seconds_count'
+            '{operation="Feed",type="query"} 1', text
+        )
+        self.assertIn(
+            'graphql_resolver_calls_total'
+            '{operation="Feed",field="Query.allPosts"} 1', text
+        )
+        self.assertIn(
+            'graphql_resolver_calls_total'
+            '{operation="Feed",field="PostType.title"} 3', text
+        )
+        self.assertIn(
+            'graphql_sql_queries_sum{operation="Feed"} '
+            f'{count}', text
+        )
+        self.assertIn(
+            'graphql_phase_duration_seconds_count'
+            '{operation="Feed",phase="execution"} 1', text
+        )
+        self.assertIn(
+            'graphql_response_size_bytes_count{operation="Feed"} 1', text
+        )
+        self.assertIn('# TYPE graphql_request_duration_seconds histogram',
+                      text)
+
+    def test_async_endpoint_is_measured(self):
+        """
+        Test that operations of the async endpoint are recorded as well.
+        """
+        self.execute(FEED, path='/graphql/async/')
+        self.assertIn(
+            'graphql_resolver_calls_total'
+            '{operation="Feed",field="PostType.comments"} 3', self.scrape()
+        )
+
+    def test_tracing_extension(self):
+        """
+        Test that the trace header returns Apollo tracing with SQL totals.
+        """
+        self.assertNotIn('tracing', self.execute(FEED)['extensions'])
+        with CaptureQueriesContext(connection) as queries:
+            body = self.execute(FEED, HTTP_X_GRAPHQL_TRACE='1')
+        tracing = body['extensions']['tracing']
+        self.assertEqual(tracing['version'], 1)
+        self.assertIn('validation', tracing)
+        self.assertEqual(tracing['sql']['queries'], len(queries))
+        paths = [r['path'] for r in tracing['execution']['resolvers']]
+        self.assertIn(['allPosts'], paths)
+        self.assertIn(['allPosts', 0, 'user', 'username'], paths)
+        root = tracing['execution']['resolvers'][0]
+        self.assertEqual(root['parentType'], 'Query')
+        self.assertGreaterEqual(root['duration'], 0)
+
+    @override_settings(DEBUG=False)
+    def test_tracing_is_private(self):
+        """
+        Test that outside DEBUG the trace header is ignored unless it
+        holds the metrics token.
+        """
+        body = self.execute(FEED, HTTP_X_GRAPHQL_TRACE='1')
+        self.assertNotIn('tracing', body.get('extensions') or {})
+        with self.settings(METRICS={'TOKEN': 'secret'}):
+            body = self.execute(FEED, HTTP_X_GRAPHQL_TRACE='guess')
+            self.assertNotIn('tracing', body.get('extensions') or {})
+            body = self.execute(FEED, HTTP_X_GRAPHQL_TRACE='secret')
+            self.assertIn('tracing', body['extensions'])
+
+    @override_settings(METRICS={'TOKEN': 'secret'}, DEBUG=False)
+    def test_token(self):
+        """
+        Test that a configured token protects the endpoint.
+        """
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        self.assertEqual(
+            self.client.get(
+                '/metrics', HTTP_AUTHORIZATION='secret'
+            ).status_code,
+            401,
+        )
+        self.scrape(HTTP_AUTHORIZATION='Bearer secret')
+
+    @override_settings(DEBUG=False)
+    def test_hidden_without_token(self):
+        """
+        Test that without a token the endpoint is hidden outside DEBUG.
+        """
+        self.assertEqual(self.client.get('/metrics').status_code, 404)
+
+    @override_settings(METRICS={'MAX_OPERATIONS': 1})
+    def test_operation_labels_are_bounded(self):
+        """
+        Test that operation names past the limit are reported as other.
+        """
+        self.execute('query First { allPosts { title } }')
+        self.execute('query Second { allPosts { title } }')
+        text = self.scrape()
+        self.assertIn('operation="First"', text)
+        self.assertNotIn('operation="Second"', text)
+        self.assertIn('operation="other"', text)
@@ -0,0 +1,122 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from posts.models import Comment, Post
+
+User = get_user_model()
+
+POST_CONTENT = '"posts_post"."content"'
+COMMENT_CONTENT = '"posts_comment"."content"'
+
+
+class ProjectionTest(TestCase):
+    """
+    Test that list queries only read the columns of the selected fields.
+    """
+
+    def setUp(self):
+        """
+        Create posts with a comment and a reply each.
+        """
+        self.user = User.objects.create_user(
+            username='testuser', password='testpass'
+        )
+        for i in range(3):
+            post = Post.objects.create(
+                user=self.user, title=f'Post {i}', content=f'content {i}'
+            )
+            comment = Comment.objects.create(
+                post=post, user=self.user, content=f'comment {i}'
+            )
+            Comment.objects.create(
+                post=post, user=self.user, parent=comment,
+                content=f'reply {i}'
+            )
+
+    def execute(self, query, variables=None):
+        """Post an operation and return (data, SQL of its queries)."""
+        with CaptureQueriesContext(connection) as queries:
+            body = self.client.post(
+                '/graphql/',
+                json.dumps({'query': query, 'variables': variables or {}}),
+                content_type='application/json',
+            ).json()
+        self.assertNotIn('errors', body)
+        return body['data'], [query['sql'] for query in queries]
+
+    def test_unselected_columns_are_not_read(self):
+        """
+        Test that allPosts doesn't read the content nobody asked for.
+        """
+        data, sql = self.execute('{ allPosts { id title createdAt } }')
+        self.assertEqual(
+            [post['title'] for post in data['allPosts']],
+            ['Post 2', 'Post 1', 'Post 0'],
+        )
+        self.assertEqual(len(sql), 1)
+        self.assertNotIn(POST_CONTENT, sql[0])
+        self.assertNotIn('"posts_post"."image"', sql[0])
+
+    def test_fragments_are_followed(self):
+        """
+        Test that fields selected through fragments of a connection are
+        read, together with the foreign keys their loaders need.
+        """
+        data, sql = self.execute('''
+            query Page {
+                postsConnection(first: 2) {
+                    edges { cursor node { ...Body } }
+                    pageInfo { hasNextPage }
+                }
+            }
+            fragment Body on PostType {
+                ... on PostType { content }
+                user { username }
+            }
+        ''')
+        nodes = [edge['node'] for edge in data['postsConnection']['edges']]
+        self.assertEqual(
+            [node['content'] for node in nodes], ['content 2', 'content 1']
+        )
+        self.assertEqual(nodes[0]['user'], {'username': 'testuser'})
+        self.assertEqual(len(sql), 2)
+        self.assertIn(POST_CONTENT, sql[0])
+        self.assertNotIn('"posts_post"."title"', sql[0])
+
+    def test_comments_without_previews(self):
+        """
+        Test that commentsForPost reads neither the content nor the reply
+        previews when they aren't selected.
+        """
+        post = Post.objects.first()
+        data, sql = self.execute('''
+            query Comments($post: ID!) {
+                commentsForPost(postId: $post) {
+                    edges { node { id depth } }
+                }
+            }
+        ''', {'post': post.pk})
+        nodes = [e['node'] for e in data['commentsForPost']['edges']]
+        self.assertEqual([node['depth'] for node in nodes], [0])
+        self.assertEqual(len(sql), 1)
+        self.assertNotIn(COMMENT_CONTENT, sql[0])
+
+    def test_projected_parents_are_not_primed(self):
+        """
+        Test that a relation back to projected rows loads them again in
+        one batch instead of one column at a time.
+        """
+        data, sql = self.execute(
+            '{ allPosts(first: 3) { title comments { post { content } } } }'
+        )
+        self.assertEqual(
+            [
+                {c['post']['content'] for c in post['comments']}
+                for post in data['allPosts']
+            ],
+            [{'content 2'}, {'content 1'}, {'content 0'}],
+        )
+        self.assertEqual(len(sql), 3)
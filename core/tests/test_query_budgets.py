@@ -0,0 +1,93 @@
+from django.db import connection, transaction
+from django.test import TestCase
+from posts.search import search_posts
+from ..benchmarks import OPERATIONS, benchmark, report
+from ..combined_schema import schema
+
+# Dataset sizes compared to catch query counts growing with the data
+SIZES = (70, 210)
+
+
+class QueryBudgetTest(TestCase):
+    """
+    Test that every operation stays within its SQL query budget.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        """
+        Measure every operation once at each size, and search the seeded
+        posts with the backend of the database under test.
+        """
+        super().setUpClass()
+        cls.results = {}
+        cls.hits = {}
+        for size in SIZES:
+            with transaction.atomic():
+                for entry in benchmark(size, repeat=1, memory=False):
+                    cls.results[entry['operation'], size] = entry
+                cls.hits[size] = len(search_posts('benchmark content', 20))
+                transaction.set_rollback(True)
+
+    def test_catalogue_covers_schema(self):
+        """
+        Test that every query and mutation has a benchmarked operation.
+        """
+        graphql_schema = schema.graphql_schema
+        fields = set(graphql_schema.query_type.fields) | set(
+            graphql_schema.mutation_type.fields
+        )
+        self.assertEqual({op.field for op in OPERATIONS}, fields)
+
+    def test_operations_succeed(self):
+        """
+        Test that the benchmarked operations run without errors.
+        """
+        for (operation, size), entry in self.results.items():
+            with self.subTest(operation=operation, size=size):
+                self.assertEqual(entry['errors'], [])
+
+    def test_within_budget(self):
+        """
+        Test that no operation runs more queries than its budget.
+        """
+        for (operation, size), entry in self.results.items():
+            with self.subTest(operation=operation, size=size):
+                self.assertLessEqual(entry['queries'], entry['budget'])
+
+    def test_search_is_measured_with_hits(self):
+        """
+        Test that the searchPosts budget is measured against a page of
+        hits, so a backend that finds nothing can't pass it for free.
+        """
+        for size in SIZES:
+            with self.subTest(size=size, database=connection.vendor):
+                self.assertEqual(self.hits[size], 20)
+
+    def test_queries_independent_of_size(self):
+        """
+        Test that query counts don't grow with the number of posts.
+        """
+        small, large = SIZES
+        for op in OPERATIONS:
+            with self.subTest(operation=op.field):
+                self.assertEqual(
+                    self.results[op.field, small]['queries'],
+                    self.results[op.field, large]['queries'],
+                )
+
+    def test_report(self):
+        """
+        Test that the report carries the environment and the results.
+        """
+        results = list(self.results.values())
+        document = report(results)
+        self.assertEqual(document['version'], 1)
+        self.assertEqual(document['database'], connection.vendor)
+        self.assertEqual(document['results'], results)
+        entry = results[0]
+        self.assertEqual(
+            set(entry),
+            {'operation', 'size', 'queries', 'budget', 'within_budget',
+             'errors', 'wall_time', 'peak_memory'},
+        )
@@ -0,0 +1,177 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from django.test import SimpleTestCase, TestCase, override_settings
+from graphql_jwt.shortcuts import get_token
+from posts.models import Post
+from ..checks import check_replica_pins
+from ..replicas import ReplicaRouter, replica_reads
+
+User = get_user_model()
+
+TITLES = 'query Titles { allPosts { title } }'
+
+CREATE = '''
+mutation Create {
+  PostCreate(title: "Fresh", content: "Just written") { post { id } }
+}
+'''
+
+
+@override_settings(REPLICAS={'DATABASES': ['replica1'], 'STICKY_SECONDS': 60})
+class ReplicaRoutingTest(TestCase):
+    """
+    Test that queries read from the replica, and mutations and their
+    authors from the primary.
+    """
+    databases = {'default', 'replica1'}
+
+    def setUp(self):
+        """
+        Create a user on both databases, and a post that only the replica
+        has, so the test can tell which one was read.
+        """
+        caches['default'].clear()
+        self.user = User.objects.create_user(
+            username='testuser', password='testpass'
+        )
+        self.other = User.objects.create_user(
+            username='other', password='testpass'
+        )
+        Post.objects.create(user=self.user, title='Primary', content='c')
+        for user in (self.user, self.other):
+            user.save(using='replica1')
+        Post(user=self.user, title='Replica', content='c').save(
+            using='replica1'
+        )
+
+    def titles(self, query=TITLES, user=None, path='/graphql/'):
+        headers = {}
+        if user is not None:
+            headers['HTTP_AUTHORIZATION'] = f'JWT {get_token(user)}'
+        response = self.client.post(
+            path, json.dumps({'query': query}),
+            content_type='application/json', **headers
+        ).json()
+        self.assertNotIn('errors', response)
+        return sorted(post['title'] for post in response['data']['allPosts'])
+
+    def create(self):
+        response = self.client.post(
+            '/graphql/', json.dumps({'query': CREATE}),
+            content_type='application/json',
+            HTTP_AUTHORIZATION=f'JWT {get_token(self.user)}',
+        ).json()
+        self.assertNotIn('errors', response)
+
+    def test_queries_read_from_replica(self):
+        """
+        Test that query operations of both endpoints use the replica.
+        """
+        self.assertEqual(self.titles(), ['Replica'])
+        self.assertEqual(self.titles(user=self.user), ['Replica'])
+        self.assertEqual(self.titles(path='/graphql/async/'), ['Replica'])
+
+    def test_mutations_use_primary(self):
+        """
+        Test that mutations write to the primary only.
+        """
+        self.create()
+        self.assertTrue(Post.objects.filter(title='Fresh').exists())
+        self.assertFalse(
+            Post.objects.using('replica1').filter(title='Fresh').exists()
+        )
+
+    def test_authors_read_their_writes(self):
+        """
+        Test that after a mutation its author reads from the primary, while
+        everybody else keeps reading from the replica.
+        """
+        self.create()
+        self.assertEqual(
+            self.titles(user=self.user), ['Fresh', 'Primary']
+        )
+        self.assertEqual(
+            self.titles(user=self.user, path='/graphql/async/'),
+            ['Fresh', 'Primary'],
+        )
+        self.assertEqual(self.titles(user=self.other), ['Replica'])
+        self.assertEqual(self.titles(), ['Replica'])
+
+    def test_stickiness_expires(self):
+        """
+        Test that authors return to the replica after the sticky window.
+        """
+        with self.settings(REPLICAS={
+            'DATABASES': ['replica1'], 'STICKY_SECONDS': 0,
+        }):
+            self.create()
+            self.assertEqual(self.titles(user=self.user), ['Replica'])
+
+    def test_writes_switch_reads_to_primary(self):
+        """
+        Test that once an operation writes, it reads from the primary.
+        """
+        router = ReplicaRouter()
+        self.assertIsNone(router.db_for_read(Post))
+        with replica_reads('replica1'):
+            self.assertEqual(router.db_for_read(Post), 'replica1')
+            self.assertEqual(router.db_for_write(Post), DEFAULT_DB_ALIAS)
+            self.assertEqual(router.db_for_read(Post), DEFAULT_DB_ALIAS)
+        self.assertIsNone(router.db_for_read(Post))
+
+
+class ReplicasDisabledTest(TestCase):
+    """
+    Test that without configured replicas everything uses the primary.
+    """
+
+    def test_queries_read_from_primary(self):
+        """
+        Test that queries read from the primary by default.
+        """
+        user = User.objects.create_user(
+            username='testuser', password='testpass'
+        )
+        Post.objects.create(user=user, title='Primary', content='c')
+        response = self.client.post(
+            '/graphql/', json.dumps({'query': TITLES}),
+            content_type='application/json',
+        ).json()
+        self.assertEqual(response['data']['allPosts'], [{'title': 'Primary'}])
+
+
+class ReplicaPinsCheckTest(SimpleTestCase):
+    """
+    Test that replicas refuse pins kept in a cache private to one process.
+    """
+
+    @override_settings(REPLICAS={'DATABASES': ['replica1']})
+    def test_local_memory_cache_is_refused(self):
+        """
+        Test that the default local memory cache fails the check.
+        """
+        errors = check_replica_pins(None)
+        self.assertEqual([error.id for error in errors], ['core.E002'])
+
+    @override_settings(
+        REPLICAS={'DATABASES': ['replica1'], 'CACHE_ALIAS': 'shared'},
+        CACHES={
+            'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            },
+            'shared': {
+                'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+                'LOCATION': 'redis://localhost:6379/0',
+            },
+        },
+    )
+    def test_shared_cache_passes(self):
+        """
+        Test that a shared cache, or no replicas, passes.
+        """
+        self.assertEqual(check_replica_pins(None), [])
+        with self.settings(REPLICAS={'DATABASES': []}):
+            self.assertEqual(check_replica_pins(None), [])
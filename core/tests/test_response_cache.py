@@ -0,0 +1,164 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from graphql_jwt.shortcuts import get_token
+from posts.counters import counter_buffer
+from posts.models import Post
+from ..checks import check_response_cache
+
+User = get_user_model()
+
+POST = 'query Post($id: ID!) { post(id: $id) { title interactionsCount } }'
+LOVE = '''
+mutation Love($id: Int!) {
+  Post_Interaction_Add(postId: $id, interactionType: LOVE) { success }
+}
+'''
+
+
+@override_settings(RESPONSE_CACHE={'ENABLED': True})
+class ResponseCacheTest(TestCase):
+    """
+    Test the tagged response cache of read-only operations.
+    """
+
+    def setUp(self):
+        """
+        Create two posts and start from an empty cache.
+        """
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='testuser', password='testpass'
+        )
+        self.first = Post.objects.create(
+            user=self.user, title='first', content='c'
+        )
+        self.second = Post.objects.create(
+            user=self.user, title='second', content='c'
+        )
+
+    def execute(self, query, variables=None, user=None):
+        """Post an operation, authenticated as ``user`` if given."""
+        headers = {}
+        if user is not None:
+            headers['HTTP_AUTHORIZATION'] = f'JWT {get_token(user)}'
+        return self.client.post(
+            '/graphql/',
+            json.dumps({'query': query, 'variables': variables or {}}),
+            content_type='application/json',
+            **headers
+        ).json()
+
+    def test_repeated_query_is_served_from_cache(self):
+        """
+        Test that the second identical query runs no SQL.
+        """
+        variables = {'id': self.first.id}
+        body = self.execute(POST, variables)
+        self.assertEqual(body['extensions']['responseCache'], 'MISS')
+        with self.assertNumQueries(0):
+            cached = self.execute(POST, variables)
+        self.assertEqual(cached['extensions']['responseCache'], 'HIT')
+        self.assertEqual(cached['data'], body['data'])
+
+    def test_mutation_evicts_only_dirty_tags(self):
+        """
+        Test that reacting to a post evicts its entries and no others.
+        """
+        self.execute(POST, {'id': self.first.id})
+        self.execute(POST, {'id': self.second.id})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.execute(LOVE, {'id': self.first.id}, user=self.user)
+
+        body = self.execute(POST, {'id': self.first.id})
+        self.assertEqual(body['extensions']['responseCache'], 'MISS')
+        self.assertEqual(body['data']['post']['interactionsCount'], 1)
+        other = self.execute(POST, {'id': self.second.id})
+        self.assertEqual(other['extensions']['responseCache'], 'HIT')
+
+    @override_settings(COUNTERS={'MODE': 'buffered', 'FLUSH_INTERVAL': 60})
+    def test_buffered_counts_evict_on_flush(self):
+        """
+        Test that a response cached before buffered counts are flushed is
+        evicted by the flush.
+        """
+        variables = {'id': self.first.id}
+        self.execute(POST, variables)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.execute(LOVE, variables, user=self.user)
+        body = self.execute(POST, variables)
+        self.assertEqual(body['data']['post']['interactionsCount'], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            counter_buffer.flush()
+        body = self.execute(POST, variables)
+        self.assertEqual(body['extensions']['responseCache'], 'MISS')
+        self.assertEqual(body['data']['post']['interactionsCount'], 1)
+
+    def test_lists_are_evicted_by_new_posts(self):
+        """
+        Test that a new post evicts cached post lists.
+        """
+        query = '{ allPosts { title } }'
+        self.execute(query)
+        create = '''
+        mutation { PostCreate(title: "third", content: "c") { success } }
+        '''
+        with self.captureOnCommitCallbacks(execute=True):
+            self.execute(create, user=self.user)
+        titles = [p['title'] for p in self.execute(query)['data']['allPosts']]
+        self.assertEqual(titles[0], 'third')
+
+    def test_entries_are_scoped_by_caller(self):
+        """
+        Test that anonymous and authenticated callers get separate entries.
+        """
+        variables = {'id': self.first.id}
+        self.execute(POST, variables)
+        body = self.execute(POST, variables, user=self.user)
+        self.assertEqual(body['extensions']['responseCache'], 'MISS')
+
+    def test_viewer_fields_are_not_cached(self):
+        """
+        Test that operations reading loggedUser are never stored.
+        """
+        query = '{ loggedUser { username } }'
+        self.execute(query, user=self.user)
+        body = self.execute(query, user=self.user)
+        self.assertEqual(body['extensions']['responseCache'], 'MISS')
+
+
+class ResponseCacheCheckTest(SimpleTestCase):
+    """
+    Test that the response cache refuses a cache private to one process.
+    """
+
+    @override_settings(RESPONSE_CACHE={'ENABLED': True})
+    def test_local_memory_cache_is_refused(self):
+        """
+        Test that the default local memory cache fails the check.
+        """
+        errors = check_response_cache(None)
+        self.assertEqual([error.id for error in errors], ['core.E001'])
+
+    @override_settings(
+        RESPONSE_CACHE={'ENABLED': True, 'CACHE_ALIAS': 'shared'},
+        CACHES={
+            'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            },
+            'shared': {
+                'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+                'LOCATION': 'redis://localhost:6379/0',
+            },
+        },
+    )
+    def test_shared_cache_passes(self):
+        """
+        Test that a shared cache, or a disabled response cache, passes.
+        """
+        self.assertEqual(check_response_cache(None), [])
+        with self.settings(RESPONSE_CACHE={'ENABLED': False}):
+            self.assertEqual(check_response_cache(None), [])
@@ -0,0 +1,310 @@
+import asyncio
+import json
+
+from asgiref.sync import async_to_sync, sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from graphql_jwt.shortcuts import get_token
+from interactions.models import Interaction
+from posts.models import Post
+from ..pubsub import get_backend, watcher_count
+from ..subscriptions import PROTOCOL, GraphQLWebSocketApp
+
+User = get_user_model()
+
+
+class WebSocket:
+    """Minimal graphql-transport-ws client over an ASGI communicator."""
+
+    def __init__(self, headers=()):
+        self.communicator = ApplicationCommunicator(
+            GraphQLWebSocketApp(None),
+            {
+                'type': 'websocket', 'path': '/graphql/',
+                'subprotocols': [PROTOCOL], 'headers': list(headers),
+            },
+        )
+
+    async def connect(self, payload=None):
+        await self.communicator.send_input({'type': 'websocket.connect'})
+        accepted = await self.communicator.receive_output(5)
+        assert accepted['type'] == 'websocket.accept', accepted
+        await self.send({'type': 'connection_init', 'payload': payload})
+        return await self.receive()
+
+    async def send(self, message):
+        await self.communicator.send_input({
+            'type': 'websocket.receive', 'text': json.dumps(message),
+        })
+
+    async def receive(self):
+        output = await self.communicator.receive_output(5)
+        if output['type'] == 'websocket.close':
+            return output
+        return json.loads(output['text'])
+
+    async def subscribe(self, id, query, variables=None, channel=None,
+                        watchers=0):
+        await self.send({
+            'id': id, 'type': 'subscribe',
+            'payload': {'query': query, 'variables': variables or {}},
+        })
+        if channel is not None:
+            # Listening starts with the first iteration of the stream
+            for _ in range(500):
+                if get_backend().subscriber_count(channel) and (
+                    watcher_count(channel) >= watchers
+                ):
+                    return
+                await asyncio.sleep(0.01)
+            raise AssertionError(f'Nobody listens on {channel}')
+
+    async def close(self):
+        await self.communicator.send_input({
+            'type': 'websocket.disconnect', 'code': 1000,
+        })
+        await self.communicator.wait(5)
+
+
+class SubscriptionTest(TestCase):
+    """
+    Test GraphQL subscriptions served over websockets.
+    """
+
+    def setUp(self):
+        """
+        Create a user and a post.
+        """
+        self.user = User.objects.create_user(
+            username='testuser', password='testpass'
+        )
+        self.post = Post.objects.create(
+            user=self.user, title='Hello', content='content'
+        )
+
+    def mutate(self, query):
+        """Run a mutation as the user, executing its on-commit hooks."""
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                '/graphql/', json.dumps({'query': query}),
+                content_type='application/json',
+                HTTP_AUTHORIZATION=f'JWT {get_token(self.user)}',
+            ).json()
+
+    def test_post_created(self):
+        """
+        Test that a new post is pushed with the requested fields.
+        """
+        async def scenario():
+            socket = WebSocket()
+            self.assertEqual(
+                (await socket.connect())['type'], 'connection_ack'
+            )
+            await socket.subscribe(
+                '1',
+                'subscription { postCreated { title user { username } } }',
+                channel='posts',
+            )
+            await sync_to_async(self.mutate)(
+                'mutation { PostCreate(title: "New", content: "c") '
+                '{ success } }'
+            )
+            message = await socket.receive()
+            await socket.close()
+            return message
+
+        message = async_to_sync(scenario)()
+        self.assertEqual(message['type'], 'next')
+        self.assertEqual(message['id'], '1')
+        self.assertEqual(
+            message['payload']['data']['postCreated'],
+            {'title': 'New', 'user': {'username': 'testuser'}},
+        )
+
+    def test_comment_added(self):
+        """
+        Test that comments are pushed to subscribers of their post only.
+        """
+        other = Post.objects.create(user=self.user, title='Other', content='c')
+        channel = f'post:{self.post.id}:comments'
+
+        async def scenario():
+            socket = WebSocket()
+            await socket.connect()
+            await socket.subscribe(
+                'c', 'subscription S($id: ID!) { commentAdded(postId: $id) '
+                '{ content post { title } } }', {'id': self.post.id},
+                channel=channel,
+            )
+            for post in (other, self.post):
+                await sync_to_async(self.mutate)(
+                    f'mutation {{ Post_Comment_Add(postId: {post.id}, '
+                    f'content: "on {post.title}") {{ success }} }}'
+                )
+            message = await socket.receive()
+            await socket.close()
+            return message
+
+        comment = async_to_sync(scenario)()['payload']['data']['commentAdded']
+        self.assertEqual(comment, {
+            'content': 'on Hello', 'post': {'title': 'Hello'},
+        })
+
+    @override_settings(PUBSUB={'COALESCE_INTERVAL': 0.3})
+    def test_reaction_bursts_are_coalesced(self):
+        """
+        Test that a burst of reactions sends the first update at once and
+        then one update with the final state.
+        """
+        channel = f'post:{self.post.id}:reactions'
+        users = [
+            User.objects.create_user(username=f'fan{i}', password='p')
+            for i in range(5)
+        ]
+
+        def react(user):
+            Interaction.objects.create(
+                post=self.post, user=user, interaction_type='love'
+            )
+            Post.objects.filter(pk=self.post.pk).update(
+                interactions_count=Interaction.objects.filter(
+                    post=self.post).count()
+            )
+            get_backend().publish(channel, self.post.id)
+
+        async def scenario():
+            socket = WebSocket()
+            await socket.connect()
+            await socket.subscribe(
+                'r', 'subscription S($id: ID!) { postReactionsChanged('
+                'postId: $id) { interactionsCount } }', {'id': self.post.id},
+                channel=channel,
+            )
+            await sync_to_async(react)(users[0])
+            counts = [await socket.receive()]
+            for user in users[1:]:
+                await sync_to_async(react)(user)
+            counts.append(await socket.receive())
+            await socket.communicator.receive_nothing(0.5)
+            self.assertTrue(await socket.communicator.receive_nothing(0.5))
+            await socket.close()
+            return [
+                m['payload']['data']['postReactionsChanged']
+                ['interactionsCount'] for m in counts
+            ]
+
+        self.assertEqual(async_to_sync(scenario)(), [1, 5])
+
+    @override_settings(PUBSUB={'COALESCE_INTERVAL': 0.3})
+    def test_reaction_updates_are_shared_per_post(self):
+        """
+        Test that the subscribers of a post share one listener, which loads
+        the post once per update for all of them.
+        """
+        channel = f'post:{self.post.id}:reactions'
+        query = (
+            'subscription S($id: ID!) { postReactionsChanged(postId: $id) '
+            '{ interactionsCount } }'
+        )
+
+        def react():
+            Post.objects.filter(pk=self.post.pk).update(interactions_count=7)
+            get_backend().publish(channel, self.post.id)
+
+        async def scenario():
+            sockets = [WebSocket(), WebSocket()]
+            for i, socket in enumerate(sockets, 1):
+                await socket.connect()
+                await socket.subscribe(
+                    'r', query, {'id': self.post.id}, channel=channel,
+                    watchers=i,
+                )
+            listeners = get_backend().subscriber_count(channel)
+            await sync_to_async(react)()
+            messages = [await socket.receive() for socket in sockets]
+            for socket in sockets:
+                await socket.close()
+            return listeners, messages
+
+        with CaptureQueriesContext(connection) as queries:
+            listeners, messages = async_to_sync(scenario)()
+        selects = [
+            q['sql'] for q in queries
+            if q['sql'].startswith('SELECT') and '"posts_post"' in q['sql']
+        ]
+        self.assertEqual(listeners, 1)
+        self.assertEqual(
+            [m['payload']['data'] for m in messages],
+            [{'postReactionsChanged': {'interactionsCount': 7}}] * 2,
+        )
+        self.assertEqual(len(selects), 1)
+        self.assertEqual(watcher_count(channel), 0)
+        self.assertEqual(get_backend().subscriber_count(channel), 0)
+
+    def test_reactions_are_published_by_mutations(self):
+        """
+        Test that adding a reaction publishes on the post's channel.
+        """
+        channel = f'post:{self.post.id}:reactions'
+
+        async def scenario():
+            socket = WebSocket()
+            await socket.connect()
+            await socket.subscribe(
+                'r', 'subscription S($id: ID!) { postReactionsChanged('
+                'postId: $id) { reactionSummary { interactionType count } } }',
+                {'id': self.post.id}, channel=channel,
+            )
+            await sync_to_async(self.mutate)(
+                f'mutation {{ Post_Interaction_Add(postId: {self.post.id}, '
+                f'interactionType: LOVE) {{ success }} }}'
+            )
+            message = await socket.receive()
+            await socket.close()
+            return message
+
+        message = async_to_sync(scenario)()
+        self.assertEqual(
+            message['payload']['data']['postReactionsChanged'],
+            {'reactionSummary': [{'interactionType': 'LOVE', 'count': 1}]},
+        )
+
+    def test_authenticated_connection(self):
+        """
+        Test that a token in connection_init is accepted and a bad one
+        closes the connection.
+        """
+        async def scenario():
+            good = WebSocket()
+            ack = await good.connect(
+                {'Authorization': f'JWT {get_token(self.user)}'}
+            )
+            await good.close()
+            bad = WebSocket()
+            closed = await bad.connect({'Authorization': 'JWT nonsense'})
+            await bad.communicator.wait(5)
+            return ack, closed
+
+        ack, closed = async_to_sync(scenario)()
+        self.assertEqual(ack['type'], 'connection_ack')
+        self.assertEqual(closed['type'], 'websocket.close')
+        self.assertEqual(closed['code'], 4403)
+
+    def test_only_subscriptions(self):
+        """
+        Test that queries are refused with an error message.
+        """
+        async def scenario():
+            socket = WebSocket()
+            await socket.connect()
+            await socket.subscribe('q', '{ allPosts { title } }')
+            message = await socket.receive()
+            await socket.close()
+            return message
+
+        message = async_to_sync(scenario)()
+        self.assertEqual(message['type'], 'error')
+        self.assertEqual(message['id'], 'q')
@@ -17,21 +17,21 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path
 from django.views.decorators.csrf import csrf_exempt
-from graphene_file_upload.django import FileUploadGraphQLView
 from graphql_playground.views import GraphQLPlaygroundView
 from django.conf import settings
-from django.conf.urls.static import static
+from posts.views import serve_media
+from .views import (
+    AsyncFeedGraphQLView, FeedGraphQLView, graphql_stats, metrics,
+)
 
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path("graphql/",
-         csrf_exempt(FileUploadGraphQLView.as_view(graphiql=True))),
+         csrf_exempt(FeedGraphQLView.as_view(graphiql=True))),
+    path("graphql/async/", csrf_exempt(AsyncFeedGraphQLView.as_view())),
+    path("graphql/stats/", graphql_stats),
+    path("metrics", metrics),
     path('playground/', GraphQLPlaygroundView.as_view(endpoint="/graphql/")),
+    path(f"{settings.MEDIA_URL.strip('/')}/<path:path>", serve_media),
 ]
-
-if settings.DEBUG:
-    urlpatterns += static(
-            settings.MEDIA_URL,
-            document_root=settings.MEDIA_ROOT
-    )
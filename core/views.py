@@ -0,0 +1,494 @@
+import time
+from collections import namedtuple
+from inspect import isawaitable
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection, transaction
+from django.http import HttpResponse, HttpResponseBadRequest
+from django.http import HttpResponseNotAllowed, JsonResponse
+from django.views.decorators.http import require_safe
+from graphene_django.settings import graphene_settings
+from graphene_django.utils.utils import set_rollback
+from graphene_django.views import MUTATION_ERRORS_FLAG, HttpError
+from graphene_file_upload.django import FileUploadGraphQLView
+from graphql import (
+    ExecutionResult, GraphQLError, OperationType, execute, get_operation_ast,
+    validate, validate_schema,
+)
+from graphql_jwt.exceptions import JSONWebTokenError
+from graphql_jwt.middleware import JSONWebTokenMiddleware
+
+from .async_execution import AsyncBridgeMiddleware
+from .auth import authenticate_request
+from .cost import cost_rule
+from .documents import (
+    get_document, persisted_queries, request_extensions, stats
+)
+from .loaders import Loaders
+from .metrics import authorized, metrics_setting, registry, start_trace
+from .replicas import choose_replica, pin_user, replica_reads, replica_setting
+from .response_cache import (
+    auth_scope, cache_key, lookup, response_cache_setting, store
+)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# A validated operation ready to execute
+Operation = namedtuple('Operation', [
+    'document', 'operation_ast', 'variables', 'operation_name',
+    'response_key', 'started', 'replica',
+])
+
+
+class FeedGraphQLView(FileUploadGraphQLView):
+    """
+    GraphQL endpoint of the feed API.
+
+    On top of the stock view it gives every request its own batch loaders,
+    accepts automatic persisted queries, reuses parsed and validated
+    documents, rejects operations above the cost budget before execution,
+    serves repeated read-only operations from the response cache, runs
+    queries against read replicas (see ``core.replicas``), records
+    operation metrics (see ``core.metrics``), and returns per-request
+    ``extensions`` (such as the computed cost).
+    """
+
+    def get_context(self, request):
+        request.loaders = Loaders()
+        return request
+
+    def execute_graphql_request(
+        self, request, data, query, variables, operation_name,
+        show_graphiql=False
+    ):
+        operation = self.prepare_operation(
+            request, data, query, variables, operation_name, show_graphiql
+        )
+        if not isinstance(operation, Operation):
+            return operation
+        return self.run_operation(request, operation)
+
+    def prepare_operation(
+        self, request, data, query, variables, operation_name,
+        show_graphiql=False
+    ):
+        """
+        Do everything up to execution: resolve persisted queries, get the
+        validated document, check the cost, look up the response cache and
+        pick the replica a query reads from.
+
+        Returns the ``Operation`` to run, or the ``ExecutionResult`` (or
+        ``None``, for GraphiQL) to respond with instead.
+        """
+        try:
+            query, key = persisted_queries.resolve(
+                query, request_extensions(data)
+            )
+        except GraphQLError as e:
+            return ExecutionResult(errors=[e])
+
+        if not query:
+            if show_graphiql:
+                return None
+            raise HttpError(
+                HttpResponseBadRequest("Must provide query string.")
+            )
+
+        schema = self.schema.graphql_schema
+
+        schema_validation_errors = validate_schema(schema)
+        if schema_validation_errors:
+            return ExecutionResult(data=None, errors=schema_validation_errors)
+
+        trace = getattr(request, 'trace', None)
+        timings = {}
+        document, validation_errors = get_document(
+            schema, query, key, timings
+        )
+        if trace is not None:
+            trace.parsing = timings.get('parsing')
+            if 'validation' in timings:
+                trace.add_validation(*timings['validation'])
+        if validation_errors:
+            return ExecutionResult(data=None, errors=validation_errors)
+
+        operation_ast = get_operation_ast(document, operation_name)
+        if trace is not None:
+            trace.set_operation(operation_ast, operation_name)
+
+        if (
+            request.method.lower() == "get"
+            and operation_ast is not None
+            and operation_ast.operation != OperationType.QUERY
+        ):
+            if show_graphiql:
+                return None
+
+            raise HttpError(
+                HttpResponseNotAllowed(
+                    ["POST"],
+                    "Can only perform a {} operation from a POST request."
+                    .format(operation_ast.operation.value),
+                )
+            )
+
+        # The cost depends on the variables, so it is checked every time
+        request.query_cost = {}
+        cost_started = time.perf_counter_ns()
+        cost_errors = validate(
+            schema, document,
+            [cost_rule(variables, operation_name, request.query_cost)],
+        )
+        if trace is not None:
+            trace.add_validation(cost_started, time.perf_counter_ns())
+        if cost_errors:
+            return ExecutionResult(data=None, errors=cost_errors)
+
+        response_key = self.response_cache_key(
+            request, operation_ast, key, variables, operation_name
+        )
+        started = None
+        if response_key is not None:
+            data = lookup(response_key)
+            if data is not None:
+                request.response_cache = 'HIT'
+                return ExecutionResult(data=data)
+            request.response_cache = 'MISS'
+            request.cache_tags = set()
+            request.cacheable = True
+            started = time.time()
+
+        replica = None
+        if (
+            operation_ast is not None
+            and operation_ast.operation == OperationType.QUERY
+        ):
+            replica = choose_replica(self.request_user(request))
+
+        return Operation(
+            document, operation_ast, variables, operation_name,
+            response_key, started, replica,
+        )
+
+    def request_user(self, request):
+        """Return the caller, or ``None`` for anonymous or bad tokens."""
+        try:
+            return authenticate_request(request)
+        except JSONWebTokenError:
+            return None
+
+    def execute_options(self, request, operation, middleware):
+        """Return the keyword arguments of ``execute`` for ``operation``."""
+        trace = getattr(request, 'trace', None)
+        if trace is not None:
+            trace.start_execution()
+        execute_options = {
+            "root_value": self.get_root_value(request),
+            "context_value": self.get_context(request),
+            "variable_values": operation.variables,
+            "operation_name": operation.operation_name,
+            "middleware": middleware,
+        }
+        if self.execution_context_class:
+            execute_options[
+                "execution_context_class"
+            ] = self.execution_context_class
+        return execute_options
+
+    def run_operation(self, request, operation):
+        """Execute a prepared operation and cache its result."""
+        schema = self.schema.graphql_schema
+        operation_ast = operation.operation_ast
+        try:
+            execute_options = self.execute_options(
+                request, operation, self.get_middleware(request)
+            )
+
+            if (
+                operation_ast is not None
+                and operation_ast.operation == OperationType.MUTATION
+            ):
+                try:
+                    return self.run_mutation(
+                        request, operation, execute_options
+                    )
+                finally:
+                    # The caller reads their writes until replicas catch up
+                    pin_user(self.request_user(request))
+
+            with replica_reads(operation.replica):
+                result = execute(
+                    schema, operation.document, **execute_options
+                )
+        except Exception as e:
+            return ExecutionResult(errors=[e])
+        finally:
+            tags, request.cache_tags = request.cache_tags, None
+
+        self.cache_result(request, operation, result, tags)
+        return result
+
+    def run_mutation(self, request, operation, execute_options):
+        """Execute a mutation, atomically if so configured."""
+        schema = self.schema.graphql_schema
+        if (
+            graphene_settings.ATOMIC_MUTATIONS is True
+            or connection.settings_dict.get("ATOMIC_MUTATIONS", False) is True
+        ):
+            with transaction.atomic():
+                result = execute(
+                    schema, operation.document, **execute_options
+                )
+                if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+                    transaction.set_rollback(True)
+            return result
+        return execute(schema, operation.document, **execute_options)
+
+    def cache_result(self, request, operation, result, tags):
+        """Store the result of a cacheable query in the response cache."""
+        if (
+            operation.response_key is not None and request.cacheable
+            and not result.errors
+        ):
+            started = operation.started
+            if operation.replica is not None:
+                # The replica may not have seen changes made shortly before
+                started -= replica_setting('MAX_LAG')
+            store(operation.response_key, result.data, tags, started)
+
+    def response_cache_key(
+        self, request, operation_ast, key, variables, operation_name
+    ):
+        """Return the response cache key of a query, or ``None``."""
+        request.cache_tags = None
+        if (
+            not response_cache_setting('ENABLED')
+            or operation_ast is None
+            or operation_ast.operation != OperationType.QUERY
+        ):
+            return None
+        scope = auth_scope(request)
+        if scope is None:
+            return None
+        return cache_key(key, variables, operation_name, scope)
+
+    def get_extensions(self, request, execution_result):
+        """Return the ``extensions`` entry of the response, if any."""
+        extensions = dict(execution_result.extensions or {})
+        if getattr(request, 'query_cost', None):
+            extensions['cost'] = request.query_cost
+        if getattr(request, 'response_cache', None):
+            extensions['responseCache'] = request.response_cache
+        trace = getattr(request, 'trace', None)
+        if trace is not None and trace.tracing:
+            extensions['tracing'] = trace.extension()
+        return extensions
+
+    def get_response(self, request, data, show_graphiql=False):
+        query, variables, operation_name, id = self.get_graphql_params(
+            request, data
+        )
+
+        trace = start_trace(request)
+        result = None
+        try:
+            execution_result = self.execute_graphql_request(
+                request, data, query, variables, operation_name,
+                show_graphiql
+            )
+            result, status_code = self.build_response(
+                request, execution_result, id, show_graphiql
+            )
+        finally:
+            if trace is not None:
+                trace.finish(len(result) if result is not None else None)
+        return result, status_code
+
+    def build_response(
+        self, request, execution_result, id=None, show_graphiql=False
+    ):
+        """Return the encoded response body and status code."""
+        if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+            set_rollback()
+
+        trace = getattr(request, 'trace', None)
+        if trace is not None:
+            trace.end_execution()
+
+        status_code = 200
+        if not execution_result:
+            return None, status_code
+
+        response = {}
+        if execution_result.errors:
+            set_rollback()
+            response["errors"] = [
+                self.format_error(e) for e in execution_result.errors
+            ]
+
+        if execution_result.errors and any(
+            not getattr(e, "path", None) for e in execution_result.errors
+        ):
+            status_code = 400
+        else:
+            response["data"] = execution_result.data
+
+        extensions = self.get_extensions(request, execution_result)
+        if extensions:
+            response["extensions"] = extensions
+
+        if self.batch:
+            response["id"] = id
+            response["status"] = status_code
+
+        result = self.json_encode(request, response, pretty=show_graphiql)
+        return result, status_code
+
+
+class AsyncFeedGraphQLView(FeedGraphQLView):
+    """
+    Asynchronous GraphQL endpoint, for ASGI servers.
+
+    Queries run on graphql-core's async executor, so sibling fields are
+    resolved concurrently; ``AsyncBridgeMiddleware`` decides how each field
+    is resolved without blocking the event loop. The preparation steps of
+    ``FeedGraphQLView`` (persisted queries, cost, response cache) and whole
+    mutations, which rely on transactions, run in the request's sync thread.
+    GraphiQL and batching are only offered by the sync endpoint.
+    """
+
+    # Django routes the request to an async ``dispatch`` when this is set
+    view_is_async = True
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            if request.method.lower() not in ("get", "post"):
+                raise HttpError(
+                    HttpResponseNotAllowed(
+                        ["GET", "POST"],
+                        "GraphQL only supports GET and POST requests."
+                    )
+                )
+
+            data = self.parse_body(request)
+            query, variables, operation_name, id = self.get_graphql_params(
+                request, data
+            )
+            trace = start_trace(request)
+            result = None
+            try:
+                execution_result = await self.execute_graphql_request_async(
+                    request, data, query, variables, operation_name
+                )
+                result, status_code = self.build_response(
+                    request, execution_result, id
+                )
+            finally:
+                if trace is not None:
+                    trace.finish(len(result) if result is not None else None)
+            return HttpResponse(
+                status=status_code, content=result,
+                content_type="application/json"
+            )
+
+        except HttpError as e:
+            response = e.response
+            response["Content-Type"] = "application/json"
+            response.content = self.json_encode(
+                request, {"errors": [self.format_error(e)]}
+            )
+            return response
+
+    def get_async_middleware(self, request):
+        """
+        Return the middleware of async execution: the bridge, innermost,
+        then the configured middleware except the JWT one, whose work
+        ``prepare_async_operation`` has already done.
+        """
+        return [AsyncBridgeMiddleware()] + [
+            middleware for middleware in self.get_middleware(request) or []
+            if not isinstance(middleware, JSONWebTokenMiddleware)
+        ]
+
+    def prepare_async_operation(
+        self, request, data, query, variables, operation_name
+    ):
+        """
+        Authenticate the request, then ``prepare_operation``.
+
+        The JWT middleware would query the user while resolving, so the
+        token is checked here, in the sync thread, and ``request.user`` is
+        loaded before execution starts.
+        """
+        try:
+            authenticate_request(request)
+        except JSONWebTokenError as e:
+            return ExecutionResult(errors=[GraphQLError(str(e))])
+        return self.prepare_operation(
+            request, data, query, variables, operation_name
+        )
+
+    async def execute_graphql_request_async(
+        self, request, data, query, variables, operation_name
+    ):
+        operation = await sync_to_async(self.prepare_async_operation)(
+            request, data, query, variables, operation_name
+        )
+        if not isinstance(operation, Operation):
+            return operation
+        operation_ast = operation.operation_ast
+        if (
+            operation_ast is None
+            or operation_ast.operation != OperationType.QUERY
+        ):
+            return await sync_to_async(self.run_operation)(
+                request, operation
+            )
+
+        try:
+            # Resolver threads copy the context, and the route with it
+            with replica_reads(operation.replica):
+                result = execute(
+                    self.schema.graphql_schema, operation.document,
+                    **self.execute_options(
+                        request, operation,
+                        self.get_async_middleware(request)
+                    ),
+                )
+                if isawaitable(result):
+                    result = await result
+        except Exception as e:
+            return ExecutionResult(errors=[e])
+        finally:
+            tags, request.cache_tags = request.cache_tags, None
+
+        await sync_to_async(self.cache_result)(
+            request, operation, result, tags
+        )
+        return result
+
+
+def graphql_stats(request):
+    """Report the document cache and persisted query counters."""
+    return JsonResponse(stats())
+
+
+@require_safe
+def metrics(request):
+    """
+    Expose the operation metrics in the Prometheus text format.
+
+    Operation names and resolver timings are not public: without a
+    ``TOKEN`` the endpoint is only served while ``DEBUG`` is on.
+    """
+    if not metrics_setting('TOKEN') and not settings.DEBUG:
+        return HttpResponse(status=404)
+    scheme, _, credential = request.headers.get(
+        'Authorization', ''
+    ).partition(' ')
+    if not authorized(credential if scheme == 'Bearer' else None):
+        return HttpResponse(status=401)
+    return HttpResponse(
+        registry.render(), content_type=PROMETHEUS_CONTENT_TYPE
+    )
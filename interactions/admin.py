@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Interaction
+from .models import Interaction, ReactionCount
 # Register your models here.
 
 admin.site.register(Interaction)
+admin.site.register(ReactionCount)
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class InteractionsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'interactions'
+
+    def ready(self):
+        from django.db.models.signals import post_migrate
+        from .reactions import backfill_reaction_counts
+
+        post_migrate.connect(backfill_reaction_counts, sender=self)
@@ -49,7 +49,51 @@ class Interaction(models.Model):
         ordering = ['-created_at']
         # Ensure a user can only interact once per post per type
         unique_together = ('user', 'post', 'interaction_type')
+        indexes = [
+            # recent activity scans (reconcile_counters --since, trending)
+            models.Index(fields=['created_at']),
+        ]
 
     def __str__(self):
         return (f"{self.user.username} {self.interaction_type}d "
                 f"on post {self.post.id} at {self.created_at}")
+
+
+class ReactionCount(models.Model):
+    """
+    Number of interactions of one type on one post.
+
+    Kept current by the interaction mutations so that reaction summaries
+    and ``interactionType`` filters never scan the interaction rows.
+
+    Attributes:
+        post (ForeignKey): The post the reactions belong to.
+        interaction_type (CharField): The type of interaction counted.
+        count (PositiveIntegerField): Number of such interactions.
+    """
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='reaction_counts'
+    )
+    interaction_type = models.CharField(
+        max_length=20,
+        choices=Interaction.INTERACTION_TYPES
+    )
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        # Most frequent reactions first
+        ordering = ['-count', 'interaction_type']
+        unique_together = ('post', 'interaction_type')
+        indexes = [
+            # Existence check behind allPosts(interactionType: ...)
+            models.Index(
+                fields=['interaction_type', 'post'],
+                condition=models.Q(count__gt=0),
+                name='interactions_reaction_nonzero',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.count} {self.interaction_type} on post {self.post_id}"
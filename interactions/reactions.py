@@ -0,0 +1,289 @@
+"""
+Per-post, per-type reaction counters, and setting a reaction in place.
+
+Each ``(post, interaction_type)`` pair has one ``ReactionCount`` row that is
+adjusted with a single ``UPDATE ... SET count = count + n``, so concurrent
+reactions never lose an increment. The row is created on the first
+reaction of its type. Reactions that predate the counters are counted by
+the ``backfill_reaction_counts`` migration hook, and drifted counters are
+recomputed by ``reconcile_counters``.
+
+``set_reaction`` writes a user's reaction with a conflict-ignoring
+``INSERT ... RETURNING``, so the post check, the duplicate check and the
+insert are one statement that a concurrent duplicate cannot race. The
+reactions it replaces or clears are removed with ``DELETE ... RETURNING``;
+on PostgreSQL both run as one statement. Batches of reactions are written
+the same way by ``insert_reactions`` and ``delete_reactions``, so their
+counters follow the rows that were actually written.
+"""
+from collections import Counter, namedtuple
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.db.models import Case, Exists, F, OuterRef, Q, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from posts.counters import add_count
+from posts.models import Post
+from posts.trending import record_activity
+from .models import Interaction, ReactionCount
+
+DEFAULTS = {
+    # Setting a reaction replaces the user's other reactions on the post
+    'ONE_PER_USER': False,
+}
+
+# Outcome of ``set_reaction``: whether the post exists, the reaction now
+# set (or ``None``), whether it was added and the types removed
+ReactionChange = namedtuple(
+    'ReactionChange', 'found interaction added removed'
+)
+
+
+def reaction_setting(name):
+    """Return a ``REACTIONS`` setting, or its default."""
+    return getattr(settings, 'REACTIONS', {}).get(name, DEFAULTS[name])
+
+
+def adjust_reaction_count(post_id, interaction_type, delta):
+    """Add ``delta`` to the ``interaction_type`` counter of a post."""
+    counters = ReactionCount.objects.filter(
+        post_id=post_id, interaction_type=interaction_type
+    )
+    if counters.update(count=F('count') + delta) or delta < 0:
+        return
+    # First reaction of this type: create the row, then count it, so a
+    # concurrent first reaction is not lost either.
+    ReactionCount.objects.bulk_create(
+        [ReactionCount(post_id=post_id, interaction_type=interaction_type)],
+        ignore_conflicts=True,
+    )
+    counters.update(count=F('count') + delta)
+
+
+def adjust_reaction_counts(deltas):
+    """
+    Apply ``{(post_id, interaction_type): delta}`` in two statements.
+
+    Missing rows are created with one conflict-ignoring insert, then every
+    counter is moved with one ``UPDATE ... CASE``.
+    """
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    ReactionCount.objects.bulk_create(
+        [
+            ReactionCount(post_id=post_id, interaction_type=kind)
+            for (post_id, kind), delta in deltas.items() if delta > 0
+        ],
+        ignore_conflicts=True,
+    )
+    change = Case(
+        *[
+            When(post_id=post_id, interaction_type=kind, then=Value(delta))
+            for (post_id, kind), delta in deltas.items()
+        ],
+        default=Value(0),
+    )
+    ReactionCount.objects.filter(reduce(or_, (
+        Q(post_id=post_id, interaction_type=kind)
+        for post_id, kind in deltas
+    ))).update(count=Greatest(F('count') + change, 0))
+
+
+def backfill_reaction_counts(sender=None, using='default', **kwargs):
+    """
+    ``post_migrate`` receiver counting the existing reactions with one
+    ``GROUP BY`` while there are no counters yet.
+    """
+    tables = connections[using].introspection.table_names()
+    if not {Interaction._meta.db_table, ReactionCount._meta.db_table} <= (
+        set(tables)
+    ):
+        return
+    counters = ReactionCount.objects.using(using)
+    if counters.exists() or not Interaction.objects.using(using).exists():
+        return
+    quote = connections[using].ops.quote_name
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {quote(ReactionCount._meta.db_table)} "
+            f"(post_id, interaction_type, count) "
+            f"SELECT post_id, interaction_type, COUNT(*) "
+            f"FROM {quote(Interaction._meta.db_table)} "
+            f"GROUP BY post_id, interaction_type"
+        )
+
+
+def has_reaction(interaction_type):
+    """
+    Return an ``Exists`` expression for posts with ``interaction_type``.
+
+    It is answered by the partial index on non-zero counters.
+    """
+    return Exists(ReactionCount.objects.filter(
+        post=OuterRef('pk'), interaction_type=interaction_type, count__gt=0
+    ))
+
+
+def reaction_statements(user_id, post_id, interaction_type, now,
+                        one_per_user):
+    """
+    Return the ``(sql, params)`` of the ``DELETE`` removing the reactions
+    that ``interaction_type`` replaces (all of them when it's ``None``), and
+    of the ``INSERT`` adding it; either may be ``None``.
+    """
+    quote = connection.ops.quote_name
+    table = quote(Interaction._meta.db_table)
+    delete = insert = None
+    if interaction_type is None or one_per_user:
+        sql = (
+            f"DELETE FROM {table} WHERE user_id = %s AND post_id = %s"
+        )
+        params = [user_id, post_id]
+        if interaction_type is not None:
+            sql += " AND interaction_type <> %s"
+            params.append(interaction_type)
+        delete = (f"{sql} RETURNING interaction_type", params)
+    if interaction_type is not None:
+        # Selecting from the post makes a missing post insert nothing
+        insert = (
+            f"INSERT INTO {table} "
+            f"(user_id, post_id, interaction_type, created_at) "
+            f"SELECT %s, id, %s, %s FROM {quote(Post._meta.db_table)} "
+            f"WHERE id = %s "
+            f"ON CONFLICT (user_id, post_id, interaction_type) DO NOTHING "
+            f"RETURNING id",
+            [
+                user_id, interaction_type,
+                connection.ops.adapt_datetimefield_value(now), post_id,
+            ],
+        )
+    return delete, insert
+
+
+def write_reaction(delete, insert):
+    """
+    Run the statements of ``reaction_statements``; return the removed
+    types and the id of the inserted row, if any.
+    """
+    with connection.cursor() as cursor:
+        if delete and insert and connection.vendor == 'postgresql':
+            # Both in one round trip; the sub-statements touch different
+            # rows, since the kept type is never deleted
+            cursor.execute(
+                f"WITH removed AS ({delete[0]}), added AS ({insert[0]}) "
+                f"SELECT interaction_type, NULL FROM removed "
+                f"UNION ALL SELECT NULL, id FROM added",
+                delete[1] + insert[1],
+            )
+            rows = cursor.fetchall()
+            return (
+                [kind for kind, _ in rows if kind is not None],
+                next((pk for _, pk in rows if pk is not None), None),
+            )
+        removed, added = [], None
+        if delete:
+            cursor.execute(*delete)
+            removed = [kind for kind, in cursor.fetchall()]
+        if insert:
+            cursor.execute(*insert)
+            row = cursor.fetchone()
+            added = row[0] if row else None
+        return removed, added
+
+
+def insert_reactions(user_id, keys, now):
+    """
+    Insert the ``(post_id, interaction_type)`` reactions ``keys`` of a user
+    with one conflict-ignoring ``INSERT``; return the ids of the rows
+    written, by key. Reactions that already exist, such as ones a
+    concurrent request just added, are left out.
+    """
+    keys = list(keys)
+    if not keys:
+        return {}
+    quote = connection.ops.quote_name
+    created_at = connection.ops.adapt_datetimefield_value(now)
+    sql = (
+        f"INSERT INTO {quote(Interaction._meta.db_table)} "
+        f"(user_id, post_id, interaction_type, created_at) VALUES "
+        + ", ".join(["(%s, %s, %s, %s)"] * len(keys))
+        + " ON CONFLICT (user_id, post_id, interaction_type) DO NOTHING "
+        "RETURNING id, post_id, interaction_type"
+    )
+    params = [
+        value for post_id, kind in keys
+        for value in (user_id, post_id, kind, created_at)
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return {(post_id, kind): pk for pk, post_id, kind in cursor}
+
+
+def delete_reactions(ids):
+    """
+    Delete the reactions with primary keys ``ids``; return the
+    ``(post_id, interaction_type)`` of the rows that were still there.
+    """
+    ids = list(ids)
+    if not ids:
+        return []
+    sql = (
+        f"DELETE FROM {connection.ops.quote_name(Interaction._meta.db_table)}"
+        f" WHERE id IN ({', '.join(['%s'] * len(ids))})"
+        f" RETURNING post_id, interaction_type"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, ids)
+        return [tuple(row) for row in cursor]
+
+
+def set_reaction(user, post_id, interaction_type, one_per_user=None):
+    """
+    Set the reaction of ``user`` on a post to ``interaction_type``, or clear
+    their reactions with ``None``; return a ``ReactionChange``.
+
+    Setting a reaction the user already has changes nothing. With
+    ``one_per_user`` (the ``ONE_PER_USER`` setting by default) their other
+    reactions on the post are swapped out. That mode is not a database
+    constraint: the legacy add mutations still allow several types, and
+    two concurrent swaps by one user can both commit.
+
+    The rows, the post and reaction counters, and the trending score are
+    written in one transaction.
+    """
+    if one_per_user is None:
+        one_per_user = reaction_setting('ONE_PER_USER')
+    now = timezone.now()
+    with transaction.atomic():
+        removed, added = write_reaction(*reaction_statements(
+            user.pk, post_id, interaction_type, now, one_per_user
+        ))
+        deltas = Counter({(post_id, kind): -1 for kind in removed})
+        if added is not None:
+            deltas[post_id, interaction_type] += 1
+        total = sum(deltas.values())
+        if total:
+            add_count(post_id, 'interactions_count', total)
+        adjust_reaction_counts(deltas)
+        if added is not None:
+            record_activity(post_id, 'interaction')
+
+    if added is not None:
+        interaction = Interaction(
+            pk=added, user=user, post_id=post_id,
+            interaction_type=interaction_type, created_at=now,
+        )
+        return ReactionChange(True, interaction, True, removed)
+    if interaction_type is None:
+        found = bool(removed) or Post.objects.filter(pk=post_id).exists()
+        return ReactionChange(found, None, False, removed)
+    # Nothing inserted: the reaction was already set, or there's no post
+    interaction = Interaction.objects.filter(
+        user=user, post_id=post_id, interaction_type=interaction_type
+    ).first()
+    return ReactionChange(interaction is not None, interaction, False,
+                          removed)
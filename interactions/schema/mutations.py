@@ -1,7 +1,21 @@
+from collections import Counter
+
 import graphene
+from django.db import transaction
+from django.utils import timezone
 from .types import InteractionType, InteractionTypeEnum
 from ..models import Interaction
+from ..reactions import (
+    adjust_reaction_count, adjust_reaction_counts, delete_reactions,
+    insert_reactions, set_reaction
+)
+from posts.counters import add_count
 from posts.models import Post
+from posts.schema.mutations import MAX_BATCH_SIZE
+from posts.schema.subscriptions import post_channel
+from posts.trending import record_activity
+from core.pubsub import publish
+from core.response_cache import invalidate, tag_for
 
 
 class AddInteraction(graphene.Mutation):
@@ -53,7 +67,7 @@ class AddInteraction(graphene.Mutation):
         existing_interaction = Interaction.objects.filter(
             user=user,
             post=post,
-            interaction_type=interaction_type
+            interaction_type=interaction_type.value
         ).first()
 
         if existing_interaction:
@@ -65,15 +79,36 @@ class AddInteraction(graphene.Mutation):
 
         # Create the new interaction
         print("INteractiontype: ", interaction_type.value)
+        kind = interaction_type.value
+        now = timezone.now()
+        # The row and its counters are written together; a concurrent add
+        # of the same reaction makes the insert write nothing
+        with transaction.atomic(savepoint=False):
+            inserted = insert_reactions(user.pk, [(post.id, kind)], now)
+            if inserted:
+                add_count(post.id, 'interactions_count', 1)
+                adjust_reaction_count(post.id, kind, 1)
+                record_activity(post.id, 'interaction')
+        if not inserted:
+            return AddInteraction(
+                success=False,
+                error="User  has already added this type of interaction.",
+                interaction=Interaction.objects.filter(
+                    user=user, post=post, interaction_type=kind
+                ).first()
+            )
         interaction = Interaction(
+            pk=inserted[post.id, kind],
             user=user,
             post=post,
-            interaction_type=interaction_type.value
+            interaction_type=kind,
+            created_at=now
         )
-        interaction.save()
-
-        post.interactions_count += 1
-        post.save()
+        invalidate(
+            'interactions', 'posts:reactions', 'trending',
+            tag_for(Post, post.id), tag_for(type(user), user.id),
+        )
+        publish(post_channel(post.id, 'reactions'), post.id)
 
         return AddInteraction(
             success=True,
@@ -127,12 +162,23 @@ class RemoveInteraction(graphene.Mutation):
             interaction = Interaction.objects.get(
                 user=user,
                 post=post,
-                interaction_type=interaction_type
+                interaction_type=interaction_type.value
             )
 
-            interaction.delete()
-            post.interactions_count -= 1
-            post.save()
+            # Only the request whose DELETE removed the row moves the
+            # counters, so concurrent removes don't count it twice
+            with transaction.atomic(savepoint=False):
+                if not delete_reactions([interaction.pk]):
+                    raise Interaction.DoesNotExist
+                add_count(post.id, 'interactions_count', -1)
+                adjust_reaction_count(
+                    post.id, interaction.interaction_type, -1
+                )
+            invalidate(
+                'interactions', 'posts:reactions', tag_for(Post, post.id),
+                tag_for(type(user), user.id),
+            )
+            publish(post_channel(post.id, 'reactions'), post.id)
 
             return RemoveInteraction(
                     success=True,
@@ -145,6 +191,249 @@ class RemoveInteraction(graphene.Mutation):
             )
 
 
+class SetReaction(graphene.Mutation):
+    """
+    Mutation to set or clear the viewer's reaction on a post.
+
+    Setting a reaction the viewer already has is a successful no-op, so
+    clients can retry freely. With the ``ONE_PER_USER`` reactions setting
+    the new type replaces the viewer's others on the post; ``null`` clears
+    all of them. See ``interactions.reactions.set_reaction``.
+    """
+
+    class Arguments:
+        post_id = graphene.Int(required=True, description="ID of the post.")
+        interaction_type = InteractionTypeEnum(
+                name='type',
+                description="Reaction to set, or null to clear."
+        )
+
+    success = graphene.Boolean(
+        description="Indicates if the reaction was set or cleared."
+    )
+    error = graphene.String(
+            description="Error message if the operation failed."
+    )
+    changed = graphene.Boolean(
+        description="Indicates if any reaction was added or removed."
+    )
+    interaction = graphene.Field(
+        InteractionType,
+        description="The viewer's reaction of this type, if set."
+    )
+
+    def mutate(self, info, post_id, interaction_type=None):
+        """Set or clear the viewer's reaction."""
+        user = info.context.user
+        if not user.is_authenticated:
+            return SetReaction(
+                success=False,
+                error="User  must be logged in."
+            )
+
+        change = set_reaction(
+            user, post_id,
+            interaction_type.value if interaction_type is not None else None
+        )
+        if not change.found:
+            return SetReaction(success=False, error="Post not found.")
+
+        changed = change.added or bool(change.removed)
+        if changed:
+            tags = ['interactions', 'posts:reactions']
+            if change.added:
+                tags.append('trending')
+            invalidate(
+                *tags, tag_for(Post, post_id), tag_for(type(user), user.id)
+            )
+            publish(post_channel(post_id, 'reactions'), post_id)
+
+        return SetReaction(
+            success=True,
+            error=None,
+            changed=changed,
+            interaction=change.interaction
+        )
+
+
+class InteractionActionEnum(graphene.Enum):
+    """Whether a batch item adds or removes a reaction."""
+    ADD = 'add'
+    REMOVE = 'remove'
+
+
+class InteractionInput(graphene.InputObjectType):
+    """One reaction to add or remove in a batch."""
+    post_id = graphene.Int(required=True, description="ID of the post.")
+    interaction_type = InteractionTypeEnum(
+            required=True,
+            description="Type of interaction."
+    )
+    action = InteractionActionEnum(default_value=InteractionActionEnum.ADD)
+
+
+class InteractionResult(graphene.ObjectType):
+    """Outcome of one item of a reaction batch."""
+    post_id = graphene.Int()
+    interaction_type = InteractionTypeEnum()
+    success = graphene.Boolean()
+    error = graphene.String()
+    interaction = graphene.Field(InteractionType)
+
+
+def plan_interactions(user, items):
+    """
+    Check the items of a reaction batch in order against the reactions of
+    ``user``; return the results and the ``created`` (unsaved) and
+    ``deleted`` interactions by ``(post_id, interaction_type)``.
+    """
+    post_ids = {item.post_id for item in items}
+    found = set(
+        Post.objects.filter(id__in=post_ids).values_list('id', flat=True)
+    )
+    state = {
+        (interaction.post_id, interaction.interaction_type): interaction
+        for interaction in Interaction.objects.filter(
+            user=user, post_id__in=found
+        )
+    }
+
+    created, deleted, results = {}, {}, []
+    for item in items:
+        kind = item.interaction_type.value
+        key = (item.post_id, kind)
+        result = InteractionResult(
+            post_id=item.post_id,
+            interaction_type=item.interaction_type,
+            success=False
+        )
+        results.append(result)
+        if item.post_id not in found:
+            result.error = "Post not found."
+            continue
+
+        if getattr(item.action, 'value', item.action) == 'add':
+            if key in state:
+                result.error = (
+                    "User  has already added this type of interaction."
+                )
+                result.interaction = state[key]
+                continue
+            # Re-adding a reaction removed earlier in the batch is a
+            # no-op; anything else is a new row.
+            interaction = deleted.pop(key, None) or Interaction(
+                user=user, post_id=item.post_id, interaction_type=kind
+            )
+            if interaction.pk is None:
+                created[key] = interaction
+            state[key] = result.interaction = interaction
+        else:
+            interaction = state.pop(key, None)
+            if interaction is None:
+                result.error = "Interaction does not exist."
+                continue
+            if interaction.pk is None:
+                del created[key]
+            else:
+                deleted[key] = interaction
+        result.success = True
+    return results, created, deleted
+
+
+class ApplyInteractions(graphene.Mutation):
+    """
+    Mutation to add and remove many reactions at once.
+
+    Items are checked in order against the state left by earlier items, so
+    a batch may add and later remove the same reaction. Every target is
+    looked up with one ``IN`` query, and all writes and counter updates run
+    in one transaction. Failed items don't stop the others.
+    """
+
+    class Arguments:
+        items = graphene.List(
+            graphene.NonNull(InteractionInput), required=True
+        )
+
+    success = graphene.Boolean(
+        description="Indicates if the batch was processed."
+    )
+    error = graphene.String(
+            description="Error message if the whole batch was rejected."
+    )
+    results = graphene.List(
+        InteractionResult, description="One result per item, in order."
+    )
+
+    def mutate(self, info, items):
+        """Apply a batch of reactions of the logged-in user."""
+        user = info.context.user
+        if not user.is_authenticated:
+            return ApplyInteractions(
+                success=False,
+                error="User  must be logged in."
+            )
+        if len(items) > MAX_BATCH_SIZE:
+            return ApplyInteractions(
+                success=False,
+                error=f"A batch can't hold more than {MAX_BATCH_SIZE} items."
+            )
+
+        with transaction.atomic():
+            results, created, deleted = plan_interactions(user, items)
+            # Derive every counter from the rows actually written: a
+            # concurrent request may have added or removed some already
+            now = timezone.now()
+            inserted = insert_reactions(user.pk, created, now)
+            removed = delete_reactions(i.pk for i in deleted.values())
+
+            reactions = Counter(inserted.keys())
+            reactions.subtract(removed)
+            totals = Counter()
+            for (post_id, _), delta in reactions.items():
+                totals[post_id] += delta
+            added = Counter(post_id for post_id, _ in inserted)
+
+            # One counter update per post, one for all reaction types
+            for post_id, delta in totals.items():
+                if delta:
+                    add_count(post_id, 'interactions_count', delta)
+            adjust_reaction_counts(reactions)
+            for post_id, count in added.items():
+                record_activity(post_id, 'interaction', count=count)
+
+        # Rows a concurrent request inserted first are read back; reactions
+        # added and removed within the batch come back as null.
+        raced = [key for key in created if key not in inserted]
+        existing = {
+            (i.post_id, i.interaction_type): i
+            for i in Interaction.objects.filter(
+                user=user, post_id__in={post_id for post_id, _ in raced}
+            )
+        } if raced else {}
+        for result in results:
+            pending = result.interaction
+            if pending is None or pending.pk is not None:
+                continue
+            key = (pending.post_id, pending.interaction_type)
+            if created.get(key) is not pending:
+                result.interaction = None
+            elif key in inserted:
+                pending.pk, pending.created_at = inserted[key], now
+            else:
+                result.interaction = existing.get(key)
+
+        if totals:
+            invalidate(
+                'interactions', 'posts:reactions', 'trending',
+                tag_for(type(user), user.id),
+                *(tag_for(Post, post_id) for post_id in totals),
+            )
+            for post_id in totals:
+                publish(post_channel(post_id, 'reactions'), post_id)
+        return ApplyInteractions(success=True, error=None, results=results)
+
+
 class Mutation(graphene.ObjectType):
     """Root mutation class for interactions."""
 
@@ -152,3 +441,7 @@ class Mutation(graphene.ObjectType):
     remove_interaction = RemoveInteraction.Field(
                                 name="Post_Interaction_Remove"
                         )
+    apply_interactions = ApplyInteractions.Field(
+                                name="Post_Interactions_Apply"
+                        )
+    set_reaction = SetReaction.Field(name="Post_Reaction_Set")
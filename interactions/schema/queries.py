@@ -1,8 +1,19 @@
 import graphene
 from .types import InteractionType
+from core.loaders import get_loaders
 from ..models import Interaction
 
 
+def filter_interactions(username=None, post_id=None):
+    """Return the interactions matching the query arguments."""
+    qs = Interaction.objects
+    if username:
+        qs = qs.filter(user__username=username)
+    if post_id:
+        qs = qs.filter(post__id=post_id)
+    return qs.all()
+
+
 class Query(graphene.ObjectType):
     interactions = graphene.List(
             InteractionType,
@@ -10,9 +21,9 @@ class Query(graphene.ObjectType):
             post_id=graphene.Int())
 
     def resolve_interactions(self, info, username=None, post_id=None):
-        qs = Interaction.objects
-        if username:
-            qs = qs.filter(user__username=username)
-        if post_id:
-            qs = qs.filter(post__id=post_id)
-        return qs.all()
+        qs = filter_interactions(username, post_id)
+        return get_loaders(info).register(qs)
+
+    async def aresolve_interactions(self, info, username=None, post_id=None):
+        qs = filter_interactions(username, post_id)
+        return get_loaders(info).register([row async for row in qs])
@@ -1,5 +1,6 @@
 import graphene
 from graphene_django.types import DjangoObjectType
+from core.loaders import get_loaders
 from ..models import Interaction
 
 
@@ -14,7 +15,22 @@ class InteractionTypeEnum(graphene.Enum):
     ANGRY = 'angry'  # Represents an angry reaction
 
 
+class ReactionCountType(graphene.ObjectType):
+    """Number of reactions of one type on a post."""
+    interaction_type = graphene.Field(InteractionTypeEnum, required=True)
+    count = graphene.Int(required=True)
+
+    def resolve_interaction_type(self, info):
+        return InteractionTypeEnum.get(self.interaction_type)
+
+
 class InteractionType(DjangoObjectType):
     class Meta:
         model = Interaction
         fields = ('id', 'user', 'post', 'interaction_type', 'created_at')
+
+    def resolve_user(self, info):
+        return get_loaders(info).foreign_key(Interaction, 'user').load(self)
+
+    def resolve_post(self, info):
+        return get_loaders(info).foreign_key(Interaction, 'post').load(self)
@@ -0,0 +1,151 @@
+import json
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from graphql_jwt.shortcuts import get_token
+from posts.models import Post
+from ..models import Interaction, ReactionCount
+from ..schema import mutations
+
+User = get_user_model()
+
+APPLY = '''
+mutation Apply($items: [InteractionInput!]!) {
+  Post_Interactions_Apply(items: $items) {
+    success error
+    results { postId success error interaction { id interactionType } }
+  }
+}
+'''
+
+
+class ApplyInteractionsTest(TestCase):
+    """
+    Test the batched Post_Interactions_Apply mutation.
+    """
+
+    def setUp(self):
+        """
+        Create a user and a few posts.
+        """
+        self.user = User.objects.create_user(
+            username='testuser', password='testpass'
+        )
+        self.posts = [
+            Post.objects.create(user=self.user, title=f'{i}', content='c')
+            for i in range(5)
+        ]
+
+    def apply(self, items):
+        """Send a batch and return (payload, number of queries)."""
+        with CaptureQueriesContext(connection) as queries:
+            body = self.client.post(
+                '/graphql/',
+                json.dumps({'query': APPLY, 'variables': {'items': items}}),
+                content_type='application/json',
+                HTTP_AUTHORIZATION=f'JWT {get_token(self.user)}'
+            ).json()
+        self.assertNotIn('errors', body)
+        return body['data']['Post_Interactions_Apply'], len(queries)
+
+    def test_per_item_results_and_counters(self):
+        """
+        Test that valid items apply and invalid ones report an error.
+        """
+        first, second = self.posts[:2]
+        payload, _ = self.apply([
+            {'postId': first.id, 'interactionType': 'LOVE'},
+            {'postId': first.id, 'interactionType': 'LOVE'},
+            {'postId': second.id, 'interactionType': 'WOW'},
+            {'postId': 0, 'interactionType': 'WOW'},
+            {'postId': second.id, 'interactionType': 'SAD',
+             'action': 'REMOVE'},
+        ])
+        results = payload['results']
+        self.assertEqual(
+            [r['success'] for r in results],
+            [True, False, True, False, False]
+        )
+        self.assertEqual(results[3]['error'], 'Post not found.')
+        self.assertEqual(results[4]['error'], 'Interaction does not exist.')
+        self.assertEqual(
+            results[1]['interaction']['id'], results[0]['interaction']['id']
+        )
+
+        first.refresh_from_db()
+        self.assertEqual(first.interactions_count, 1)
+        self.assertEqual(ReactionCount.objects.get(
+            post=second, interaction_type='wow').count, 1)
+
+    def test_add_then_remove_in_one_batch(self):
+        """
+        Test that later items see the effect of earlier ones.
+        """
+        post = self.posts[0]
+        payload, _ = self.apply([
+            {'postId': post.id, 'interactionType': 'HAHA'},
+            {'postId': post.id, 'interactionType': 'HAHA',
+             'action': 'REMOVE'},
+        ])
+        self.assertTrue(all(r['success'] for r in payload['results']))
+        self.assertFalse(Interaction.objects.exists())
+        post.refresh_from_db()
+        self.assertEqual(post.interactions_count, 0)
+
+    def test_query_count_independent_of_batch_size(self):
+        """
+        Test that lookups and inserts don't grow with the number of items.
+        """
+        _, small = self.apply([
+            {'postId': post.id, 'interactionType': 'LOVE'}
+            for post in self.posts[:2]
+        ])
+        _, large = self.apply([
+            {'postId': post.id, 'interactionType': kind}
+            for post in self.posts[2:4]
+            for kind in ('WOW', 'SAD', 'HAHA', 'ANGRY')
+        ])
+        self.assertEqual(Interaction.objects.count(), 10)
+        self.assertEqual(small, large)
+
+    def test_concurrent_changes_are_not_counted(self):
+        """
+        Test that counters only follow the rows the batch itself wrote when
+        a concurrent request adds and removes the same reactions first.
+        """
+        post = self.posts[0]
+        gone = Interaction.objects.create(
+            user=self.user, post=post, interaction_type='sad'
+        )
+        plan = mutations.plan_interactions
+
+        def concurrently(*args):
+            planned = plan(*args)
+            Interaction.objects.create(
+                user=self.user, post=post, interaction_type='love'
+            )
+            gone.delete()
+            return planned
+
+        with mock.patch.object(mutations, 'plan_interactions', concurrently):
+            payload, _ = self.apply([
+                {'postId': post.id, 'interactionType': 'LOVE'},
+                {'postId': post.id, 'interactionType': 'WOW'},
+                {'postId': post.id, 'interactionType': 'SAD',
+                 'action': 'REMOVE'},
+            ])
+        self.assertTrue(all(r['success'] for r in payload['results']))
+        love = Interaction.objects.get(interaction_type='love')
+        self.assertEqual(
+            payload['results'][0]['interaction']['id'], str(love.pk)
+        )
+        post.refresh_from_db()
+        self.assertEqual(post.interactions_count, 1)
+        self.assertEqual(
+            dict(ReactionCount.objects.filter(post=post).values_list(
+                'interaction_type', 'count')),
+            {'wow': 1},
+        )
@@ -0,0 +1,245 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from graphql_jwt.shortcuts import get_token
+from posts.counters import reconcile
+from posts.models import Post
+from ..models import Interaction, ReactionCount
+from ..reactions import backfill_reaction_counts
+
+User = get_user_model()
+
+REACT = '''
+mutation React($id: Int!, $type: InteractionTypeEnum!) {
+  Post_Interaction_%s(postId: $id, interactionType: $type) { success }
+}
+'''
+
+SET = '''
+mutation Set($id: Int!, $type: InteractionTypeEnum) {
+  Post_Reaction_Set(postId: $id, type: $type) {
+    success error changed interaction { id interactionType }
+  }
+}
+'''
+
+
+class ReactionSummaryTest(TestCase):
+    """
+    Test the per-type reaction counters and the queries they back.
+    """
+
+    def setUp(self):
+        """
+        Create two users and two posts.
+        """
+        self.users = [
+            User.objects.create_user(username=f'user{i}', password='pass')
+            for i in range(2)
+        ]
+        self.post = Post.objects.create(
+            user=self.users[0], title='loved', content='c'
+        )
+        self.other = Post.objects.create(
+            user=self.users[0], title='quiet', content='c'
+        )
+
+    def execute(self, query, variables=None, user=None):
+        """Post an operation, authenticated as ``user`` if given."""
+        headers = {}
+        if user is not None:
+            headers['HTTP_AUTHORIZATION'] = f'JWT {get_token(user)}'
+        return self.client.post(
+            '/graphql/',
+            json.dumps({'query': query, 'variables': variables or {}}),
+            content_type='application/json',
+            **headers
+        ).json()
+
+    def react(self, user, interaction_type, action='Add', post=None):
+        """Add or remove a reaction of ``user``."""
+        post = post or self.post
+        return self.execute(
+            REACT % action, {'id': post.id, 'type': interaction_type}, user
+        )
+
+    def test_mutations_maintain_counters(self):
+        """
+        Test that adding and removing reactions keeps the counts exact.
+        """
+        for user in self.users:
+            self.react(user, 'LOVE')
+        self.react(self.users[0], 'HAHA')
+        self.react(self.users[0], 'HAHA', action='Remove')
+
+        counts = dict(ReactionCount.objects.filter(
+            post=self.post).values_list('interaction_type', 'count'))
+        self.assertEqual(counts, {'love': 2, 'haha': 0})
+
+    def test_reaction_summary(self):
+        """
+        Test that reactionSummary lists non-zero counts, largest first.
+        """
+        for user in self.users:
+            self.react(user, 'LOVE')
+        self.react(self.users[1], 'WOW')
+        self.react(self.users[0], 'SAD')
+        self.react(self.users[0], 'SAD', action='Remove')
+
+        body = self.execute(
+            '{ allPosts { title reactionSummary { interactionType count } } }'
+        )
+        summaries = {
+            post['title']: post['reactionSummary']
+            for post in body['data']['allPosts']
+        }
+        self.assertEqual(summaries['loved'], [
+            {'interactionType': 'LOVE', 'count': 2},
+            {'interactionType': 'WOW', 'count': 1},
+        ])
+        self.assertEqual(summaries['quiet'], [])
+
+    def test_interaction_type_filter_has_no_duplicates(self):
+        """
+        Test that filtering by reaction type returns each post once.
+        """
+        for user in self.users:
+            self.react(user, 'LOVE')
+        self.react(self.users[0], 'HAHA', post=self.other)
+
+        body = self.execute('{ allPosts(interactionType: LOVE) { title } }')
+        self.assertEqual(body['data']['allPosts'], [{'title': 'loved'}])
+
+    def test_existing_reactions_are_backfilled(self):
+        """
+        Test that reactions written before the counters are counted once
+        by the migration hook.
+        """
+        for user in self.users:
+            Interaction.objects.create(
+                user=user, post=self.post, interaction_type='love'
+            )
+        Interaction.objects.create(
+            user=self.users[0], post=self.other, interaction_type='wow'
+        )
+        backfill_reaction_counts()
+        counts = {
+            (row.post_id, row.interaction_type): row.count
+            for row in ReactionCount.objects.all()
+        }
+        self.assertEqual(
+            counts, {(self.post.id, 'love'): 2, (self.other.id, 'wow'): 1}
+        )
+
+        # Counters already exist: later migrations leave them alone
+        Interaction.objects.create(
+            user=self.users[1], post=self.other, interaction_type='wow'
+        )
+        backfill_reaction_counts()
+        self.assertEqual(
+            ReactionCount.objects.get(post=self.other).count, 1
+        )
+
+        body = self.execute('{ allPosts(interactionType: LOVE) { title } }')
+        self.assertEqual(body['data']['allPosts'], [{'title': 'loved'}])
+
+
+class SetReactionTest(TestCase):
+    """
+    Test setting and clearing reactions with Post_Reaction_Set.
+    """
+
+    def setUp(self):
+        """
+        Create a user and a post.
+        """
+        self.user = User.objects.create_user(username='user', password='p')
+        self.post = Post.objects.create(
+            user=self.user, title='post', content='c'
+        )
+
+    def set(self, interaction_type, post_id=None):
+        """Set a reaction of the user, or clear them with ``None``."""
+        response = self.client.post(
+            '/graphql/',
+            json.dumps({'query': SET, 'variables': {
+                'id': post_id or self.post.id, 'type': interaction_type,
+            }}),
+            content_type='application/json',
+            HTTP_AUTHORIZATION=f'JWT {get_token(self.user)}',
+        ).json()
+        return response['data']['Post_Reaction_Set']
+
+    def state(self):
+        """Return the reactions, the counters and whether they agree."""
+        self.post.refresh_from_db()
+        kinds = sorted(Interaction.objects.filter(
+            post=self.post).values_list('interaction_type', flat=True))
+        counts = dict(ReactionCount.objects.filter(
+            post=self.post, count__gt=0).values_list(
+            'interaction_type', 'count'))
+        self.assertEqual(reconcile().fixed, 0)
+        return kinds, counts, self.post.interactions_count
+
+    def test_set_is_idempotent(self):
+        """
+        Test that setting a reaction twice adds it once.
+        """
+        first = self.set('LOVE')
+        self.assertTrue(first['success'])
+        self.assertTrue(first['changed'])
+        again = self.set('LOVE')
+        self.assertTrue(again['success'])
+        self.assertFalse(again['changed'])
+        self.assertEqual(again['interaction'], first['interaction'])
+        self.assertEqual(self.state(), (['love'], {'love': 1}, 1))
+
+    def test_reactions_accumulate_by_default(self):
+        """
+        Test that without the one-per-user mode types add up, and null
+        clears them all.
+        """
+        self.set('LOVE')
+        self.set('WOW')
+        self.assertEqual(
+            self.state(), (['love', 'wow'], {'love': 1, 'wow': 1}, 2)
+        )
+        cleared = self.set(None)
+        self.assertTrue(cleared['changed'])
+        self.assertIsNone(cleared['interaction'])
+        self.assertEqual(self.state(), ([], {}, 0))
+        self.assertFalse(self.set(None)['changed'])
+
+    @override_settings(REACTIONS={'ONE_PER_USER': True})
+    def test_one_per_user_swaps(self):
+        """
+        Test that in one-per-user mode a new type replaces the old one
+        without a separate lookup.
+        """
+        self.set('LOVE')
+        with CaptureQueriesContext(connection) as queries:
+            result = self.set('WOW')
+        self.assertTrue(result['changed'])
+        self.assertEqual(result['interaction']['interactionType'], 'WOW')
+        self.assertEqual(self.state(), (['wow'], {'wow': 1}, 1))
+        writes = [
+            query['sql'] for query in queries.captured_queries
+            if 'interactions_interaction' in query['sql']
+        ]
+        # One data-modifying CTE on PostgreSQL
+        self.assertEqual(
+            len(writes), 1 if connection.vendor == 'postgresql' else 2
+        )
+
+    def test_missing_post(self):
+        """
+        Test that reacting to a missing post fails without writing.
+        """
+        for interaction_type in ('LOVE', None):
+            result = self.set(interaction_type, post_id=self.post.id + 1)
+            self.assertFalse(result['success'])
+            self.assertEqual(result['error'], 'Post not found.')
+        self.assertFalse(Interaction.objects.exists())
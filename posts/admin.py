@@ -1,6 +1,8 @@
 from django.contrib import admin
-from .models import Post, Comment, Share
+from .models import ImageVariant, MediaFile, Post, Comment, Share
 
 admin.site.register(Post)
 admin.site.register(Comment)
 admin.site.register(Share)
+admin.site.register(ImageVariant)
+admin.site.register(MediaFile)
@@ -4,3 +4,17 @@ from django.apps import AppConfig
 class PostsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'posts'
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_migrate
+        from .models import ImageVariant, Post
+        from .search import install_search
+        from .storage import release_files
+        from .threads import backfill_paths
+        from .trending import install_trending
+
+        post_migrate.connect(install_search, sender=self)
+        post_migrate.connect(install_trending, sender=self)
+        post_migrate.connect(backfill_paths, sender=self)
+        post_delete.connect(release_files, sender=Post)
+        post_delete.connect(release_files, sender=ImageVariant)
@@ -0,0 +1,335 @@
+"""
+Denormalized counters on ``Post``.
+
+Mutations never save the whole post row to bump a count; each change is a
+delta on one counter column, applied according to the ``COUNTERS`` setting:
+
+``immediate`` (default)
+    One ``UPDATE ... SET x = x + n`` in the caller's transaction. Concurrent
+    deltas never overwrite each other and reads are exact.
+``buffered``
+    Once the transaction commits, deltas are summed per post in process
+    memory and written every ``FLUSH_INTERVAL`` seconds, or as soon as
+    ``FLUSH_SIZE`` posts are pending, with one UPDATE per post. A hot post
+    takes one row lock per flush instead of one per request, and reads lag
+    by at most the flush interval; each flush invalidates the cached
+    responses of its posts again. Deltas still pending when the process
+    dies are lost; a reconcile pass repairs them.
+
+Counters also drift when rows go away without a mutation (cascades from a
+deleted user, admin edits...). ``reconcile`` recomputes them, and the
+per-type ``ReactionCount`` rows, from the source tables; see the
+``reconcile_counters`` command.
+"""
+import threading
+import time
+from collections import Counter, defaultdict, namedtuple
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+from core.response_cache import invalidate, tag_for
+from interactions.models import Interaction, ReactionCount
+from .models import Comment, Post, Share
+
+DEFAULTS = {
+    'MODE': 'immediate',
+    'FLUSH_INTERVAL': 1.0,
+    'FLUSH_SIZE': 500,
+    'RECONCILE_CHUNK_SIZE': 5000,
+}
+
+COUNTER_FIELDS = ('interactions_count', 'comments_count', 'shares_count')
+
+
+def counter_setting(name):
+    """Return a ``COUNTERS`` setting, or its default."""
+    return getattr(settings, 'COUNTERS', {}).get(name, DEFAULTS[name])
+
+
+def delta_expression(field, delta):
+    """Return ``field + delta``, floored at zero for decrements."""
+    if delta < 0:
+        # The columns are unsigned; a drifted count must not fail the write
+        return Greatest(F(field) + delta, 0)
+    return F(field) + delta
+
+
+def apply_deltas(post_id, deltas):
+    """Add ``deltas`` (a mapping of field to delta) to one post."""
+    updates = {
+        field: delta_expression(field, delta)
+        for field, delta in deltas.items() if delta
+    }
+    if updates:
+        Post.objects.filter(pk=post_id).update(**updates)
+
+
+class CounterBuffer:
+    """
+    Thread-safe per-process buffer of counter deltas.
+
+    Attributes:
+        flushes (int): Number of flushes that wrote to the database.
+    """
+
+    def __init__(self):
+        self.flushes = 0
+        self._pending = defaultdict(Counter)
+        self._lock = threading.Lock()
+        # One flush at a time per process, so flushes never contend
+        self._flush_lock = threading.Lock()
+        self._timer = None
+
+    def add(self, post_id, field, delta):
+        """Buffer ``delta`` for ``field`` of one post."""
+        with self._lock:
+            self._pending[post_id][field] += delta
+            full = len(self._pending) >= counter_setting('FLUSH_SIZE')
+            if not full and self._timer is None:
+                self._timer = threading.Timer(
+                    counter_setting('FLUSH_INTERVAL'), self._flush_in_thread
+                )
+                self._timer.daemon = True
+                self._timer.start()
+        if full:
+            self.flush()
+
+    def take(self):
+        """Remove and return the pending deltas."""
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(Counter)
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            return pending
+
+    def restore(self, pending):
+        """Put deltas that could not be written back in the buffer."""
+        with self._lock:
+            for post_id, deltas in pending.items():
+                self._pending[post_id].update(deltas)
+
+    def flush(self):
+        """Write the pending deltas and return the number of posts."""
+        with self._flush_lock:
+            pending = self.take()
+            if not pending:
+                return 0
+            try:
+                with transaction.atomic():
+                    # A fixed order keeps flushes of several processes
+                    # from deadlocking
+                    for post_id in sorted(pending):
+                        apply_deltas(post_id, pending[post_id])
+            except Exception:
+                self.restore(pending)
+                raise
+        # The mutations invalidated the responses before the counts moved
+        tags = {tag_for(Post, post_id) for post_id in pending}
+        if any(deltas['interactions_count'] for deltas in pending.values()):
+            tags.add('posts:reactions')
+        invalidate(*tags)
+        with self._lock:
+            self.flushes += 1
+        return len(pending)
+
+    def pending(self):
+        """Return the number of posts with unwritten deltas."""
+        with self._lock:
+            return len(self._pending)
+
+    def _flush_in_thread(self):
+        try:
+            self.flush()
+        finally:
+            close_old_connections()
+
+
+counter_buffer = CounterBuffer()
+
+
+def add_count(post_id, field, delta=1):
+    """Add ``delta`` to the ``field`` counter of a post."""
+    if field not in COUNTER_FIELDS:
+        raise ValueError(f"Unknown counter {field!r}.")
+    if counter_setting('MODE') == 'buffered':
+        transaction.on_commit(
+            lambda: counter_buffer.add(post_id, field, delta)
+        )
+    else:
+        apply_deltas(post_id, {field: delta})
+
+
+# Table counted by each counter; every table has an index on ``post_id``
+SOURCES = (
+    ('interactions_count', Interaction),
+    ('comments_count', Comment),
+    ('shares_count', Share),
+)
+
+# ``fixed`` counts posts, ``reactions`` the ReactionCount rows rewritten
+Reconciled = namedtuple(
+    'Reconciled', 'checked fixed last_id complete reactions'
+)
+
+
+def actual_counts(**lookup):
+    """
+    Return ``{post_id: {field: count}}`` from the source tables.
+
+    ``lookup`` selects the rows by ``post_id`` (a range or a list), so each
+    source is read with one ``GROUP BY`` over its post index.
+    """
+    counts = defaultdict(dict)
+    for field, model in SOURCES:
+        rows = model.objects.filter(**lookup).order_by().values(
+            'post_id').annotate(total=Count('*')).values_list(
+            'post_id', 'total')
+        for post_id, total in rows:
+            counts[post_id][field] = total
+    return counts
+
+
+def stale_posts(posts, counts):
+    """Set the correct counts on ``posts``; return the ones that changed."""
+    changed = []
+    for post in posts:
+        expected = counts.get(post.pk, {})
+        dirty = False
+        for field in COUNTER_FIELDS:
+            value = expected.get(field, 0)
+            if getattr(post, field) != value:
+                setattr(post, field, value)
+                dirty = True
+        if dirty:
+            changed.append(post)
+    return changed
+
+
+def reconcile_chunk(ids, **lookup):
+    """Fix the counters of the posts in ``ids``; return how many changed."""
+    posts = Post.objects.filter(pk__in=ids).only(
+        'id', *COUNTER_FIELDS).order_by()
+    stale = [post.pk for post in stale_posts(posts, actual_counts(**lookup))]
+    if not stale:
+        return 0
+
+    # Recount the few stale posts under a row lock, so deltas committed
+    # since the first read are not overwritten.
+    with transaction.atomic():
+        posts = Post.objects.select_for_update().filter(pk__in=stale).only(
+            'id', *COUNTER_FIELDS).order_by('pk')
+        changed = stale_posts(posts, actual_counts(post_id__in=stale))
+        Post.objects.bulk_update(changed, COUNTER_FIELDS, batch_size=1000)
+    return len(changed)
+
+
+def actual_reactions(**lookup):
+    """
+    Return ``{(post_id, interaction_type): count}`` from the interactions
+    selected by ``lookup``, with one ``GROUP BY``.
+    """
+    rows = Interaction.objects.filter(**lookup).order_by().values(
+        'post_id', 'interaction_type').annotate(total=Count('*')).values_list(
+        'post_id', 'interaction_type', 'total')
+    return {(post_id, kind): total for post_id, kind, total in rows}
+
+
+def stale_reactions(ids, counts):
+    """
+    Return the ``(post_id, interaction_type)`` pairs of the posts in ``ids``
+    whose ``ReactionCount`` differs from ``counts`` or is missing.
+    """
+    stored = {
+        (post_id, kind): count
+        for post_id, kind, count in ReactionCount.objects.filter(
+            post_id__in=ids).values_list('post_id', 'interaction_type',
+                                         'count')
+    }
+    return {
+        key for key in stored.keys() | counts.keys()
+        if stored.get(key, 0) != counts.get(key, 0)
+    }
+
+
+def reconcile_reactions(ids, **lookup):
+    """
+    Fix the reaction counters of the posts in ``ids``; return how many
+    rows changed.
+    """
+    stale = stale_reactions(ids, actual_reactions(**lookup))
+    if not stale:
+        return 0
+
+    posts = sorted({post_id for post_id, _ in stale})
+    with transaction.atomic():
+        ReactionCount.objects.bulk_create(
+            [
+                ReactionCount(post_id=post_id, interaction_type=kind)
+                for post_id, kind in stale
+            ],
+            ignore_conflicts=True,
+        )
+        # Recount under the row locks, as for the post counters
+        rows = list(ReactionCount.objects.select_for_update().filter(
+            post_id__in=posts).order_by('pk'))
+        counts = actual_reactions(post_id__in=posts)
+        changed = []
+        for row in rows:
+            count = counts.get((row.post_id, row.interaction_type), 0)
+            if row.count != count:
+                row.count = count
+                changed.append(row)
+        ReactionCount.objects.bulk_update(changed, ['count'], batch_size=1000)
+    return len(changed)
+
+
+def active_posts(since):
+    """Return the ids of posts created or counted since ``since``."""
+    ids = set(Post.objects.filter(
+        created_at__gte=since).values_list('pk', flat=True))
+    for _, model in SOURCES:
+        ids.update(model.objects.filter(created_at__gte=since).order_by(
+            ).values_list('post_id', flat=True).distinct())
+    return sorted(ids)
+
+
+def reconcile(since=None, after=0, chunk_size=None, time_limit=None):
+    """
+    Recompute the post and reaction counters from the source tables.
+
+    Posts are visited in primary key order, ``chunk_size`` at a time, and
+    only rows whose counters differ are written. With ``since`` only posts
+    created or counted since then are checked; deletions are caught by full
+    passes. ``time_limit`` (seconds) stops the pass after the current chunk
+    once exceeded; pass the returned ``last_id`` as ``after`` to resume.
+
+    With buffered counters, deltas still in memory during the pass are
+    applied on top of the recount; the next pass corrects them.
+    """
+    chunk_size = chunk_size or counter_setting('RECONCILE_CHUNK_SIZE')
+    deadline = None if time_limit is None else time.monotonic() + time_limit
+    candidates = None if since is None else [
+        pk for pk in active_posts(since) if pk > after
+    ]
+    checked = fixed = reactions = 0
+    last_id = after
+    while True:
+        if candidates is None:
+            ids = list(Post.objects.filter(pk__gt=last_id).order_by(
+                'pk').values_list('pk', flat=True)[:chunk_size])
+            lookup = {'post__gte': ids[0], 'post__lte': ids[-1]} if ids else {}
+        else:
+            ids = candidates[checked:checked + chunk_size]
+            lookup = {'post_id__in': ids}
+        if not ids:
+            return Reconciled(checked, fixed, last_id, True, reactions)
+
+        fixed += reconcile_chunk(ids, **lookup)
+        reactions += reconcile_reactions(ids, **lookup)
+        checked += len(ids)
+        last_id = ids[-1]
+        if deadline is not None and time.monotonic() >= deadline:
+            return Reconciled(checked, fixed, last_id, False, reactions)
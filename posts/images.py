@@ -0,0 +1,151 @@
+"""
+Post image processing.
+
+Uploads are streamed to a temporary file by Django's upload handler and
+moved into storage as-is, so the request never holds the image in memory
+or waits for it to be processed. Once the post is committed, a background
+job hands the file to a pool of worker processes (see ``posts.imaging``)
+that render every size in every format with the metadata stripped; the job
+then stores the variants and records them on the post. Posts keep
+``image_status`` ``pending`` until then, or ``failed`` if the file could not
+be decoded.
+"""
+import logging
+import multiprocessing
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from core.response_cache import invalidate, tag_for
+from .imaging import FORMATS, render_variants
+from .models import ImageVariant, Post
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    # Longest edge in pixels of each variant
+    'SIZES': {'thumbnail': 160, 'medium': 640, 'large': 1280},
+    # Output formats, best first; clients fall back to the later ones
+    'FORMATS': ('webp', 'jpeg'),
+    'QUALITY': {'webp': 80, 'jpeg': 85},
+    # Worker processes rendering variants; 0 renders in the calling thread
+    'PROCESSES': 2,
+    # Larger sources are rejected as decompression bombs
+    'MAX_PIXELS': 50_000_000,
+    'VARIANTS_DIR': 'post_images/variants',
+}
+
+_pool = None
+
+
+def image_setting(name):
+    """Return a ``POST_IMAGES`` setting, or its default."""
+    return getattr(settings, 'POST_IMAGES', {}).get(name, DEFAULTS[name])
+
+
+def get_pool():
+    """Return the process wide image pool, creating it on first use."""
+    global _pool
+    if _pool is None:
+        # Workers are spawned rather than forked, so they inherit neither
+        # database connections nor the locks of other threads
+        _pool = ProcessPoolExecutor(
+            max_workers=image_setting('PROCESSES'),
+            mp_context=multiprocessing.get_context('spawn'),
+        )
+    return _pool
+
+
+def render(path):
+    """Render the variants of the image at ``path``."""
+    args = (
+        path, image_setting('SIZES'), image_setting('FORMATS'),
+        image_setting('QUALITY'), image_setting('MAX_PIXELS'),
+    )
+    if not image_setting('PROCESSES'):
+        return render_variants(*args)
+    return get_pool().submit(render_variants, *args).result()
+
+
+@contextmanager
+def local_path(field_file):
+    """Yield a local path of ``field_file``, copying it if needed."""
+    try:
+        path = field_file.path
+    except NotImplementedError:
+        path = None
+    if path is not None:
+        yield path
+        return
+    with tempfile.NamedTemporaryFile() as copy:
+        with field_file.open('rb') as source:
+            shutil.copyfileobj(source, copy)
+        copy.flush()
+        yield copy.name
+
+
+def variant_name(size, format):
+    """
+    Return the name one variant is saved as. The content-addressed storage
+    only keeps its directory and extension, so identical variants of
+    different posts are stored once.
+    """
+    _, extension = FORMATS[format]
+    return f"{image_setting('VARIANTS_DIR')}/{size}.{extension}"
+
+
+def delete_files(variants):
+    """Delete (release) the stored files of ``variants``."""
+    for variant in variants:
+        variant.file.delete(save=False)
+
+
+def process_post_image(post_id):
+    """Render and record the image variants of a post."""
+    post = Post.objects.filter(pk=post_id).only('id', 'image').first()
+    if post is None or not post.image:
+        return
+    name = post.image.name
+    try:
+        with local_path(post.image) as path:
+            width, height, rendered = render(path)
+    except Exception:
+        logger.exception("Could not process the image of post %s", post_id)
+        Post.objects.filter(pk=post_id, image=name).update(
+            image_status=Post.IMAGE_FAILED
+        )
+        invalidate(tag_for(Post, post_id))
+        return
+
+    storage = post.image.storage
+    variants = [
+        ImageVariant(
+            post_id=post_id,
+            size=variant['size'],
+            format=variant['format'],
+            width=variant['width'],
+            height=variant['height'],
+            file=storage.save(
+                variant_name(variant['size'], variant['format']),
+                ContentFile(variant['content']),
+            ),
+        )
+        for variant in rendered
+    ]
+
+    with transaction.atomic():
+        # The image may have been replaced while rendering
+        if not Post.objects.filter(pk=post_id, image=name).update(
+            image_width=width, image_height=height,
+            image_status=Post.IMAGE_READY,
+        ):
+            delete_files(variants)
+            return
+        # Deleting the old rows releases their files
+        ImageVariant.objects.filter(post_id=post_id).delete()
+        ImageVariant.objects.bulk_create(variants)
+        invalidate(tag_for(Post, post_id))
@@ -0,0 +1,85 @@
+"""
+Rendering of post image variants with Pillow.
+
+This module only depends on Pillow so that the worker processes of the
+image pool can import it without setting up Django. ``render_variants``
+takes a file path and returns plain data, which keeps what crosses the
+process boundary small and picklable.
+"""
+import io
+
+from PIL import Image, ImageOps
+
+# EXIF orientation tag, and its values that swap width and height
+ORIENTATION = 0x0112
+TRANSPOSED = (5, 6, 7, 8)
+
+# Pillow format name and file extension of each output format
+FORMATS = {
+    'webp': ('WEBP', 'webp'),
+    'jpeg': ('JPEG', 'jpg'),
+}
+
+
+def flatten(image):
+    """Return ``image`` as RGB, compositing transparency onto white."""
+    if image.mode in ('RGBA', 'LA') or (
+        image.mode == 'P' and 'transparency' in image.info
+    ):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def encode(image, format, quality):
+    """Encode ``image`` without any metadata and return the bytes."""
+    # Pillow copies EXIF, XMP and ICC data from ``info`` for some formats
+    image.info = {}
+    buffer = io.BytesIO()
+    pillow_format, _ = FORMATS[format]
+    options = {'quality': quality}
+    if format == 'jpeg':
+        options.update(optimize=True, progressive=True)
+    else:
+        options.update(method=4)
+    image.save(buffer, pillow_format, **options)
+    return buffer.getvalue()
+
+
+def render_variants(path, sizes, formats, quality, max_pixels=None):
+    """
+    Render the variants of the image at ``path``.
+
+    ``sizes`` maps a variant name to the longest edge in pixels; images are
+    never upscaled. The source is decoded once (JPEG straight at the
+    largest size needed) and every variant is resized from the previous,
+    larger one. Returns ``(width, height, variants)`` where ``width`` and
+    ``height`` are the oriented source dimensions and every variant is a
+    dict with ``size``, ``format``, ``width``, ``height`` and ``content``.
+    """
+    if max_pixels is not None:
+        Image.MAX_IMAGE_PIXELS = max_pixels
+    with Image.open(path) as source:
+        width, height = source.size
+        if source.getexif().get(ORIENTATION, 1) in TRANSPOSED:
+            width, height = height, width
+        # Lets the JPEG decoder scale down by up to 8x while decoding
+        largest = max(sizes.values())
+        source.draft('RGB', (largest, largest))
+        image = flatten(ImageOps.exif_transpose(source))
+
+    variants = []
+    for name, edge in sorted(sizes.items(), key=lambda item: -item[1]):
+        if max(image.size) > edge:
+            image = ImageOps.contain(image, (edge, edge), Image.LANCZOS)
+        for format in formats:
+            variants.append({
+                'size': name,
+                'format': format,
+                'width': image.width,
+                'height': image.height,
+                'content': encode(image.copy(), format, quality[format]),
+            })
+    return width, height, variants
@@ -0,0 +1,121 @@
+import json
+from argparse import ArgumentTypeError
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (
+    override_settings, setup_test_environment, teardown_test_environment,
+)
+from core.benchmarks import OPERATIONS, benchmark, report
+
+
+def sizes_argument(value):
+    """Parse comma separated dataset sizes such as ``1000,100000``."""
+    try:
+        sizes = [int(size) for size in value.split(',') if size.strip()]
+    except ValueError:
+        raise ArgumentTypeError(f"Invalid sizes: {value!r}")
+    if not sizes or min(sizes) < 1:
+        raise ArgumentTypeError(f"Invalid sizes: {value!r}")
+    return sizes
+
+
+class Command(BaseCommand):
+    """
+    Benchmark every GraphQL query and mutation against seeded data.
+
+    Each size is seeded into a fresh test database, so no real data is
+    touched, and the response cache is off so that every run executes. The
+    JSON report goes to ``--output`` or stdout; the command fails when an
+    operation errors or exceeds its SQL query budget.
+    """
+    help = "Benchmark the GraphQL operations and report the results."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=sizes_argument, default=[1000],
+            help="Comma separated numbers of posts to seed, e.g. "
+                 "1000,100000,1000000."
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=5,
+            help="Timed runs of each operation."
+        )
+        parser.add_argument(
+            '--operation', action='append', dest='operations',
+            help="Only benchmark this root field; may be repeated."
+        )
+        parser.add_argument(
+            '--output', help="Write the JSON report to this file."
+        )
+        parser.add_argument(
+            '--no-memory', action='store_true',
+            help="Skip the peak memory measurement."
+        )
+
+    def handle(self, *args, sizes, repeat, operations=None, output=None,
+               no_memory=False, **options):
+        if repeat < 1:
+            raise CommandError("--repeat must be positive.")
+        selected = OPERATIONS
+        if operations:
+            known = {op.field for op in OPERATIONS}
+            unknown = set(operations) - known
+            if unknown:
+                raise CommandError(
+                    f"Unknown operations: {', '.join(sorted(unknown))}."
+                )
+            selected = [op for op in OPERATIONS if op.field in operations]
+
+        results = []
+        # Only the seeded test database is read: no cached responses, and
+        # no replicas, which hold the real data
+        overrides = override_settings(
+            RESPONSE_CACHE={
+                **getattr(settings, 'RESPONSE_CACHE', {}), 'ENABLED': False,
+            },
+            REPLICAS={**getattr(settings, 'REPLICAS', {}), 'DATABASES': []},
+        )
+        setup_test_environment()
+        try:
+            for size in sizes:
+                old_name = connection.creation.create_test_db(
+                    verbosity=0, autoclobber=True, serialize=False
+                )
+                try:
+                    with overrides:
+                        results.extend(benchmark(
+                            size, selected, repeat, not no_memory
+                        ))
+                finally:
+                    connection.creation.destroy_test_db(
+                        old_name, verbosity=0
+                    )
+        finally:
+            teardown_test_environment()
+
+        document = json.dumps(report(results), indent=2)
+        if output:
+            with open(output, 'w') as file:
+                file.write(document + '\n')
+        else:
+            self.stdout.write(document)
+
+        summary = self.stderr if output is None else self.stdout
+        failed = []
+        for entry in results:
+            ok = entry['within_budget'] and not entry['errors']
+            if not ok:
+                failed.append(entry)
+            summary.write(
+                f"{entry['operation']:<26} {entry['size']:>9} posts "
+                f"{entry['queries']:>3}/{entry['budget']:<3} queries "
+                f"{entry['wall_time']['median'] * 1000:9.2f} ms"
+                f"{'' if ok else '  FAILED'}"
+            )
+        if failed:
+            raise CommandError(
+                f"{len(failed)} operations failed or exceeded their query "
+                f"budget."
+            )
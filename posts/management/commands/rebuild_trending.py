@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from posts.trending import rebuild
+
+
+class Command(BaseCommand):
+    """
+    Recompute all trending scores from interactions, comments and shares.
+
+    Used to backfill the ranking, or to apply changed weights or
+    half-lives; day-to-day the scores are maintained incrementally.
+    """
+    help = "Rebuild the trending ranking from the activity history."
+
+    def handle(self, *args, **options):
+        rebuild()
+        self.stdout.write("Trending scores rebuilt.")
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from posts.trending import rescale
+
+
+class Command(BaseCommand):
+    """
+    Rescale the trending scores of windows whose epoch is getting old.
+
+    Meant to run periodically (e.g. hourly from cron); windows that don't
+    need it yet are left alone unless ``--force`` is given.
+    """
+    help = "Move trending epochs forward so scores stay in float range."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help="Rescale every window regardless of its age."
+        )
+
+    def handle(self, *args, force=False, **options):
+        rescaled = rescale(force=force)
+        if rescaled:
+            self.stdout.write(f"Rescaled: {', '.join(rescaled)}")
+        else:
+            self.stdout.write("No window needed rescaling.")
@@ -0,0 +1,110 @@
+import os
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+from posts import seeding
+
+
+class Command(BaseCommand):
+    """
+    Fill the database with synthetic users, follows, posts, comments,
+    reactions and shares for load testing.
+
+    Distributions are skewed like production traffic and the denormalized
+    counters match the rows. On PostgreSQL chunks are written with COPY by
+    ``--workers`` processes; SQLite is always written by this process.
+    """
+    help = "Seed a large synthetic feed for load testing."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users', type=int, default=10000,
+            help="Number of users to create."
+        )
+        parser.add_argument(
+            '--posts', type=int, default=100000,
+            help="Number of posts to create."
+        )
+        parser.add_argument(
+            '--followers', type=float, default=20,
+            help="Average number of followers per user."
+        )
+        parser.add_argument(
+            '--comments', type=float, default=3,
+            help="Average number of comments per post."
+        )
+        parser.add_argument(
+            '--reactions', type=float, default=10,
+            help="Average number of reactions per post."
+        )
+        parser.add_argument(
+            '--shares', type=float, default=0.5,
+            help="Average number of shares per post."
+        )
+        parser.add_argument(
+            '--days', type=float, default=30,
+            help="Spread the posts over this many past days."
+        )
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help="Random seed; the same seed gives the same data."
+        )
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help="Number of worker processes."
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=10000,
+            help="Users or posts written per transaction."
+        )
+        parser.add_argument(
+            '--prefix', default='seed',
+            help="Prefix of the generated usernames."
+        )
+        parser.add_argument(
+            '--password', default='password',
+            help="Password of every generated user."
+        )
+
+    def handle(self, *args, users, posts, followers, comments, reactions,
+               shares, days, seed, workers, chunk_size, prefix, password,
+               **options):
+        if users < 2:
+            raise CommandError("--users must be at least 2.")
+        if posts < 0 or chunk_size < 1 or workers < 1:
+            raise CommandError(
+                "--posts, --chunk-size and --workers must be positive."
+            )
+        if min(followers, comments, reactions, shares, days) < 0:
+            raise CommandError("Averages and --days can't be negative.")
+
+        started = time.monotonic()
+        plan = seeding.make_plan(
+            users, posts, followers=followers, comments=comments,
+            reactions=reactions, shares=shares, days=days, seed=seed,
+            chunk_size=chunk_size, prefix=prefix, password=password,
+        )
+        totals = Counter()
+        for counts in seeding.seed(plan, workers=workers):
+            totals.update(counts)
+            if options['verbosity'] > 1:
+                self.stdout.write(
+                    ', '.join(f"{count} {name}" for name, count in
+                              sorted(counts.items()))
+                )
+
+        elapsed = time.monotonic() - started
+        rows = sum(totals.values())
+        self.stdout.write(
+            ', '.join(
+                f"{totals[name]} {name}" for name in
+                ('users', 'follows', 'posts', 'comments', 'interactions',
+                 'shares')
+            )
+            + f" seeded in {elapsed:.1f}s ({rows / max(elapsed, 1e-9):.0f}"
+            " rows/s)."
+        )
+        self.stdout.write(
+            "Run rebuild_trending to rank the new posts."
+        )
@@ -3,6 +3,9 @@ from django.contrib.auth import get_user_model
 
 User = get_user_model()
 
+# Width of one comment id in a materialized path
+PATH_SEGMENT = 10
+
 
 class Post(models.Model):
     """
@@ -20,8 +23,23 @@ class Post(models.Model):
                         A count of comments for the post.
         shares_count (PositiveIntegerField):
                         A count of shares for the post.
-        images (ImageField): images for the post.
+        image (ImageField): The original uploaded image, if any.
+        image_width (PositiveIntegerField): Width of the image, once
+            processed.
+        image_height (PositiveIntegerField): Height of the image, once
+            processed.
+        image_status (CharField): Whether the resized variants of the image
+            are pending, ready or failed.
     """
+    IMAGE_PENDING = 'pending'
+    IMAGE_READY = 'ready'
+    IMAGE_FAILED = 'failed'
+    IMAGE_STATUSES = [
+        (IMAGE_PENDING, 'Pending'),
+        (IMAGE_READY, 'Ready'),
+        (IMAGE_FAILED, 'Failed'),
+    ]
+
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -37,19 +55,58 @@ class Post(models.Model):
     image = models.ImageField(
             upload_to='post_images/', blank=True, null=True
     )
+    image_width = models.PositiveIntegerField(null=True, blank=True)
+    image_height = models.PositiveIntegerField(null=True, blank=True)
+    image_status = models.CharField(
+            max_length=10, choices=IMAGE_STATUSES, blank=True
+    )
 
     class Meta:
-        ordering = ['-created_at']  # default ordering: most recent posts first
+        # default ordering: most recent posts first, id breaks ties so the
+        # order is total and keyset cursors never skip or repeat a post
+        ordering = ['-created_at', '-id']
         indexes = [
             models.Index(fields=['title']),
-            models.Index(fields=['created_at']),
-            models.Index(fields=['user']),
+            models.Index(fields=['-created_at', '-id']),
+            # serves both author lookups and the newest posts of an author
+            models.Index(fields=['user', '-created_at', '-id']),
         ]
 
     def __str__(self):
         return f"Post by {self.user.username} at {self.created_at}"
 
 
+class ImageVariant(models.Model):
+    """
+    A resized copy of a post's image, without metadata.
+
+    Attributes:
+        post (ForeignKey): The post whose image this is a variant of.
+        size (CharField): Name of the size (``thumbnail``, ``medium``...).
+        format (CharField): Encoding of the file (``webp`` or ``jpeg``).
+        width (PositiveIntegerField): Width in pixels.
+        height (PositiveIntegerField): Height in pixels.
+        file (FileField): The encoded image.
+    """
+    post = models.ForeignKey(
+            Post,
+            on_delete=models.CASCADE,
+            related_name='image_variants'
+    )
+    size = models.CharField(max_length=20)
+    format = models.CharField(max_length=10)
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    file = models.FileField(max_length=255)
+
+    class Meta:
+        ordering = ['width', 'id']
+        unique_together = ('post', 'size', 'format')
+
+    def __str__(self):
+        return f"{self.size} {self.format} of post {self.post_id}"
+
+
 class Comment(models.Model):
 
     """
@@ -58,6 +115,9 @@ class Comment(models.Model):
     Attributes:
         post (ForeignKey): The post that the comment belongs to.
         user (ForeignKey): The user who created the comment.
+        parent (ForeignKey): The comment this one replies to, if any.
+        path (CharField): Zero-padded ids of the thread from its top-level
+            comment down to this one, so a subtree is one range of paths.
         content (TextField): The content of the comment.
         created_at (DateTimeField): Timestamp when the comment was created.
     """
@@ -71,6 +131,14 @@ class Comment(models.Model):
             on_delete=models.CASCADE,
             related_name='comments'
     )
+    parent = models.ForeignKey(
+            'self',
+            null=True,
+            blank=True,
+            on_delete=models.CASCADE,
+            related_name='replies'
+    )
+    path = models.CharField(max_length=250, blank=True, editable=False)
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -82,11 +150,42 @@ class Comment(models.Model):
         indexes = [
             models.Index(fields=['post']),
             models.Index(fields=['user']),
+            # recent activity scans (reconcile_counters --since, trending)
+            models.Index(fields=['created_at']),
+            # pages of top-level comments of a post, oldest first
+            models.Index(
+                fields=['post', 'created_at', 'id'],
+                condition=models.Q(parent__isnull=True),
+                name='posts_comment_thread_idx',
+            ),
+            # subtrees, in thread order
+            models.Index(fields=['path']),
         ]
 
     def __str__(self):
         return f"Comment by {self.user.username} on {self.post.id}"
 
+    @property
+    def depth(self):
+        """Nesting level, 0 for a top-level comment."""
+        return max(len(self.path) // PATH_SEGMENT - 1, 0)
+
+    def thread_path(self):
+        """
+        Return the path, first building it (and those of the ancestors)
+        for a comment written before comments had paths.
+        """
+        if not self.path:
+            # The path ends with our own id, known only after the insert
+            prefix = self.parent.thread_path() if self.parent_id else ''
+            self.path = prefix + str(self.pk).zfill(PATH_SEGMENT)
+            Comment.objects.filter(pk=self.pk).update(path=self.path)
+        return self.path
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.thread_path()
+
 
 class Share(models.Model):
     """
@@ -117,11 +216,115 @@ class Share(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        ordering = ['-created_at']
+        # newest first, id breaks ties so inbox cursors are total
+        ordering = ['-created_at', '-id']
         indexes = [
             models.Index(fields=['post']),
-            models.Index(fields=['user']),
+            # pages of sharesSent and sharesInbox, newest first
+            models.Index(fields=['user', '-created_at', '-id']),
+            models.Index(fields=['shared_with', '-created_at', '-id']),
+            # recent activity scans (reconcile_counters --since, trending)
+            models.Index(fields=['created_at']),
         ]
 
     def __str__(self):
         return f"{self.user.username} shared {self.post.title}"
+
+
+class TimelineEntry(models.Model):
+    """
+    A post materialized into the home timeline of one of its readers.
+
+    Entries are written when a post is fanned out to the followers of its
+    author, so a home feed page is a range scan over one owner's entries.
+
+    Attributes:
+        owner (ForeignKey): The user whose timeline holds the entry.
+        post (ForeignKey): The post shown in the timeline.
+        created_at (DateTimeField): Copy of ``post.created_at`` so the
+                        timeline can be paged without joining posts.
+    """
+    owner = models.ForeignKey(
+            User,
+            on_delete=models.CASCADE,
+            related_name='timeline'
+    )
+    post = models.ForeignKey(
+            Post,
+            on_delete=models.CASCADE,
+            related_name='timeline_entries'
+    )
+    created_at = models.DateTimeField()
+
+    class Meta:
+        # post_id rather than post, which would order by Post's ordering
+        ordering = ['-created_at', '-post_id']
+        unique_together = ('owner', 'post')
+        indexes = [
+            models.Index(fields=['owner', '-created_at', '-post']),
+        ]
+
+    def __str__(self):
+        return f"Post {self.post_id} in timeline of {self.owner_id}"
+
+
+class TrendingWindow(models.Model):
+    """
+    Reference point of the decayed scores of one trending window.
+
+    Attributes:
+        name (CharField): The window, e.g. ``day``.
+        epoch (FloatField): Unix time the window's scores are relative to.
+    """
+    name = models.CharField(max_length=10, primary_key=True)
+    epoch = models.FloatField()
+
+    def __str__(self):
+        return f"Trending window {self.name}"
+
+
+class TrendingScore(models.Model):
+    """
+    Time-decayed activity score of a post in one trending window.
+
+    Attributes:
+        post (ForeignKey): The post being ranked.
+        window (CharField): The trending window the score belongs to.
+        score (FloatField): Sum of activity weights, each scaled by
+                        ``2 ** ((event time - epoch) / half-life)``.
+    """
+    post = models.ForeignKey(
+            Post,
+            on_delete=models.CASCADE,
+            related_name='trending_scores'
+    )
+    window = models.CharField(max_length=10)
+    score = models.FloatField(default=0)
+
+    class Meta:
+        unique_together = ('post', 'window')
+        indexes = [
+            models.Index(fields=['window', '-score']),
+        ]
+
+    def __str__(self):
+        return f"Post {self.post_id} scores {self.score} ({self.window})"
+
+
+class MediaFile(models.Model):
+    """
+    A file of the content-addressed media storage.
+
+    Attributes:
+        name (CharField): Storage name, derived from the SHA-256 of the
+            content.
+        size (PositiveBigIntegerField): Size of the content in bytes.
+        references (PositiveIntegerField): Number of saves of this content
+            not deleted yet; the file goes away when it drops to zero.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    size = models.PositiveBigIntegerField()
+    references = models.PositiveIntegerField(default=1)
+
+    def __str__(self):
+        return f"{self.name} ({self.references} references)"
@@ -1,12 +1,27 @@
+from collections import Counter
+
 import graphene
+from django.db import transaction
 from .types import PostType, CommentType, ShareType
-from ..models import Post, Comment, Share
+from ..models import PATH_SEGMENT, Post, Comment, Share
 from django.contrib.auth import get_user_model
 from graphql import GraphQLError
 from graphene_file_upload.scalars import Upload
+from core.background import submit
+from core.pubsub import publish
+from core.response_cache import invalidate, tag_for
+from ..counters import add_count
+from ..images import process_post_image
+from ..threads import MAX_PATH_LENGTH, ancestor_ids, subtree
+from ..timeline import fan_out_post
+from ..trending import record_activity
+from .subscriptions import post_channel
 
 User = get_user_model()
 
+# Items accepted by one batch mutation
+MAX_BATCH_SIZE = 100
+
 
 class CreatePost(graphene.Mutation):
     """Mutation to create a new post."""
@@ -32,7 +47,18 @@ class CreatePost(graphene.Mutation):
 
         # Create the post using the authenticated user
         post = Post(user=user, content=content, image=image, title=title)
+        if image:
+            post.image_status = Post.IMAGE_PENDING
         post.save()
+        invalidate('posts', tag_for(User, user.id))
+        publish('posts', post.id)
+
+        # Resize the image off the request
+        if image:
+            submit(process_post_image, post.id)
+
+        # Push the post into follower timelines off the request
+        submit(fan_out_post, post.id)
         return CreatePost(post=post, error=None, success=True)
 
 
@@ -84,7 +110,9 @@ class UpdatePost(graphene.Mutation):
             post.content = content
         if title:
             post.title = title
-        post.save()
+        # Only the edited columns: the loaded counters may be stale already
+        post.save(update_fields=['title', 'content', 'updated_at'])
+        invalidate('posts', tag_for(Post, post.id))
 
         return UpdatePost(post=post, error=None, success=True)
 
@@ -124,6 +152,10 @@ class DeletePost(graphene.Mutation):
                 success=False
             )
 
+        invalidate(
+            'posts', 'trending', 'interactions', tag_for(Post, post.id),
+            tag_for(User, user.id),
+        )
         post.delete()
         return DeletePost(success=True, error=None)
 
@@ -133,12 +165,13 @@ class CreateComment(graphene.Mutation):
     class Arguments:
         post_id = graphene.ID(required=True)
         content = graphene.String(required=True)
+        parent_id = graphene.ID(description="Comment this one replies to.")
 
     comment = graphene.Field(CommentType)
     error = graphene.String()
     success = graphene.Boolean()
 
-    def mutate(self, info, post_id, content):
+    def mutate(self, info, post_id, content, parent_id=None):
         # Get the currently logged-in user from the context
         user = info.context.user
 
@@ -160,13 +193,34 @@ class CreateComment(graphene.Mutation):
                     success=False
             )
 
-        comment = Comment(post=post, user=user, content=content)
-
-        # Increment the comments count on the post
-        post.comments_count += 1
-        post.save()
+        # Replies must stay on the post and within the path length
+        parent = None
+        if parent_id is not None:
+            parent = Comment.objects.filter(id=parent_id, post=post).first()
+            if parent is None:
+                return CreateComment(
+                    comment=None,
+                    error="Parent comment not found.",
+                    success=False
+                )
+            if len(parent.thread_path()) + PATH_SEGMENT > MAX_PATH_LENGTH:
+                return CreateComment(
+                    comment=None,
+                    error="Replies can't be nested any deeper.",
+                    success=False
+                )
 
+        comment = Comment(post=post, user=user, parent=parent, content=content)
         comment.save()
+
+        # Increment the comments count without rewriting the post row
+        add_count(post.id, 'comments_count', 1)
+        record_activity(post.id, 'comment')
+        invalidate(
+            'trending', tag_for(Post, post.id), tag_for(User, user.id),
+            *(tag_for(Comment, pk) for pk in ancestor_ids(comment.path)),
+        )
+        publish(post_channel(post.id, 'comments'), comment.id)
         return CreateComment(comment=comment, error=None, success=True)
 
 
@@ -215,6 +269,7 @@ class UpdateComment(graphene.Mutation):
 
         comment.content = content
         comment.save()
+        invalidate(tag_for(Comment, comment.id))
         return UpdateComment(comment=comment, error=None, success=True)
 
 
@@ -254,12 +309,18 @@ class DeleteComment(graphene.Mutation):
                 success=False
             )
 
-        post = comment.post
+        # Replies go with the comment
+        post_id = comment.post_id
+        removed = 1 + Comment.objects.filter(subtree(comment.path)).count()
         comment.delete()
 
-        # Decrement the comments count on the post
-        post.comments_count -= 1
-        post.save()
+        # Decrement the comments count without rewriting the post row
+        add_count(post_id, 'comments_count', -removed)
+        invalidate(
+            tag_for(Comment, comment_id), tag_for(Post, post_id),
+            tag_for(User, user.id),
+            *(tag_for(Comment, pk) for pk in ancestor_ids(comment.path)),
+        )
 
         return DeleteComment(success=True, error=None)
 
@@ -323,6 +384,12 @@ class SharePost(graphene.Mutation):
             shared_with=shared_with_user
         )
         share.save()
+        add_count(post.id, 'shares_count', 1)
+        record_activity(post.id, 'share')
+        invalidate(
+            'trending', tag_for(Post, post.id), tag_for(User, user.id),
+            tag_for(User, shared_with_user.id),
+        )
 
         return SharePost(
             success=True,
@@ -331,6 +398,213 @@ class SharePost(graphene.Mutation):
         )
 
 
+class CommentInput(graphene.InputObjectType):
+    """One comment of a batch."""
+    post_id = graphene.ID(required=True)
+    content = graphene.String(required=True)
+    parent_id = graphene.ID(description="Comment this one replies to.")
+
+
+class CommentResult(graphene.ObjectType):
+    """Outcome of one item of a comment batch."""
+    post_id = graphene.ID()
+    success = graphene.Boolean()
+    error = graphene.String()
+    comment = graphene.Field(CommentType)
+
+
+class CreateComments(graphene.Mutation):
+    """
+    Mutation to create many comments at once.
+
+    Posts and parent comments are checked with one ``IN`` query each, the
+    comments are inserted with one ``bulk_create``, and every post's count
+    is updated once, all in one transaction. Failed items don't stop the
+    others.
+    """
+
+    class Arguments:
+        items = graphene.List(graphene.NonNull(CommentInput), required=True)
+
+    success = graphene.Boolean()
+    error = graphene.String()
+    results = graphene.List(CommentResult)
+
+    def mutate(self, info, items):
+        user = info.context.user
+        if user.is_anonymous:
+            return CreateComments(
+                error="User is not Authenticated",
+                success=False
+            )
+        if len(items) > MAX_BATCH_SIZE:
+            return CreateComments(
+                success=False,
+                error=f"A batch can't hold more than {MAX_BATCH_SIZE} items."
+            )
+
+        found = {
+            str(pk) for pk in Post.objects.filter(
+                id__in={item.post_id for item in items}
+            ).values_list('id', flat=True)
+        }
+        parents = {
+            str(parent.pk): parent for parent in Comment.objects.filter(
+                id__in={item.parent_id for item in items if item.parent_id}
+            ).only('id', 'post_id', 'parent_id', 'path')
+        }
+
+        comments, results = [], []
+        for item in items:
+            result = CommentResult(post_id=item.post_id, success=False)
+            results.append(result)
+            if item.post_id not in found:
+                result.error = "Post not found."
+                continue
+            parent = None
+            if item.parent_id is not None:
+                parent = parents.get(item.parent_id)
+                if parent is None or str(parent.post_id) != item.post_id:
+                    result.error = "Parent comment not found."
+                    continue
+                if len(parent.thread_path()) + PATH_SEGMENT > MAX_PATH_LENGTH:
+                    result.error = "Replies can't be nested any deeper."
+                    continue
+            result.comment = Comment(
+                post_id=int(item.post_id), user=user, parent=parent,
+                content=item.content
+            )
+            result.success = True
+            comments.append(result.comment)
+
+        added = Counter(comment.post_id for comment in comments)
+        with transaction.atomic():
+            Comment.objects.bulk_create(comments)
+            # Paths end with the new ids, so they are set in a second pass
+            for comment in comments:
+                prefix = comment.parent.path if comment.parent else ''
+                comment.path = prefix + str(comment.pk).zfill(PATH_SEGMENT)
+            Comment.objects.bulk_update(comments, ['path'])
+
+            for post_id, count in added.items():
+                add_count(post_id, 'comments_count', count)
+                record_activity(post_id, 'comment', count=count)
+
+        if comments:
+            ancestors = {
+                pk for comment in comments
+                for pk in ancestor_ids(comment.path)
+            }
+            invalidate(
+                'trending', tag_for(User, user.id),
+                *(tag_for(Post, post_id) for post_id in added),
+                *(tag_for(Comment, pk) for pk in ancestors),
+            )
+            for comment in comments:
+                publish(post_channel(comment.post_id, 'comments'), comment.id)
+        return CreateComments(success=True, error=None, results=results)
+
+
+class ShareInput(graphene.InputObjectType):
+    """One share of a batch."""
+    post_id = graphene.Int(required=True)
+    username = graphene.String(required=True)
+
+
+class ShareResult(graphene.ObjectType):
+    """Outcome of one item of a share batch."""
+    post_id = graphene.Int()
+    username = graphene.String()
+    success = graphene.Boolean()
+    error = graphene.String()
+    share = graphene.Field(ShareType)
+
+
+class SharePosts(graphene.Mutation):
+    """
+    Mutation to share many posts at once.
+
+    Posts, recipients and earlier shares are checked with one ``IN`` query
+    each, the shares are inserted with one ``bulk_create``, and every
+    post's count is updated once, all in one transaction.
+    """
+
+    class Arguments:
+        items = graphene.List(graphene.NonNull(ShareInput), required=True)
+
+    success = graphene.Boolean()
+    error = graphene.String()
+    results = graphene.List(ShareResult)
+
+    def mutate(self, info, items):
+        user = info.context.user
+        if not user.is_authenticated:
+            return SharePosts(
+                success=False,
+                error="User  must be logged in."
+            )
+        if len(items) > MAX_BATCH_SIZE:
+            return SharePosts(
+                success=False,
+                error=f"A batch can't hold more than {MAX_BATCH_SIZE} items."
+            )
+
+        found = set(Post.objects.filter(
+            id__in={item.post_id for item in items}
+        ).values_list('id', flat=True))
+        recipients = {
+            recipient.username: recipient
+            for recipient in User.objects.filter(
+                username__in={item.username for item in items}
+            )
+        }
+        shared = set(Share.objects.filter(
+            user=user, post_id__in=found,
+            shared_with__in=recipients.values()
+        ).values_list('post_id', 'shared_with_id'))
+
+        shares, results = [], []
+        for item in items:
+            result = ShareResult(
+                post_id=item.post_id, username=item.username, success=False
+            )
+            results.append(result)
+            recipient = recipients.get(item.username)
+            if item.post_id not in found:
+                result.error = "Post not found."
+                continue
+            if recipient is None:
+                result.error = "User with entered username is not found."
+                continue
+            if (item.post_id, recipient.pk) in shared:
+                result.error = (
+                    "User has already shared this post with the specified "
+                    "user."
+                )
+                continue
+            shared.add((item.post_id, recipient.pk))
+            result.share = Share(
+                user=user, post_id=item.post_id, shared_with=recipient
+            )
+            result.success = True
+            shares.append(result.share)
+
+        added = Counter(share.post_id for share in shares)
+        with transaction.atomic():
+            Share.objects.bulk_create(shares)
+            for post_id, count in added.items():
+                add_count(post_id, 'shares_count', count)
+                record_activity(post_id, 'share', count=count)
+
+        if shares:
+            invalidate(
+                'trending', tag_for(User, user.id),
+                *(tag_for(Post, post_id) for post_id in added),
+                *(tag_for(User, share.shared_with_id) for share in shares),
+            )
+        return SharePosts(success=True, error=None, results=results)
+
+
 class Mutation(graphene.ObjectType):
     """Mutation class to define all mutations."""
 
@@ -341,3 +615,5 @@ class Mutation(graphene.ObjectType):
     update_comment = UpdateComment.Field(name="Post_Comment_update")
     delete_comment = DeleteComment.Field(name="Post_Comment_Delete")
     share_post = SharePost.Field(name="Post_Share")
+    create_comments = CreateComments.Field(name="Post_Comments_Add")
+    share_posts = SharePosts.Field(name="Post_Shares_Add")
@@ -1,9 +1,140 @@
 import graphene
 from graphene_django.types import DjangoObjectType
-from .types import PostType, CommentType
+from .types import (
+    COMMENT_COLUMNS, PostType, CommentConnection, PostConnection,
+    ShareConnection, TrendingWindowEnum
+)
+from interactions.reactions import has_reaction
 from interactions.schema.types import InteractionTypeEnum
-from ..models import Post, Comment
+from ..models import Post, Comment, Share
 from django.db.models import Q
+from graphql import GraphQLError
+from core.loaders import get_loaders
+from core.pagination import (
+    FEED_KEYS, Page, apaginate, decode_cursor, keyset_condition, page_size,
+    paginate, to_connection,
+)
+from core.projection import project, selected_fields
+from ..search import SEARCH_KEYS, search_posts
+from ..threads import (
+    DEFAULT_REPLY_PREVIEW, MAX_REPLY_PREVIEW, THREAD_KEYS, TOP_LEVEL_KEYS,
+    attach_reply_previews, subtree,
+)
+from ..timeline import home_feed
+from ..trending import top_posts
+
+POST_FILTERS = dict(
+    title_contains=graphene.String(
+        deprecation_reason="Use searchPosts, which is served by an index."
+    ),
+    content_contains=graphene.String(
+        deprecation_reason="Use searchPosts, which is served by an index."
+    ),
+    interactions_count_above=graphene.Int(),
+    interactions_count_below=graphene.Int(),
+    interaction_type=InteractionTypeEnum(),
+    by_author_username=graphene.String(),
+    created_after=graphene.DateTime(),
+    created_before=graphene.DateTime(),
+)
+
+
+def filter_posts(
+    queryset,
+    title_contains=None,
+    content_contains=None,
+    interactions_count_above=None,
+    interactions_count_below=None,
+    interaction_type=None,
+    by_author_username=None,
+    created_after=None,
+    created_before=None,
+):
+    """Apply the shared post filter arguments to ``queryset``."""
+
+    # Filter by title
+    if title_contains:
+        queryset = queryset.filter(title__icontains=title_contains)
+
+    # Filter by content
+    if content_contains:
+        queryset = queryset.filter(content__icontains=content_contains)
+
+    # Filter by interactions count
+    if interactions_count_above is not None:
+        queryset = queryset.filter(
+                interactions_count__gt=interactions_count_above
+        )
+
+    if interactions_count_below is not None:
+        queryset = queryset.filter(
+                interactions_count__lt=interactions_count_below
+        )
+
+    # Filter by interaction type through the reaction counters, which
+    # neither joins the interactions nor repeats posts
+    if interaction_type:
+        queryset = queryset.filter(has_reaction(interaction_type.value))
+
+    # Filter by author (username)
+    if by_author_username:
+        queryset = queryset.filter(user__username=by_author_username)
+    # Filter by created date
+    if created_after:
+        queryset = queryset.filter(created_at__gte=created_after)
+
+    if created_before:
+        queryset = queryset.filter(created_at__lte=created_before)
+
+    return queryset
+
+
+def all_posts_queryset(
+    info, first=None, after=None, anchor=None, **filters
+):
+    """
+    Return the posts of an ``allPosts`` page, with the columns selected in
+    ``info``; ``anchor`` holds the ``created_at`` and ``id`` of the post
+    given as ``after``.
+    """
+    queryset = project(filter_posts(Post.objects.all(), **filters), info)
+    if after:
+        if anchor is None:
+            raise GraphQLError("Post not found.")
+        queryset = queryset.filter(keyset_condition(
+                ('created_at', 'id'),
+                (anchor['created_at'], anchor['id'])
+        ))
+
+    if first:
+        queryset = queryset[:first]
+    return queryset
+
+
+def posts_connection_queryset(info, **filters):
+    """Return the filtered posts of ``postsConnection``, projected."""
+    return project(
+        filter_posts(Post.objects.all(), **filters), info, 'edges', 'node',
+        keys=FEED_KEYS,
+    )
+
+
+def shares_connection(info, field, first=None, after=None):
+    """
+    Return a page of the logged-in user's shares, keyed on ``field``.
+
+    The page is a range scan over the ``(field, -created_at, -id)`` index;
+    posts and users of the page are then batch loaded.
+    """
+    user = info.context.user
+    if not user.is_authenticated:
+        raise GraphQLError("Not authenticated!")
+
+    page = paginate(
+        Share.objects.filter(**{field: user}), first=first, after=after
+    )
+    get_loaders(info).register(page.rows)
+    return to_connection(ShareConnection, page)
 
 
 class Query(graphene.ObjectType):
@@ -11,89 +142,205 @@ class Query(graphene.ObjectType):
     all_posts = graphene.List(
         PostType,
         first=graphene.Int(),
+        after=graphene.String(
+            description="ID of the last post of the previous page."
+        ),
+        **POST_FILTERS,
+    )
+    posts_connection = graphene.Field(
+        PostConnection,
+        first=graphene.Int(),
         after=graphene.String(),
-        title_contains=graphene.String(),
-        content_contains=graphene.String(),
-        interactions_count_above=graphene.Int(),
-        interactions_count_below=graphene.Int(),
-        interaction_type=InteractionTypeEnum(),
-        by_author_username=graphene.String(),
-        created_after=graphene.DateTime(),
-        created_before=graphene.DateTime(),
+        last=graphene.Int(),
+        before=graphene.String(),
+        **POST_FILTERS,
+    )
+    search_posts = graphene.Field(
+        PostConnection,
+        query=graphene.String(required=True),
+        first=graphene.Int(),
+        after=graphene.String(),
+        description="Full-text search over posts, best match first.",
+    )
+    home_feed = graphene.Field(
+        PostConnection,
+        first=graphene.Int(),
+        after=graphene.String(),
+        description="Posts by the logged-in user and everyone they follow.",
+    )
+    trending_posts = graphene.List(
+        PostType,
+        window=TrendingWindowEnum(default_value=TrendingWindowEnum.DAY.value),
+        first=graphene.Int(),
+        description="Posts with the most recent activity, hottest first.",
+    )
+    shares_inbox = graphene.Field(
+        ShareConnection,
+        first=graphene.Int(),
+        after=graphene.String(),
+        description="Posts shared with the logged-in user, newest first.",
+    )
+    shares_sent = graphene.Field(
+        ShareConnection,
+        first=graphene.Int(),
+        after=graphene.String(),
+        description="Posts the logged-in user shared, newest first.",
     )
     post = graphene.Field(PostType, id=graphene.ID(required=True))
-    comments_for_post = graphene.List(
-        CommentType,
-        post_id=graphene.ID(required=True)
+    comments_for_post = graphene.Field(
+        CommentConnection,
+        post_id=graphene.ID(required=True),
+        first=graphene.Int(),
+        after=graphene.String(),
+        reply_preview=graphene.Int(
+            default_value=DEFAULT_REPLY_PREVIEW,
+            description=f"Replies previewed per thread, at most "
+                        f"{MAX_REPLY_PREVIEW}.",
+        ),
+        description="Top-level comments of a post, oldest first.",
+    )
+    comment_thread = graphene.Field(
+        CommentConnection,
+        comment_id=graphene.ID(required=True),
+        first=graphene.Int(),
+        after=graphene.String(),
+        description="Replies below a comment, in thread order.",
     )
 
-    def resolve_all_posts(
-        self,
-        info,
-        first=None,
-        after=None,
-        title_contains=None,
-        content_contains=None,
-        interactions_count_above=None,
-        interactions_count_below=None,
-        interaction_type=None,
-        by_author_username=None,
-        created_after=None,
-        created_before=None,
-    ):
+    def resolve_all_posts(self, info, first=None, after=None, **filters):
         """Resolve all posts with pagination and filtering."""
-        queryset = Post.objects.all()
+        # Implement pagination: continue after the given post in the
+        # (-created_at, -id) ordering rather than by raw id
+        anchor = None
+        if after:
+            anchor = Post.objects.filter(id=after).values(
+                    'created_at', 'id'
+            ).first()
+        queryset = all_posts_queryset(info, first, after, anchor, **filters)
+        return get_loaders(info).register(queryset)
 
-        # Implement pagination
+    async def aresolve_all_posts(
+        self, info, first=None, after=None, **filters
+    ):
+        """Asynchronous ``resolve_all_posts``."""
+        anchor = None
         if after:
-            last_post_id = int(after)
-            queryset = queryset.filter(id__gt=last_post_id)
-
-        # Filter by title
-        if title_contains:
-            queryset = queryset.filter(title__icontains=title_contains)
-
-        # Filter by content
-        if content_contains:
-            queryset = queryset.filter(content__icontains=content_contains)
-
-        # Filter by interactions count
-        if interactions_count_above is not None:
-            queryset = queryset.filter(
-                    interactions_count__gt=interactions_count_above
-            )
-
-        if interactions_count_below is not None:
-            queryset = queryset.filter(
-                    interactions_count__lt=interactions_count_below
-            )
-
-        # Filter by interaction type (if applicable)
-        if interaction_type:
-            # Assuming you have a way to relate posts to interactions
-            queryset = queryset.filter(
-                    interactions__interaction_type=interaction_type.value
-            )
-
-        # Filter by author (username)
-        if by_author_username:
-            queryset = queryset.filter(user__username=by_author_username)
-        # Filter by created date
-        if created_after:
-            queryset = queryset.filter(created_at__gte=created_after)
-
-        if created_before:
-            queryset = queryset.filter(created_at__lte=created_before)
-
-        if first:
-            queryset = queryset[:first]
-
-        return queryset
+            anchor = await Post.objects.filter(id=after).values(
+                    'created_at', 'id'
+            ).afirst()
+        queryset = all_posts_queryset(info, first, after, anchor, **filters)
+        return get_loaders(info).register([post async for post in queryset])
+
+    def resolve_posts_connection(
+        self, info, first=None, after=None, last=None, before=None,
+        **filters
+    ):
+        """Resolve a page of posts using opaque keyset cursors."""
+        page = paginate(
+            posts_connection_queryset(info, **filters),
+            first=first, after=after, last=last, before=before,
+        )
+        get_loaders(info).register(page.rows)
+        return to_connection(PostConnection, page)
+
+    async def aresolve_posts_connection(
+        self, info, first=None, after=None, last=None, before=None,
+        **filters
+    ):
+        """Asynchronous ``resolve_posts_connection``."""
+        page = await apaginate(
+            posts_connection_queryset(info, **filters),
+            first=first, after=after, last=last, before=before,
+        )
+        get_loaders(info).register(page.rows)
+        return to_connection(PostConnection, page)
+
+    def resolve_search_posts(self, info, query, first=None, after=None):
+        """Resolve a page of posts ranked by relevance to ``query``."""
+        size = page_size(first)
+        seek = decode_cursor(Post, after, SEARCH_KEYS) if after else None
+        try:
+            posts = search_posts(query, size + 1, seek)
+        except NotImplementedError as e:
+            raise GraphQLError(str(e))
+
+        page = Page(posts[:size], SEARCH_KEYS, len(posts) > size, bool(after))
+        get_loaders(info).register(page.rows)
+        return to_connection(PostConnection, page)
+
+    def resolve_home_feed(self, info, first=None, after=None):
+        """Resolve a page of the logged-in user's home timeline."""
+        user = info.context.user
+        if not user.is_authenticated:
+            raise GraphQLError("Not authenticated!")
+
+        seek = decode_cursor(Post, after) if after else None
+        page = home_feed(user, first=first, seek=seek)
+        get_loaders(info).register(page.rows)
+        return to_connection(PostConnection, page)
+
+    def resolve_trending_posts(self, info, window, first=None):
+        """Resolve the top posts of a trending window."""
+        window = getattr(window, 'value', window)
+        return get_loaders(info).register(
+                top_posts(window, page_size(first))
+        )
+
+    def resolve_shares_inbox(self, info, first=None, after=None):
+        """Resolve a page of the shares received by the logged-in user."""
+        return shares_connection(info, 'shared_with', first, after)
+
+    def resolve_shares_sent(self, info, first=None, after=None):
+        """Resolve a page of the shares sent by the logged-in user."""
+        return shares_connection(info, 'user', first, after)
 
     def resolve_post(self, info, id):
         """Resolve a specific post by ID."""
         return Post.objects.get(id=id)
 
-    def resolve_comments_for_post(self, info, post_id):
-        """Resolve comments for a specific post."""
-        return Comment.objects.filter(post_id=post_id)
+    async def aresolve_post(self, info, id):
+        """Asynchronous ``resolve_post``."""
+        return await Post.objects.aget(id=id)
+
+    def resolve_comments_for_post(
+        self, info, post_id, first=None, after=None,
+        reply_preview=DEFAULT_REPLY_PREVIEW
+    ):
+        """Resolve a page of threads with a preview of their replies."""
+        if reply_preview < 0:
+            raise GraphQLError("replyPreview must not be negative.")
+
+        comments = project(
+            Comment.objects.filter(post_id=post_id, parent__isnull=True),
+            info, 'edges', 'node', columns=COMMENT_COLUMNS,
+            keys=TOP_LEVEL_KEYS,
+        )
+        page = paginate(
+            comments, first=first, after=after, keys=TOP_LEVEL_KEYS,
+            descending=False,
+        )
+        loaders = get_loaders(info)
+        loaders.register(page.rows)
+        selected = selected_fields(info, 'edges', 'node')
+        if selected & {'replyCount', 'replyPreview'}:
+            loaders.register(attach_reply_previews(
+                page.rows, min(reply_preview, MAX_REPLY_PREVIEW)
+            ))
+        return to_connection(CommentConnection, page)
+
+    def resolve_comment_thread(self, info, comment_id, first=None, after=None):
+        """Resolve a page of the replies below a comment."""
+        comment = Comment.objects.filter(id=comment_id).only('path').first()
+        if comment is None:
+            raise GraphQLError("Comment not found.")
+
+        replies = project(
+            Comment.objects.filter(subtree(comment.path)),
+            info, 'edges', 'node', columns=COMMENT_COLUMNS, keys=THREAD_KEYS,
+        )
+        page = paginate(
+            replies, first=first, after=after, keys=THREAD_KEYS,
+            descending=False,
+        )
+        get_loaders(info).register(page.rows)
+        return to_connection(CommentConnection, page)
@@ -0,0 +1,50 @@
+import graphene
+from core.pubsub import listen, watch
+from .types import CommentType, PostType
+from ..models import Comment, Post
+
+
+def post_channel(post_id, topic):
+    """Return the channel of one kind of update on a post."""
+    return f'post:{post_id}:{topic}'
+
+
+class Subscription(graphene.ObjectType):
+    """Subscriptions to new posts and to the activity on one post."""
+    post_created = graphene.Field(
+        PostType, description="Every new post, as it is created."
+    )
+    post_reactions_changed = graphene.Field(
+        PostType,
+        post_id=graphene.ID(required=True),
+        description="The post, each time its reactions change. Bursts of "
+                    "reactions are coalesced into one update.",
+    )
+    comment_added = graphene.Field(
+        CommentType,
+        post_id=graphene.ID(required=True),
+        description="Every new comment on the post, replies included.",
+    )
+
+    async def subscribe_post_created(root, info):
+        async for post_id in listen('posts'):
+            post = await Post.objects.filter(pk=post_id).afirst()
+            if post is not None:
+                yield post
+
+    async def subscribe_post_reactions_changed(root, info, post_id):
+        # Only the latest state matters, so a viral post sends one update
+        # per interval whatever the reaction rate, loaded once for all of
+        # its subscribers
+        async def load(message):
+            return await Post.objects.filter(pk=post_id).afirst()
+
+        async for post in watch(post_channel(post_id, 'reactions'), load):
+            if post is not None:
+                yield post
+
+    async def subscribe_comment_added(root, info, post_id):
+        async for comment_id in listen(post_channel(post_id, 'comments')):
+            comment = await Comment.objects.filter(pk=comment_id).afirst()
+            if comment is not None:
+                yield comment
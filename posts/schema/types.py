@@ -1,30 +1,188 @@
 import graphene
 from graphene_django.types import DjangoObjectType
-from ..models import Post, Comment, Share
+from ..images import image_setting
+from ..imaging import FORMATS
+from ..models import ImageVariant, Post, Comment, Share
+from ..threads import attach_reply_previews
 from django.contrib.auth import get_user_model
+from core.loaders import get_loaders
+from interactions.models import Interaction, ReactionCount
+from interactions.schema.types import ReactionCountType
+from users.schema.types import UserType  # noqa: F401
 
 User = get_user_model()
 
 
-class UserType(DjangoObjectType):
-    """GraphQL type for the User model."""
+class TrendingWindowEnum(graphene.Enum):
+    """Time windows the trending ranking is kept for."""
+    HOUR = 'hour'
+    DAY = 'day'
+    WEEK = 'week'
+
+
+ImageFormatEnum = graphene.Enum(
+    'ImageFormatEnum', [(name.upper(), name) for name in FORMATS],
+    description="Encodings post image variants are rendered in.",
+)
+
+
+class ImageVariantType(DjangoObjectType):
+    """GraphQL type for a resized post image."""
+    url = graphene.String(required=True)
+
     class Meta:
-        model = User
+        model = ImageVariant
+        fields = ('size', 'format', 'width', 'height')
+
+    def resolve_url(self, info):
+        return self.file.url
 
 
 class PostType(DjangoObjectType):
     """GraphQL type for the Post model."""
+    reaction_summary = graphene.List(
+        graphene.NonNull(ReactionCountType),
+        description="Reaction counts by type, most frequent first."
+    )
+    image_variants = graphene.List(
+        graphene.NonNull(ImageVariantType),
+        format=ImageFormatEnum(),
+        description="Resized copies of the image, smallest first. Empty "
+                    "until imageStatus is READY.",
+    )
+    image_variant = graphene.Field(
+        ImageVariantType,
+        size=graphene.String(
+            required=True,
+            description="thumbnail, medium or large.",
+        ),
+        format=ImageFormatEnum(
+            description="Defaults to the best format available."
+        ),
+        description="The image resized to one size.",
+    )
+
     class Meta:
         model = Post
 
+    def resolve_user(self, info):
+        return get_loaders(info).foreign_key(Post, 'user').load(self)
+
+    def resolve_comments(self, info):
+        return get_loaders(info).related(Comment, 'post').load(self)
+
+    def resolve_shares(self, info):
+        return get_loaders(info).related(Share, 'post').load(self)
+
+    def resolve_interactions(self, info):
+        return get_loaders(info).related(Interaction, 'post').load(self)
+
+    def resolve_reaction_summary(self, info):
+        rows = get_loaders(info).related(ReactionCount, 'post').load(self)
+        return [row for row in rows if row.count]
+
+    def resolve_image_variants(self, info, format=None):
+        rows = get_loaders(info).related(ImageVariant, 'post').load(self)
+        format = getattr(format, 'value', format)
+        return [row for row in rows if format in (None, row.format)]
+
+    def resolve_image_variant(self, info, size, format=None):
+        rows = get_loaders(info).related(ImageVariant, 'post').load(self)
+        format = getattr(format, 'value', format)
+        candidates = [
+            row for row in rows
+            if row.size == size and format in (None, row.format)
+        ]
+        # The configured formats are listed best first
+        preference = list(image_setting('FORMATS'))
+        candidates.sort(key=lambda row: (
+            preference.index(row.format) if row.format in preference
+            else len(preference)
+        ))
+        return candidates[0] if candidates else None
+
+
+# Model fields read by the resolvers of the computed CommentType fields, for
+# ``core.projection``
+COMMENT_COLUMNS = {
+    'depth': ('path',),
+    'replyCount': ('parent', 'path'),
+    'replyPreview': ('parent', 'path'),
+}
+
 
 class CommentType(DjangoObjectType):
     """GraphQL type for the Comment model."""
+    depth = graphene.Int(
+        required=True, description="Nesting level, 0 for top-level comments."
+    )
+    reply_count = graphene.Int(
+        description="Number of replies in the thread of a top-level comment."
+    )
+    reply_preview = graphene.List(
+        graphene.NonNull(lambda: CommentType),
+        description="First replies of the thread of a top-level comment, "
+                    "in thread order.",
+    )
+
     class Meta:
         model = Comment
 
+    def resolve_post(self, info):
+        return get_loaders(info).foreign_key(Comment, 'post').load(self)
+
+    def resolve_user(self, info):
+        return get_loaders(info).foreign_key(Comment, 'user').load(self)
+
+    def resolve_parent(self, info):
+        return get_loaders(info).foreign_key(Comment, 'parent').load(self)
+
+    def resolve_replies(self, info):
+        return get_loaders(info).related(Comment, 'parent').load(self)
+
+    def resolve_reply_count(self, info):
+        return load_reply_preview(info, self).reply_count
+
+    def resolve_reply_preview(self, info):
+        return load_reply_preview(info, self).reply_preview
+
+
+def load_reply_preview(info, comment):
+    """Attach reply previews to the cohort of ``comment`` unless present."""
+    if not hasattr(comment, 'reply_preview'):
+        loaders = get_loaders(info)
+        loaders.register(attach_reply_previews(loaders.cohort(comment)))
+    return comment
+
 
 class ShareType(DjangoObjectType):
     """GraphQL type for the Share model."""
     class Meta:
         model = Share
+
+    def resolve_post(self, info):
+        return get_loaders(info).foreign_key(Share, 'post').load(self)
+
+    def resolve_user(self, info):
+        return get_loaders(info).foreign_key(Share, 'user').load(self)
+
+    def resolve_shared_with(self, info):
+        return get_loaders(info).foreign_key(Share, 'shared_with').load(self)
+
+
+class PostConnection(graphene.relay.Connection):
+    """Relay connection over posts, newest first."""
+    class Meta:
+        node = PostType
+
+
+class CommentConnection(graphene.relay.Connection):
+    """Relay connection over comments."""
+    class Meta:
+        node = CommentType
+
+
+class ShareConnection(graphene.relay.Connection):
+    """Relay connection over shares, newest first."""
+    class Meta:
+        node = ShareType
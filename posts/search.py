@@ -0,0 +1,180 @@
+"""
+Full-text search over post titles and content.
+
+The search structures are database specific, so they are created by a
+``post_migrate`` hook rather than by the model migrations:
+
+* PostgreSQL: a generated ``tsvector`` column (title weighted above content)
+  with a GIN index. The database recomputes it whenever a row is written.
+* SQLite: an FTS5 external-content table kept in sync by triggers, so local
+  development and the test suite can search without a Postgres server.
+
+Results are ranked by relevance and paginated with a ``(rank, id)`` keyset,
+so a page reads only the matching index entries it returns.
+"""
+import re
+
+from django.db import connections
+
+from .models import Post
+
+SEARCH_KEYS = ('rank', 'id')
+
+
+class PostgresSearchBackend:
+    """Search through a GIN indexed ``tsvector`` column."""
+
+    config = 'english'
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.table = connection.ops.quote_name(Post._meta.db_table)
+
+    def install(self):
+        """Create the search column and its index if they are missing."""
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"""
+                ALTER TABLE {self.table}
+                ADD COLUMN IF NOT EXISTS search_vector tsvector
+                GENERATED ALWAYS AS (
+                    setweight(to_tsvector('{self.config}',
+                                          coalesce(title, '')), 'A') ||
+                    setweight(to_tsvector('{self.config}',
+                                          coalesce(content, '')), 'B')
+                ) STORED
+            """)
+            cursor.execute(f"""
+                CREATE INDEX IF NOT EXISTS posts_post_search_idx
+                ON {self.table} USING gin (search_vector)
+            """)
+
+    def search(self, text, limit, after=None):
+        """Return up to ``limit`` ``(post id, rank)`` pairs, best first."""
+        params = [self.config, text]
+        seek = ''
+        if after is not None:
+            seek = "AND (ts_rank(search_vector, q)::float8, id) < (%s, %s)"
+            params += list(after)
+        params.append(limit)
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"""
+                SELECT id, ts_rank(search_vector, q)::float8 AS rank
+                FROM {self.table}, websearch_to_tsquery(%s, %s) q
+                WHERE search_vector @@ q {seek}
+                ORDER BY rank DESC, id DESC
+                LIMIT %s
+            """, params)
+            return cursor.fetchall()
+
+
+class SQLiteSearchBackend:
+    """Search through an FTS5 shadow table of ``posts_post``."""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.table = Post._meta.db_table
+        self.fts = f'{self.table}_fts'
+
+    def install(self):
+        """Create the FTS5 table and sync triggers, then index old rows."""
+        fts, table = self.fts, self.table
+        statements = [
+            f"""CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+                    title, content, content='{table}', content_rowid='id',
+                    tokenize='porter unicode61'
+                )""",
+            f"""CREATE TRIGGER IF NOT EXISTS {fts}_ai
+                AFTER INSERT ON {table} BEGIN
+                    INSERT INTO {fts}(rowid, title, content)
+                    VALUES (new.id, new.title, new.content);
+                END""",
+            f"""CREATE TRIGGER IF NOT EXISTS {fts}_ad
+                AFTER DELETE ON {table} BEGIN
+                    INSERT INTO {fts}({fts}, rowid, title, content)
+                    VALUES ('delete', old.id, old.title, old.content);
+                END""",
+            f"""CREATE TRIGGER IF NOT EXISTS {fts}_au
+                AFTER UPDATE OF title, content ON {table} BEGIN
+                    INSERT INTO {fts}({fts}, rowid, title, content)
+                    VALUES ('delete', old.id, old.title, old.content);
+                    INSERT INTO {fts}(rowid, title, content)
+                    VALUES (new.id, new.title, new.content);
+                END""",
+            f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+        ]
+        with self.connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+
+    @staticmethod
+    def to_match(text):
+        """Quote every word so user input can't break the FTS5 syntax."""
+        words = re.findall(r'\w+', text)
+        return ' '.join(f'"{word}"' for word in words)
+
+    def search(self, text, limit, after=None):
+        """Return up to ``limit`` ``(post id, rank)`` pairs, best first."""
+        match = self.to_match(text)
+        if not match:
+            return []
+        params = [match]
+        seek = ''
+        if after is not None:
+            seek = "WHERE rank < %s OR (rank = %s AND id < %s)"
+            params += [after[0], after[0], after[1]]
+        params.append(limit)
+        with self.connection.cursor() as cursor:
+            # bm25() is lower-is-better; negate it so both backends rank
+            # descending. Title matches weigh twice as much as content.
+            cursor.execute(f"""
+                SELECT id, rank FROM (
+                    SELECT rowid AS id, -bm25({self.fts}, 2.0, 1.0) AS rank
+                    FROM {self.fts} WHERE {self.fts} MATCH %s
+                ) {seek}
+                ORDER BY rank DESC, id DESC
+                LIMIT %s
+            """, params)
+            return cursor.fetchall()
+
+
+BACKENDS = {
+    'postgresql': PostgresSearchBackend,
+    'sqlite': SQLiteSearchBackend,
+}
+
+
+def get_backend(using='default'):
+    """Return the search backend for a database alias, or ``None``."""
+    connection = connections[using]
+    backend = BACKENDS.get(connection.vendor)
+    return backend(connection) if backend else None
+
+
+def install_search(sender, using='default', **kwargs):
+    """``post_migrate`` receiver creating the search structures."""
+    backend = get_backend(using)
+    table = Post._meta.db_table
+    if backend and table in connections[using].introspection.table_names():
+        backend.install()
+
+
+def search_posts(text, limit, after=None, using='default'):
+    """
+    Return up to ``limit`` posts matching ``text``, best match first.
+
+    Each post carries its relevance as ``post.rank``. ``after`` is the
+    ``(rank, id)`` of the last post of the previous page.
+    """
+    backend = get_backend(using)
+    if backend is None:
+        raise NotImplementedError(
+            f"Search is not supported on {connections[using].vendor}."
+        )
+    hits = backend.search(text, limit, after)
+    posts = Post.objects.using(using).in_bulk([pk for pk, _ in hits])
+    results = []
+    for pk, rank in hits:
+        if pk in posts:
+            posts[pk].rank = rank
+            results.append(posts[pk])
+    return results
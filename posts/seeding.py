@@ -0,0 +1,557 @@
+"""
+Synthetic data for load testing (the ``seed_feed`` command).
+
+Rows are generated with NumPy from a seed, so the same arguments always
+produce the same data. Distributions are skewed like real traffic:
+followers, authorship, comments, reactions and shares follow a power law,
+reaction types are weighted, and posts cluster in bursts over the seeded
+period, with activity trailing the post by exponential delays.
+
+The work is split into chunks that need no coordination:
+
+* user chunks, whose ``followers_count`` comes from regenerating the
+  chunk's follows;
+* follow chunks, keyed by followee;
+* post chunks, which generate their posts' comments, reactions and
+  shares together, so ``Post`` counters and ``ReactionCount`` rows are
+  computed before the insert and never need reconciling.
+
+Users, posts and comments get explicit ids after the current maximum
+(comment paths are built from them), so chunks can run in parallel worker
+processes once the users exist. Each chunk is one transaction.
+
+Rows are written with ``COPY`` on PostgreSQL and batched INSERTs
+elsewhere. Neither calls ``save()`` or sends signals: timelines and
+trending scores are not fed, so run ``rebuild_trending`` afterwards.
+Seed into an idle database, since concurrent writes could take the ids.
+"""
+import io
+import multiprocessing
+import time
+from collections import Counter, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from functools import lru_cache
+
+import django
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import DateTimeField, Max
+from interactions.models import Interaction, ReactionCount
+from users.models import Follow
+from .models import PATH_SEGMENT, Comment, Post, Share
+
+User = get_user_model()
+
+# Shape of the power law of every skewed count; the mean is set separately
+POWER_LAW_SHAPE = 2.2
+# Relative frequency of each reaction type
+REACTION_WEIGHTS = {
+    'thumbs_up': 40, 'love': 25, 'haha': 12, 'wow': 8, 'sad': 7,
+    'thumbs_down': 5, 'angry': 3,
+}
+# Posts outside any burst, bursts per day and burst length in seconds
+BACKGROUND_SHARE = 0.3
+BURSTS_PER_DAY = 4
+BURST_SECONDS = 2 * 3600
+# Mean delay between a post and the activity on it, in seconds
+ACTIVITY_DELAY = 6 * 3600
+# Share of comments that reply to an earlier comment, and deepest level
+REPLY_SHARE = 0.4
+MAX_DEPTH = 5
+
+INSERT_BATCH_SIZE = 2000
+
+VOCABULARY = (
+    'morning coffee weekend travel photo city music concert friends family '
+    'project launch update release team office remote work garden summer '
+    'winter rain sunset beach mountain hike run bike recipe dinner pizza '
+    'book movie series game match goal win news idea question answer tip '
+    'thanks great amazing love new first last today tomorrow finally'
+).split()
+
+# Independent random streams, each seeded per chunk
+(USER_STREAM, FOLLOW_STREAM, FOLLOW_TIME_STREAM, POST_STREAM,
+ POPULATION_STREAM) = range(5)
+
+SeedPlan = namedtuple('SeedPlan', [
+    'seed', 'users', 'posts', 'followers', 'comments', 'reactions',
+    'shares', 'start', 'end', 'chunk_size', 'prefix', 'password',
+    'first_user', 'first_post', 'first_comments',
+])
+
+
+def generator(plan, stream, chunk=0):
+    """Return the random generator of one stream of one chunk."""
+    return np.random.default_rng([plan.seed, stream, chunk])
+
+
+def skewed(rng, mean, size, limit):
+    """
+    Draw ``size`` power-law distributed counts averaging about ``mean``,
+    capped at ``limit``.
+    """
+    if mean <= 0 or limit <= 0:
+        return np.zeros(size, dtype=np.int64)
+    scale = mean * (POWER_LAW_SHAPE - 1)
+    # Adding a uniform before flooring keeps the mean of the integer counts
+    values = rng.pareto(POWER_LAW_SHAPE, size) * scale + rng.random(size)
+    return np.minimum(values.astype(np.int64), limit)
+
+
+def chunks(total, chunk_size):
+    """Return the ``(start, stop)`` index ranges of the chunks."""
+    return [
+        (start, min(start + chunk_size, total))
+        for start in range(0, total, chunk_size)
+    ]
+
+
+def timestamp(seconds):
+    return datetime.fromtimestamp(seconds, tz=timezone.utc)
+
+
+def others(rng, size, population, excluded):
+    """Draw indices below ``population`` that differ from ``excluded``."""
+    drawn = rng.integers(0, population - 1, size)
+    return drawn + (drawn >= excluded)
+
+
+def activity_counts(rng, plan, size):
+    """
+    Draw the comments, reactions and shares of ``size`` posts. They are
+    the first draws of a post chunk, so ``make_plan`` can size the chunk's
+    comment ids without generating the rest.
+    """
+    comments = skewed(rng, plan.comments, size, plan.users)
+    reactions = skewed(
+        rng, plan.reactions, size, plan.users * len(REACTION_WEIGHTS)
+    )
+    shares = skewed(rng, plan.shares, size, plan.users)
+    return comments, reactions, shares
+
+
+def make_plan(users, posts, followers=20, comments=3, reactions=10,
+              shares=0.5, days=30, seed=0, chunk_size=10000, prefix='seed',
+              password='password', now=None):
+    """
+    Return the ``SeedPlan`` of a dataset: ``users`` users and ``posts``
+    posts spread over the last ``days`` days, with the given average
+    number of followers per user and of comments, reactions and shares per
+    post. New ids start after the existing rows.
+    """
+    if users < 2:
+        raise ValueError("At least two users are needed.")
+    end = time.time() if now is None else now
+    plan = SeedPlan(
+        seed=seed, users=users, posts=posts, followers=followers,
+        comments=comments, reactions=reactions, shares=shares,
+        start=end - days * 86400, end=end, chunk_size=chunk_size,
+        prefix=prefix, password=make_password(password),
+        first_user=next_id(User), first_post=next_id(Post),
+        first_comments=(),
+    )
+    first_comments, next_comment = [], next_id(Comment)
+    for chunk, (start, stop) in enumerate(chunks(posts, chunk_size)):
+        first_comments.append(next_comment)
+        comment_counts, _, _ = activity_counts(
+            generator(plan, POST_STREAM, chunk), plan, stop - start
+        )
+        next_comment += int(comment_counts.sum())
+    return plan._replace(first_comments=tuple(first_comments))
+
+
+def next_id(model):
+    return (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+
+
+@lru_cache(maxsize=4)
+def population(plan):
+    """
+    Return the cumulative authorship weights of the users and the bursts
+    (cumulative weights and start times) of a plan. Shared by every chunk,
+    so computed once per process.
+    """
+    rng = generator(plan, POPULATION_STREAM)
+    authorship = np.cumsum(rng.pareto(POWER_LAW_SHAPE, plan.users) + 0.01)
+    days = max((plan.end - plan.start) / 86400, 1)
+    bursts = max(int(days * BURSTS_PER_DAY), 1)
+    burst_weights = np.cumsum(rng.pareto(POWER_LAW_SHAPE, bursts) + 0.01)
+    burst_starts = rng.uniform(plan.start, plan.end, bursts)
+    return authorship, burst_weights, burst_starts
+
+
+def pick(rng, cumulative, size):
+    """Draw indices with the probabilities of cumulative weights."""
+    return np.searchsorted(cumulative, rng.random(size) * cumulative[-1])
+
+
+def post_times(rng, plan, size):
+    """Draw bursty creation times of ``size`` posts, in Unix time."""
+    _, burst_weights, burst_starts = population(plan)
+    bursty = burst_starts[pick(rng, burst_weights, size)] + rng.exponential(
+        BURST_SECONDS, size
+    )
+    background = rng.uniform(plan.start, plan.end, size)
+    times = np.where(rng.random(size) < BACKGROUND_SHARE, background, bursty)
+    return np.minimum(times, plan.end)
+
+
+def activity_times(rng, plan, times):
+    """Draw times of activity trailing events at ``times``."""
+    return np.minimum(
+        times + rng.exponential(ACTIVITY_DELAY, len(times)), plan.end
+    )
+
+
+def words(rng, low, high, size):
+    """Draw ``size`` strings of ``low`` to ``high`` vocabulary words."""
+    lengths = rng.integers(low, high + 1, size)
+    drawn = np.asarray(VOCABULARY)[
+        rng.integers(0, len(VOCABULARY), int(lengths.sum()))
+    ].tolist()
+    texts, offset = [], 0
+    for length in lengths.tolist():
+        texts.append(' '.join(drawn[offset:offset + length]))
+        offset += length
+    return texts
+
+
+def follow_pairs(plan, start, stop):
+    """
+    Return the ``(followee, follower)`` user indices of the follows of the
+    users ``start`` to ``stop``, without duplicates or self-follows.
+    """
+    rng = generator(plan, FOLLOW_STREAM, start // plan.chunk_size)
+    degrees = skewed(rng, plan.followers, stop - start, plan.users - 1)
+    followees = np.repeat(np.arange(start, stop), degrees)
+    followers = others(rng, len(followees), plan.users, followees)
+    keys = np.unique(followees * plan.users + followers)
+    return keys // plan.users, keys % plan.users
+
+
+def seed_users(plan, start, stop):
+    """Insert the users ``start`` to ``stop``; return the row counts."""
+    rng = generator(plan, USER_STREAM, start // plan.chunk_size)
+    followees, _ = follow_pairs(plan, start, stop)
+    followers_count = np.bincount(followees - start, minlength=stop - start)
+    joined = rng.uniform(plan.start - 365 * 86400, plan.start, stop - start)
+    users = [
+        (pk, f'{plan.prefix}{pk}', plan.password,
+         f'{plan.prefix}{pk}@example.com', timestamp(at), count)
+        for pk, at, count in zip(
+            range(plan.first_user + start, plan.first_user + stop),
+            joined.tolist(), followers_count.tolist(),
+        )
+    ]
+    with transaction.atomic():
+        insert(User, ('id', 'username', 'password', 'email', 'date_joined',
+                      'followers_count'), users)
+    return Counter({'users': len(users)})
+
+
+def seed_follows(plan, start, stop):
+    """Insert the follows of the users ``start`` to ``stop``."""
+    rng = generator(plan, FOLLOW_TIME_STREAM, start // plan.chunk_size)
+    followees, followers = follow_pairs(plan, start, stop)
+    times = rng.uniform(plan.start, plan.end, len(followees))
+    follows = [
+        (plan.first_user + follower, plan.first_user + followee,
+         timestamp(at))
+        for followee, follower, at in zip(
+            followees.tolist(), followers.tolist(), times.tolist()
+        )
+    ]
+    with transaction.atomic():
+        insert(Follow, ('follower_id', 'followee_id', 'created_at'),
+               follows)
+    return Counter({'follows': len(follows)})
+
+
+def seed_posts(plan, start, stop):
+    """
+    Insert the posts ``start`` to ``stop`` with their comments, reactions
+    and shares, and counters matching them.
+    """
+    chunk, size = start // plan.chunk_size, stop - start
+    rng = generator(plan, POST_STREAM, chunk)
+    comment_counts, reaction_counts, share_counts = activity_counts(
+        rng, plan, size
+    )
+    authorship, _, _ = population(plan)
+    authors = pick(rng, authorship, size) + plan.first_user
+    times = post_times(rng, plan, size)
+    post_ids = np.arange(plan.first_post + start, plan.first_post + stop)
+
+    comments = seed_comments(rng, plan, chunk, post_ids, times,
+                             comment_counts)
+    interactions, reaction_rows, interaction_counts = seed_reactions(
+        rng, plan, post_ids, times, reaction_counts
+    )
+    shares = seed_shares(rng, plan, post_ids, times, share_counts)
+
+    titles = words(rng, 2, 8, size)
+    contents = words(rng, 8, 60, size)
+    posts = []
+    for row in zip(post_ids.tolist(), authors.tolist(), titles, contents,
+                   times.tolist(), interaction_counts.tolist(),
+                   comment_counts.tolist(), share_counts.tolist()):
+        pk, author, title, content, at, interacted, commented, shared = row
+        created_at = timestamp(at)
+        posts.append((
+            pk, author, title.capitalize(), content, created_at, created_at,
+            interacted, commented, shared,
+        ))
+    with transaction.atomic():
+        insert(Post, ('id', 'user_id', 'title', 'content', 'created_at',
+                      'updated_at', 'interactions_count', 'comments_count',
+                      'shares_count'), posts)
+        insert(Comment, ('id', 'post_id', 'user_id', 'parent_id', 'path',
+                         'content', 'created_at'), comments)
+        insert(Interaction, ('post_id', 'user_id', 'interaction_type',
+                             'created_at'), interactions)
+        insert(ReactionCount, ('post_id', 'interaction_type', 'count'),
+               reaction_rows)
+        insert(Share, ('post_id', 'user_id', 'shared_with_id',
+                       'created_at'), shares)
+    return Counter({
+        'posts': len(posts), 'comments': len(comments),
+        'interactions': len(interactions), 'shares': len(shares),
+    })
+
+
+def seed_comments(rng, plan, chunk, post_ids, times, counts):
+    """
+    Build the comment rows of a post chunk. Each post's comments are in
+    time order, and a reply always answers an earlier comment of its post.
+    """
+    indices = np.repeat(np.arange(len(post_ids)), counts)
+    total = len(indices)
+    users = rng.integers(0, plan.users, total) + plan.first_user
+    at = activity_times(rng, plan, times[indices])
+    order = np.lexsort((at, indices))
+    replies = (rng.random(total) < REPLY_SHARE).tolist()
+    choices = rng.random(total).tolist()
+    contents = words(rng, 3, 30, total)
+
+    comments, paths, depths = [], [], []
+    pk = plan.first_comments[chunk]
+    thread_start, previous = 0, -1
+    for position, (index, post, user, when) in enumerate(zip(
+        order.tolist(), indices[order].tolist(), users[order].tolist(),
+        at[order].tolist(),
+    )):
+        if post != previous:
+            thread_start, previous = len(comments), post
+        earlier = len(comments) - thread_start
+        parent = None
+        if earlier and replies[position]:
+            parent = thread_start + int(choices[position] * earlier)
+            if depths[parent] >= MAX_DEPTH:
+                parent = None
+        if parent is None:
+            path, depth, parent_id = '', 0, None
+        else:
+            path, depth = paths[parent], depths[parent] + 1
+            parent_id = comments[parent][0]
+        path += str(pk).zfill(PATH_SEGMENT)
+        paths.append(path)
+        depths.append(depth)
+        comments.append((
+            pk, int(post_ids[post]), user, parent_id, path,
+            contents[position].capitalize(), timestamp(when),
+        ))
+        pk += 1
+    return comments
+
+
+def seed_reactions(rng, plan, post_ids, times, counts):
+    """
+    Build the interaction and reaction count rows of a post chunk; return
+    them with the number of interactions per post. A user reacts at most
+    once per post and type.
+    """
+    kinds = list(REACTION_WEIGHTS)
+    weights = np.asarray(list(REACTION_WEIGHTS.values()), dtype=np.float64)
+    indices = np.repeat(np.arange(len(post_ids)), counts)
+    users = rng.integers(0, plan.users, len(indices))
+    types = rng.choice(len(kinds), len(indices), p=weights / weights.sum())
+    at = activity_times(rng, plan, times[indices])
+    # Duplicate (user, post, type) draws collapse into one interaction
+    keys = (indices * plan.users + users) * len(kinds) + types
+    _, first = np.unique(keys, return_index=True)
+    indices, users, types, at = (
+        indices[first], users[first], types[first], at[first]
+    )
+    interactions = [
+        (post, plan.first_user + user, kinds[kind], timestamp(when))
+        for post, user, kind, when in zip(
+            post_ids[indices].tolist(), users.tolist(), types.tolist(),
+            at.tolist()
+        )
+    ]
+    per_type = np.bincount(
+        indices * len(kinds) + types, minlength=len(post_ids) * len(kinds)
+    )
+    reaction_rows = [
+        (int(post_ids[key // len(kinds)]), kinds[key % len(kinds)],
+         int(per_type[key]))
+        for key in np.flatnonzero(per_type).tolist()
+    ]
+    per_post = np.bincount(indices, minlength=len(post_ids))
+    return interactions, reaction_rows, per_post
+
+
+def seed_shares(rng, plan, post_ids, times, counts):
+    """Build the share rows of a post chunk, never to their sender."""
+    indices = np.repeat(np.arange(len(post_ids)), counts)
+    senders = rng.integers(0, plan.users, len(indices))
+    recipients = others(rng, len(indices), plan.users, senders)
+    at = activity_times(rng, plan, times[indices])
+    return [
+        (post, plan.first_user + sender, plan.first_user + recipient,
+         timestamp(when))
+        for post, sender, recipient, when in zip(
+            post_ids[indices].tolist(), senders.tolist(),
+            recipients.tolist(), at.tolist()
+        )
+    ]
+
+
+def copy_text(value):
+    """Format a value for PostgreSQL's ``COPY`` text format."""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace(
+        '\n', '\\n').replace('\r', '\\r')
+
+
+def insert(model, names, rows):
+    """
+    Write ``rows``, tuples of values for the fields (attnames) ``names``,
+    into the table of ``model``: one ``COPY`` on PostgreSQL, batched
+    INSERTs elsewhere. ``save()``, signals and ``auto_now`` stamping are
+    bypassed; other columns get their field's default, and the database
+    assigns the id when it's not given.
+    """
+    if not rows:
+        return
+    given = [model._meta.get_field(name) for name in names]
+    rest = [
+        field for field in model._meta.concrete_fields
+        if field not in given and not field.primary_key
+    ]
+    defaults = tuple(
+        field.get_db_prep_save(field.get_default(), connection)
+        for field in rest
+    )
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    columns = ', '.join(quote(field.column) for field in given + rest)
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            copy(cursor, f"COPY {table} ({columns}) FROM STDIN",
+                 (row + defaults for row in rows))
+        return
+
+    # Drivers take the other values as they are; preparing every value
+    # through its field would cost more than generating it
+    adapt = connection.ops.adapt_datetimefield_value
+    dates = [
+        position for position, field in enumerate(given)
+        if isinstance(field, DateTimeField)
+    ]
+    sql = (
+        f"INSERT INTO {table} ({columns}) "
+        f"VALUES ({', '.join(['%s'] * (len(given) + len(rest)))})"
+    )
+    with connection.cursor() as cursor:
+        for offset in range(0, len(rows), INSERT_BATCH_SIZE):
+            batch = []
+            for row in rows[offset:offset + INSERT_BATCH_SIZE]:
+                row = list(row)
+                for position in dates:
+                    row[position] = adapt(row[position])
+                batch.append(row + list(defaults))
+            cursor.executemany(sql, batch)
+
+
+def copy(cursor, sql, rows):
+    """Stream rows into a ``COPY ... FROM STDIN`` with either driver."""
+    from django.db.backends.postgresql.psycopg_any import is_psycopg3
+
+    if is_psycopg3:
+        with cursor.copy(sql) as stream:
+            for row in rows:
+                stream.write_row(row)
+        return
+    data = io.StringIO()
+    for row in rows:
+        data.write('\t'.join(copy_text(value) for value in row))
+        data.write('\n')
+    data.seek(0)
+    cursor.copy_expert(sql, data)
+
+
+def reset_sequences():
+    """Move the id sequences past the explicitly numbered rows."""
+    statements = connection.ops.sequence_reset_sql(
+        no_style(), [User, Post, Comment]
+    )
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def run_task(task):
+    function, plan, start, stop = task
+    return function(plan, start, stop)
+
+
+def run_tasks(tasks, workers):
+    """
+    Run tasks in ``workers`` processes, or inline for one worker; yield
+    their row counts in task order.
+    """
+    if workers <= 1:
+        for task in tasks:
+            yield run_task(task)
+        return
+    # Workers open their own connections; a shared socket would break
+    connection.close()
+    # Spawned workers set Django up before unpickling any task
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=django.setup,
+        mp_context=multiprocessing.get_context('spawn'),
+    ) as pool:
+        yield from pool.map(run_task, tasks)
+
+
+def seed(plan, workers=1):
+    """
+    Insert the dataset of ``plan`` with ``workers`` processes; yield the
+    row counts of each chunk as it is written.
+    """
+    if connection.vendor == 'sqlite':
+        # SQLite has a single writer, and in-memory databases are private
+        workers = 1
+    user_chunks = chunks(plan.users, plan.chunk_size)
+    yield from run_tasks(
+        [(seed_users, plan, start, stop) for start, stop in user_chunks],
+        workers,
+    )
+    # Everything else only refers to users, which all exist by now
+    yield from run_tasks(
+        [(seed_follows, plan, start, stop) for start, stop in user_chunks]
+        + [
+            (seed_posts, plan, start, stop)
+            for start, stop in chunks(plan.posts, plan.chunk_size)
+        ],
+        workers,
+    )
+    reset_sequences()
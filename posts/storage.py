@@ -0,0 +1,129 @@
+"""
+Content-addressed media storage.
+
+Files are named after the SHA-256 of their content, so uploading the same
+image again (a reposted meme, a re-rendered variant) stores nothing new.
+The upload's name only contributes its directory and extension:
+``post_images/photo.JPG`` becomes ``post_images/ab/cd/abcd....jpg``.
+
+Each name is counted in ``MediaFile``: ``save`` adds a reference and
+``delete`` drops one, removing the file once nothing refers to it. Deleting
+a post or a variant releases its files (see ``release_files``), so shared
+content stays as long as one owner does. Since content never changes under
+a name, files can be served with strong ETags and cached forever.
+"""
+import hashlib
+import os
+import re
+import tempfile
+from pathlib import PurePosixPath
+
+from django.core.files import File
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F, FileField
+from .models import MediaFile
+
+CONTENT_NAME = re.compile(r'^(?P<digest>[0-9a-f]{64})(\.[0-9a-z]+)?$')
+
+
+def content_digest(name):
+    """Return the hash in a content-addressed ``name``, or ``None``."""
+    match = CONTENT_NAME.match(PurePosixPath(name).name)
+    return match and match['digest']
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """File system storage naming and counting files by content."""
+
+    def content_name(self, name, content):
+        """Return the name ``content`` is stored under."""
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        digest = digest.hexdigest()
+        path = PurePosixPath(name.replace('\\', '/'))
+        directory = path.parent / digest[:2] / digest[2:4]
+        return str(directory / f'{digest}{path.suffix.lower()}')
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.content_name(name, content)
+
+        with transaction.atomic():
+            stored, created = MediaFile.objects.select_for_update(
+            ).get_or_create(name=name, defaults={'size': content.size})
+            if not created:
+                MediaFile.objects.filter(pk=stored.pk).update(
+                    references=F('references') + 1
+                )
+            # Rewriting is harmless (same content) and repairs a file lost
+            # after its row was written
+            if created or not self.exists(name):
+                self._write(name, content)
+        return name
+
+    def _write(self, name, content):
+        """Write ``content`` to ``name`` atomically."""
+        full_path = self.path(name)
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        if hasattr(content, 'temporary_file_path'):
+            # Streamed uploads are already on disk; move them into place
+            file_move_safe(
+                content.temporary_file_path(), full_path,
+                allow_overwrite=True,
+            )
+        else:
+            fd, partial = tempfile.mkstemp(dir=directory, prefix='.partial-')
+            try:
+                with os.fdopen(fd, 'wb') as output:
+                    for chunk in content.chunks():
+                        output.write(chunk)
+                os.replace(partial, full_path)
+            except BaseException:
+                os.unlink(partial)
+                raise
+        if self.file_permissions_mode is not None:
+            os.chmod(full_path, self.file_permissions_mode)
+
+    def delete(self, name):
+        """Drop one reference to ``name``; delete the file at zero."""
+        if not name:
+            raise ValueError("The name must be given to delete().")
+        with transaction.atomic():
+            stored = MediaFile.objects.select_for_update().filter(
+                name=name
+            ).first()
+            if stored is not None and stored.references > 1:
+                MediaFile.objects.filter(pk=stored.pk).update(
+                    references=F('references') - 1
+                )
+                return
+            if stored is not None:
+                stored.delete()
+        # Files saved before this storage have no row and one owner
+        transaction.on_commit(lambda: self._delete_unreferenced(name))
+
+    def _delete_unreferenced(self, name):
+        if not MediaFile.objects.filter(name=name).exists():
+            super().delete(name)
+
+
+def release_files(sender, instance, **kwargs):
+    """
+    ``post_delete`` receiver dropping the references held by the file
+    fields of a deleted row, once the deletion commits.
+    """
+    for field in sender._meta.concrete_fields:
+        if isinstance(field, FileField):
+            file = getattr(instance, field.attname)
+            if file:
+                storage, name = file.storage, file.name
+                transaction.on_commit(
+                    lambda storage=storage, name=name: storage.delete(name)
+                )
@@ -0,0 +1,97 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from graphql_jwt.shortcuts import get_token
+from ..models import Post, Comment, Share
+
+User = get_user_model()
+
+
+class BatchMutationTest(TestCase):
+    """
+    Test the batched comment and share mutations.
+    """
+
+    def setUp(self):
+        """
+        Create two users and two posts.
+        """
+        self.user = User.objects.create_user(
+            username='testuser', password='testpass'
+        )
+        self.friend = User.objects.create_user(
+            username='friend', password='testpass'
+        )
+        self.posts = [
+            Post.objects.create(user=self.user, title=f'{i}', content='c')
+            for i in range(2)
+        ]
+
+    def execute(self, query, items):
+        """Send a batch as the test user and return the data."""
+        body = self.client.post(
+            '/graphql/',
+            json.dumps({'query': query, 'variables': {'items': items}}),
+            content_type='application/json',
+            HTTP_AUTHORIZATION=f'JWT {get_token(self.user)}'
+        ).json()
+        self.assertNotIn('errors', body)
+        return body['data']
+
+    def test_create_comments(self):
+        """
+        Test that a batch of comments and replies is created with paths.
+        """
+        first, second = self.posts
+        parent = Comment.objects.create(
+            post=first, user=self.user, content='parent'
+        )
+        data = self.execute('''
+            mutation Add($items: [CommentInput!]!) {
+                Post_Comments_Add(items: $items) {
+                    results { success error comment { id depth } }
+                }
+            }''', [
+            {'postId': first.id, 'content': 'a', 'parentId': parent.id},
+            {'postId': second.id, 'content': 'b'},
+            {'postId': second.id, 'content': 'c', 'parentId': parent.id},
+        ])
+        results = data['Post_Comments_Add']['results']
+        self.assertEqual([r['success'] for r in results], [True, True, False])
+        self.assertEqual(results[0]['comment']['depth'], 1)
+        self.assertEqual(results[2]['error'], 'Parent comment not found.')
+
+        reply = Comment.objects.get(pk=results[0]['comment']['id'])
+        self.assertTrue(reply.path.startswith(parent.path))
+        second.refresh_from_db()
+        self.assertEqual(second.comments_count, 1)
+
+    def test_share_posts(self):
+        """
+        Test that a batch of shares skips duplicates and unknown users.
+        """
+        first, second = self.posts
+        Share.objects.create(post=first, user=self.user,
+                             shared_with=self.friend)
+        data = self.execute('''
+            mutation Share($items: [ShareInput!]!) {
+                Post_Shares_Add(items: $items) {
+                    results { success error }
+                }
+            }''', [
+            {'postId': first.id, 'username': 'friend'},
+            {'postId': second.id, 'username': 'friend'},
+            {'postId': second.id, 'username': 'friend'},
+            {'postId': second.id, 'username': 'nobody'},
+        ])
+        results = data['Post_Shares_Add']['results']
+        self.assertEqual(
+            [r['success'] for r in results], [False, True, False, False]
+        )
+        self.assertEqual(
+            results[3]['error'], 'User with entered username is not found.'
+        )
+        second.refresh_from_db()
+        self.assertEqual(second.shares_count, 1)
+        self.assertEqual(Share.objects.count(), 2)
@@ -0,0 +1,221 @@
+import json
+import random
+import threading
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections, connection
+from django.test import (
+    Client, TestCase, TransactionTestCase, override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from graphql_jwt.shortcuts import get_token
+from interactions.models import Interaction, ReactionCount
+from interactions.reactions import set_reaction
+from ..counters import add_count, counter_buffer
+from ..models import Post
+
+User = get_user_model()
+
+THREADS = 8
+PER_THREAD = 250
+
+# Reactions thrown at the posts by the mutation stress test: few enough
+# users and types that threads keep colliding on the same rows
+REACTORS = 3
+REACTIONS = ('LOVE', 'WOW')
+MUTATIONS_PER_THREAD = 40
+
+
+class CounterStressTest(TransactionTestCase):
+    """
+    Test that concurrent counter deltas are never lost.
+    """
+
+    def setUp(self):
+        """
+        Create the posts the threads fight over.
+        """
+        self.user = User.objects.create_user(
+            username='testuser', password='testpass'
+        )
+        self.posts = [
+            Post.objects.create(user=self.user, title=f'{i}', content='c')
+            for i in range(4)
+        ]
+
+    def hammer(self):
+        """Fire THREADS * PER_THREAD reactions spread over the posts."""
+        errors = []
+
+        def worker(offset):
+            try:
+                for i in range(PER_THREAD):
+                    post = self.posts[(offset + i) % len(self.posts)]
+                    add_count(post.id, 'interactions_count')
+            except Exception as e:
+                errors.append(e)
+            finally:
+                close_old_connections()
+
+        threads = [
+            threading.Thread(target=worker, args=(n,))
+            for n in range(THREADS)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def total(self):
+        return sum(Post.objects.values_list('interactions_count', flat=True))
+
+    def test_immediate_counts_are_exact(self):
+        """
+        Test that concurrent F() updates add up to the number of calls.
+        """
+        self.hammer()
+        self.assertEqual(self.total(), THREADS * PER_THREAD)
+
+    @override_settings(COUNTERS={'MODE': 'buffered', 'FLUSH_SIZE': 3})
+    def test_buffered_counts_are_exact_after_flush(self):
+        """
+        Test that buffered deltas add up once the buffer is flushed.
+        """
+        self.hammer()
+        counter_buffer.flush()
+        self.assertEqual(self.total(), THREADS * PER_THREAD)
+
+    def react(self):
+        """
+        Add, remove and set reactions from THREADS threads, two per user,
+        through the mutations and ``set_reaction``.
+        """
+        users = [self.user] + [
+            User.objects.create_user(username=f'fan{i}', password='p')
+            for i in range(1, REACTORS)
+        ]
+        errors, succeeded = [], []
+
+        def worker(n):
+            user = users[n % len(users)]
+            client = Client(HTTP_AUTHORIZATION=f'JWT {get_token(user)}')
+            choice = random.Random(n).choice
+            try:
+                for _ in range(MUTATIONS_PER_THREAD):
+                    post = choice(self.posts[:2])
+                    reaction = choice(REACTIONS)
+                    action = choice(('Add', 'Remove', 'Set'))
+                    if action == 'Set':
+                        set_reaction(
+                            user, post.id, choice((reaction.lower(), None))
+                        )
+                        succeeded.append(action)
+                        continue
+                    body = client.post(
+                        '/graphql/',
+                        json.dumps({'query': (
+                            f'mutation {{ Post_Interaction_{action}('
+                            f'postId: {post.id}, interactionType: '
+                            f'{reaction}) {{ success }} }}'
+                        )}),
+                        content_type='application/json',
+                    ).json()
+                    if 'errors' in body:
+                        errors.append(body['errors'])
+                    elif body['data'][f'Post_Interaction_{action}'][
+                        'success'
+                    ]:
+                        succeeded.append(action)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                close_old_connections()
+
+        threads = [
+            threading.Thread(target=worker, args=(n,))
+            for n in range(THREADS)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if connection.vendor == 'sqlite':
+            # The shared in-memory test database fails writers that collide
+            # instead of waiting; the counters must still match the rows
+            errors = [e for e in errors if 'is locked' not in str(e)]
+        self.assertEqual(errors, [])
+        self.assertTrue(set(succeeded) >= {'Add', 'Remove', 'Set'})
+
+    def assertCountersMatchRows(self):
+        """Assert the post and reaction counters count the reactions."""
+        rows = Counter(
+            Interaction.objects.values_list('post_id', 'interaction_type')
+        )
+        for post in Post.objects.all():
+            with self.subTest(post=post.title):
+                self.assertEqual(
+                    post.interactions_count,
+                    sum(n for (pk, _), n in rows.items() if pk == post.id),
+                )
+        self.assertEqual(
+            {
+                (c.post_id, c.interaction_type): c.count
+                for c in ReactionCount.objects.exclude(count=0)
+            },
+            dict(rows),
+        )
+
+    def test_concurrent_reactions_match_rows(self):
+        """
+        Test that racing reaction mutations leave counters equal to the
+        reactions actually stored.
+        """
+        self.react()
+        self.assertCountersMatchRows()
+
+    @override_settings(COUNTERS={'MODE': 'buffered', 'FLUSH_SIZE': 3})
+    def test_buffered_concurrent_reactions_match_rows(self):
+        """
+        Test that racing reaction mutations in buffered mode leave counters
+        equal to the stored reactions once the buffer is flushed.
+        """
+        self.react()
+        counter_buffer.flush()
+        self.assertCountersMatchRows()
+
+
+class UpdatePostCountersTest(TestCase):
+    """
+    Test that editing a post leaves its counters alone.
+    """
+
+    def test_update_writes_only_edited_columns(self):
+        """
+        Test that PostUpdate doesn't write back the counters it loaded.
+        """
+        user = User.objects.create_user(
+            username='testuser', password='testpass'
+        )
+        post = Post.objects.create(user=user, title='old', content='c')
+        with CaptureQueriesContext(connection) as queries:
+            body = self.client.post(
+                '/graphql/',
+                json.dumps({
+                    'query': 'mutation($id: ID!) { PostUpdate(postId: $id, '
+                             'title: "new", content: "c") { success } }',
+                    'variables': {'id': post.id},
+                }),
+                content_type='application/json',
+                HTTP_AUTHORIZATION=f'JWT {get_token(user)}'
+            ).json()
+        self.assertTrue(body['data']['PostUpdate']['success'])
+        updates = [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith('UPDATE "posts_post"')
+        ]
+        self.assertEqual(len(updates), 1)
+        self.assertNotIn('_count', updates[0])
+        post.refresh_from_db()
+        self.assertEqual(post.title, 'new')
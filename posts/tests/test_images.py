@@ -0,0 +1,198 @@
+import io
+import json
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from graphql_jwt.shortcuts import get_token
+from PIL import Image
+from ..images import process_post_image, render
+from ..imaging import ORIENTATION, render_variants
+from ..models import ImageVariant, MediaFile, Post
+
+User = get_user_model()
+
+SIZES = {'thumbnail': 40, 'medium': 120, 'large': 400}
+QUALITY = {'webp': 80, 'jpeg': 85}
+
+CREATE_POST = """
+    mutation Create($image: Upload) {
+        PostCreate(title: "Photo", content: "c", image: $image) {
+            success post { id imageStatus }
+        }
+    }
+"""
+
+IMAGE_QUERY = """
+    query Image($id: ID!) {
+        post(id: $id) {
+            imageStatus imageWidth imageHeight
+            imageVariants(format: JPEG) { size width height }
+            imageVariant(size: "thumbnail") { format width url }
+        }
+    }
+"""
+
+
+def jpeg_bytes(width=300, height=200, orientation=None):
+    """Return a JPEG with EXIF data, optionally with an orientation."""
+    image = Image.new('RGB', (width, height), (200, 30, 30))
+    exif = Image.Exif()
+    exif[0x010F] = 'Camera maker'
+    if orientation is not None:
+        exif[ORIENTATION] = orientation
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', exif=exif)
+    return buffer.getvalue()
+
+
+class RenderVariantsTest(TestCase):
+    """
+    Test the Pillow side of the image pipeline.
+    """
+
+    def render(self, content):
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as source:
+            source.write(content)
+            source.flush()
+            return render_variants(
+                source.name, SIZES, ('webp', 'jpeg'), QUALITY
+            )
+
+    def test_variants_are_resized_without_metadata(self):
+        """
+        Test that every size is rendered in every format, never upscaled,
+        and without EXIF data.
+        """
+        width, height, variants = self.render(jpeg_bytes())
+        self.assertEqual((width, height), (300, 200))
+        dimensions = {
+            (v['size'], v['format']): (v['width'], v['height'])
+            for v in variants
+        }
+        self.assertEqual(dimensions[('thumbnail', 'webp')], (40, 27))
+        self.assertEqual(dimensions[('medium', 'jpeg')], (120, 80))
+        # The source is smaller than the large size
+        self.assertEqual(dimensions[('large', 'webp')], (300, 200))
+        for variant in variants:
+            with Image.open(io.BytesIO(variant['content'])) as image:
+                self.assertEqual(image.format, variant['format'].upper())
+                self.assertEqual(len(image.getexif()), 0)
+
+    def test_exif_orientation_is_applied(self):
+        """
+        Test that a rotated photo is stored upright.
+        """
+        width, height, variants = self.render(jpeg_bytes(orientation=6))
+        self.assertEqual((width, height), (200, 300))
+        medium = next(v for v in variants if v['size'] == 'medium')
+        self.assertEqual((medium['width'], medium['height']), (80, 120))
+
+    @override_settings(POST_IMAGES={'SIZES': SIZES, 'PROCESSES': 1})
+    def test_process_pool(self):
+        """
+        Test that variants are rendered by a worker process.
+        """
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as source:
+            source.write(jpeg_bytes())
+            source.flush()
+            width, _, variants = render(source.name)
+        self.assertEqual(width, 300)
+        self.assertEqual(len(variants), 6)
+
+
+class PostImageTest(TestCase):
+    """
+    Test processing of images uploaded with a post.
+    """
+
+    def setUp(self):
+        """
+        Store media in a temporary directory and run jobs inline.
+        """
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        settings = override_settings(
+            MEDIA_ROOT=media,
+            BACKGROUND_TASKS_EAGER=True,
+            POST_IMAGES={'SIZES': SIZES, 'PROCESSES': 0},
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.user = User.objects.create_user(
+            username='testuser', password='testpass'
+        )
+
+    def upload(self, content, name='photo.jpg'):
+        """Create a post with ``content`` as its image."""
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                '/graphql/',
+                {
+                    'operations': json.dumps({
+                        'query': CREATE_POST, 'variables': {'image': None}
+                    }),
+                    'map': json.dumps({'0': ['variables.image']}),
+                    '0': SimpleUploadedFile(name, content, 'image/jpeg'),
+                },
+                HTTP_AUTHORIZATION=f'JWT {get_token(self.user)}',
+            )
+        return response.json()['data']['PostCreate']
+
+    def query(self, post_id):
+        return self.client.post(
+            '/graphql/',
+            json.dumps({'query': IMAGE_QUERY, 'variables': {'id': post_id}}),
+            content_type='application/json',
+        ).json()['data']['post']
+
+    def test_upload_is_processed_after_commit(self):
+        """
+        Test that the mutation answers before processing and the variants
+        are exposed once the job ran.
+        """
+        result = self.upload(jpeg_bytes())
+        self.assertTrue(result['success'])
+        self.assertEqual(result['post']['imageStatus'], 'PENDING')
+
+        post = self.query(result['post']['id'])
+        self.assertEqual(post['imageStatus'], 'READY')
+        self.assertEqual((post['imageWidth'], post['imageHeight']),
+                         (300, 200))
+        self.assertEqual(
+            [v['size'] for v in post['imageVariants']],
+            ['thumbnail', 'medium', 'large'],
+        )
+        thumbnail = post['imageVariant']
+        self.assertEqual(thumbnail['format'], 'webp')
+        self.assertEqual(thumbnail['width'], 40)
+        self.assertTrue(thumbnail['url'].endswith('.webp'))
+
+    def test_reprocessing_replaces_variants(self):
+        """
+        Test that processing an image again leaves one set of variants,
+        each file referenced once.
+        """
+        result = self.upload(jpeg_bytes())
+        post_id = int(result['post']['id'])
+        with self.captureOnCommitCallbacks(execute=True):
+            process_post_image(post_id)
+        variants = ImageVariant.objects.filter(post_id=post_id)
+        self.assertEqual(variants.count(), 6)
+        for variant in variants:
+            self.assertTrue(variant.file.storage.exists(variant.file.name))
+            self.assertEqual(
+                MediaFile.objects.get(name=variant.file.name).references, 1
+            )
+
+    def test_undecodable_image_fails(self):
+        """
+        Test that a file Pillow can't read marks the post as failed.
+        """
+        with self.assertLogs('posts.images', 'ERROR'):
+            result = self.upload(b'not an image')
+        post = Post.objects.get(pk=result['post']['id'])
+        self.assertEqual(post.image_status, Post.IMAGE_FAILED)
+        self.assertFalse(post.image_variants.exists())
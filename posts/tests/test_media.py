@@ -0,0 +1,151 @@
+import hashlib
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from ..models import MediaFile, Post
+
+User = get_user_model()
+
+CONTENT = b'0123456789' * 10
+
+
+class MediaTestCase(TestCase):
+    """
+    Store media in a temporary directory.
+    """
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        settings = override_settings(MEDIA_ROOT=media)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+
+class ContentAddressedStorageTest(MediaTestCase):
+    """
+    Test the deduplicating, reference counted media storage.
+    """
+
+    def test_identical_content_is_stored_once(self):
+        """
+        Test that saving the same bytes twice returns the same hashed name.
+        """
+        first = default_storage.save('post_images/a.JPG', ContentFile(CONTENT))
+        second = default_storage.save('post_images/b.jpg',
+                                      ContentFile(CONTENT))
+        digest = hashlib.sha256(CONTENT).hexdigest()
+        self.assertEqual(
+            first, f'post_images/{digest[:2]}/{digest[2:4]}/{digest}.jpg'
+        )
+        self.assertEqual(first, second)
+        self.assertEqual(MediaFile.objects.get(name=first).references, 2)
+
+    def test_file_is_deleted_with_its_last_reference(self):
+        """
+        Test that a shared file survives until every owner deleted it.
+        """
+        user = User.objects.create_user(username='u', password='p')
+        posts = [
+            Post.objects.create(
+                user=user, title='meme', content='c',
+                image=SimpleUploadedFile('meme.png', CONTENT),
+            )
+            for _ in range(2)
+        ]
+        name = posts[0].image.name
+        self.assertEqual(posts[1].image.name, name)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            posts[0].delete()
+        self.assertTrue(default_storage.exists(name))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            posts[1].delete()
+        self.assertFalse(default_storage.exists(name))
+        self.assertFalse(MediaFile.objects.filter(name=name).exists())
+
+
+class ServeMediaTest(MediaTestCase):
+    """
+    Test the media view.
+    """
+
+    def setUp(self):
+        """
+        Store one content-addressed file.
+        """
+        super().setUp()
+        self.name = default_storage.save(
+            'post_images/file.txt', ContentFile(CONTENT)
+        )
+        self.url = f'/media/{self.name}'
+        self.etag = f'"{hashlib.sha256(CONTENT).hexdigest()}"'
+
+    def test_whole_file_is_cacheable_forever(self):
+        """
+        Test the ETag and cache headers of a content-addressed file.
+        """
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), CONTENT)
+        self.assertEqual(response['ETag'], self.etag)
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+    def test_not_modified(self):
+        """
+        Test that a matching If-None-Match gets an empty 304.
+        """
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=self.etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], self.etag)
+
+    def test_byte_ranges(self):
+        """
+        Test single, suffix and unsatisfiable ranges.
+        """
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-14')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), b'01234')
+        self.assertEqual(response['Content-Range'], 'bytes 10-14/100')
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-3')
+        self.assertEqual(b''.join(response.streaming_content), b'789')
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=100-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */100')
+
+    def test_stale_if_range_gets_whole_file(self):
+        """
+        Test that a range is ignored when If-Range doesn't match.
+        """
+        response = self.client.get(
+            self.url, HTTP_RANGE='bytes=0-1', HTTP_IF_RANGE='"other"'
+        )
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(MEDIA_SERVING={'BACKEND': 'x-accel-redirect'})
+    def test_accel_redirect(self):
+        """
+        Test that nginx is told which file to send.
+        """
+        response = self.client.get(self.url)
+        self.assertEqual(
+            response['X-Accel-Redirect'], f'/protected-media/{self.name}'
+        )
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], self.etag)
+
+    def test_outside_media_root(self):
+        """
+        Test that paths escaping MEDIA_ROOT are not served.
+        """
+        response = self.client.get('/media/../manage.py')
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,115 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from interactions.models import Interaction, ReactionCount
+from ..counters import reconcile
+from ..models import Post, Comment, Share
+
+User = get_user_model()
+
+
+class ReconcileCountersTest(TestCase):
+    """
+    Test that drifted post counters are recomputed from the source rows.
+    """
+
+    def setUp(self):
+        """
+        Create posts with activity and corrupt their counters.
+        """
+        self.user = User.objects.create_user(
+            username='testuser', password='testpass'
+        )
+        self.friend = User.objects.create_user(
+            username='friend', password='testpass'
+        )
+        self.posts = [
+            Post.objects.create(user=self.user, title=f'{i}', content='c')
+            for i in range(5)
+        ]
+        first, second = self.posts[:2]
+        Interaction.objects.create(
+            user=self.friend, post=first, interaction_type='love'
+        )
+        Interaction.objects.create(
+            user=self.friend, post=first, interaction_type='wow'
+        )
+        Comment.objects.create(post=first, user=self.friend, content='c')
+        Share.objects.create(
+            post=second, user=self.user, shared_with=self.friend
+        )
+        Post.objects.filter(pk=self.posts[4].pk).update(comments_count=7)
+
+    def counts(self, post):
+        post.refresh_from_db()
+        return (
+            post.interactions_count, post.comments_count, post.shares_count
+        )
+
+    def test_full_pass_fixes_every_post(self):
+        """
+        Test that a chunked full pass writes exactly the stale rows.
+        """
+        result = reconcile(chunk_size=2)
+        self.assertEqual(result.checked, 5)
+        self.assertEqual(result.fixed, 3)
+        self.assertTrue(result.complete)
+        self.assertEqual(self.counts(self.posts[0]), (2, 1, 0))
+        self.assertEqual(self.counts(self.posts[1]), (0, 0, 1))
+        self.assertEqual(self.counts(self.posts[4]), (0, 0, 0))
+        self.assertEqual(reconcile().fixed, 0)
+
+    def test_since_only_checks_recent_activity(self):
+        """
+        Test that --since skips posts without recent activity.
+        """
+        Post.objects.update(created_at=timezone.now() - timedelta(days=2))
+        Interaction.objects.update(
+            created_at=timezone.now() - timedelta(days=2)
+        )
+        out = StringIO()
+        call_command(
+            'reconcile_counters',
+            since=timezone.now() - timedelta(hours=1), stdout=out,
+        )
+        self.assertIn('Checked 2 posts, fixed 2.', out.getvalue())
+        self.assertEqual(self.counts(self.posts[0]), (2, 1, 0))
+        self.assertEqual(self.counts(self.posts[4]), (0, 7, 0))
+
+    def test_time_limit_reports_resume_point(self):
+        """
+        Test that a pass out of time can be resumed where it stopped.
+        """
+        first = reconcile(chunk_size=2, time_limit=0)
+        self.assertFalse(first.complete)
+        self.assertEqual(first.checked, 2)
+        rest = reconcile(after=first.last_id)
+        self.assertEqual(rest.checked, 3)
+        self.assertEqual(first.fixed + rest.fixed, 3)
+
+    def test_reaction_counters_are_recomputed(self):
+        """
+        Test that missing and drifted reaction counters are rewritten,
+        including after a user's reactions are deleted with the user.
+        """
+        first = self.posts[0]
+        result = reconcile()
+        self.assertEqual(result.reactions, 2)
+        self.assertEqual(
+            dict(ReactionCount.objects.filter(post=first).values_list(
+                'interaction_type', 'count')),
+            {'love': 1, 'wow': 1},
+        )
+
+        self.friend.delete()
+        out = StringIO()
+        call_command('reconcile_counters', stdout=out)
+        self.assertIn('Fixed 2 reaction counters.', out.getvalue())
+        self.assertFalse(
+            ReactionCount.objects.filter(count__gt=0).exists()
+        )
+        self.assertEqual(reconcile().reactions, 0)
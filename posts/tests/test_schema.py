@@ -0,0 +1,175 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from interactions.models import Interaction
+from ..models import Post, Comment, Share
+
+User = get_user_model()
+
+FEED_QUERY = """
+    query Feed($first: Int) {
+        allPosts(first: $first) {
+            id
+            user { username }
+            comments { content user { username } post { id } }
+            interactions { interactionType user { username } }
+            shares { user { username } sharedWith { username } }
+        }
+    }
+"""
+
+
+class FeedQueryCountTest(TestCase):
+    """
+    Test that nested feed queries are batched per field, not per row.
+    """
+
+    def setUp(self):
+        """
+        Create posts, each with comments, reactions and shares by
+        distinct users.
+        """
+        self.users = [
+            User.objects.create_user(username=f'user{i}', password='pass')
+            for i in range(4)
+        ]
+        for i in range(20):
+            post = Post.objects.create(
+                user=self.users[i % 4], title=f'Post {i}',
+                content='content'
+            )
+            for j, user in enumerate(self.users):
+                Comment.objects.create(
+                    post=post, user=user, content=f'comment {j}'
+                )
+            Interaction.objects.create(
+                user=self.users[0], post=post, interaction_type='love'
+            )
+            Share.objects.create(
+                post=post, user=self.users[1], shared_with=self.users[2]
+            )
+
+    def run_feed(self, first):
+        """Execute the feed query and return (data, number of queries)."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                '/graphql/',
+                json.dumps({'query': FEED_QUERY,
+                            'variables': {'first': first}}),
+                content_type='application/json'
+            )
+        body = response.json()
+        self.assertNotIn('errors', body)
+        return body['data'], len(queries)
+
+    def test_query_count_independent_of_page_size(self):
+        """
+        Test that a page of 20 posts costs as many queries as a page of 2.
+        """
+        small, small_count = self.run_feed(2)
+        large, large_count = self.run_feed(20)
+        self.assertEqual(len(small['allPosts']), 2)
+        self.assertEqual(len(large['allPosts']), 20)
+        self.assertEqual(small_count, large_count)
+
+    def test_batched_results_match_relations(self):
+        """
+        Test that batched relations are attached to the right parents.
+        """
+        data, _ = self.run_feed(20)
+        for item in data['allPosts']:
+            post = Post.objects.get(id=item['id'])
+            self.assertEqual(item['user']['username'], post.user.username)
+            self.assertEqual(len(item['comments']), 4)
+            for comment in item['comments']:
+                self.assertEqual(comment['post']['id'], item['id'])
+            self.assertEqual(
+                item['shares'][0]['sharedWith']['username'], 'user2'
+            )
+
+
+CONNECTION_QUERY = """
+    query Page($first: Int, $after: String, $last: Int, $before: String) {
+        postsConnection(first: $first, after: $after,
+                        last: $last, before: $before) {
+            edges { cursor node { id } }
+            pageInfo {
+                hasNextPage hasPreviousPage startCursor endCursor
+            }
+        }
+    }
+"""
+
+
+class PostsConnectionTest(TestCase):
+    """
+    Test keyset pagination over posts ordered by (-created_at, -id).
+    """
+
+    def setUp(self):
+        """
+        Create posts where several share the same created_at timestamp.
+        """
+        user = User.objects.create_user(username='author', password='pass')
+        self.posts = [
+            Post.objects.create(user=user, title=f'Post {i}', content='c')
+            for i in range(7)
+        ]
+        stamp = self.posts[0].created_at
+        Post.objects.filter(
+            id__in=[p.id for p in self.posts[:4]]
+        ).update(created_at=stamp)
+        self.expected = [
+            str(pk) for pk in Post.objects.values_list('id', flat=True)
+        ]
+
+    def page(self, **variables):
+        """Execute the connection query and return the connection."""
+        response = self.client.post(
+            '/graphql/',
+            json.dumps({'query': CONNECTION_QUERY, 'variables': variables}),
+            content_type='application/json'
+        )
+        body = response.json()
+        self.assertNotIn('errors', body)
+        return body['data']['postsConnection']
+
+    def test_forward_pages_cover_every_post_once(self):
+        """
+        Test that walking forward visits every post in feed order.
+        """
+        seen, after = [], None
+        while True:
+            page = self.page(first=3, after=after)
+            seen += [edge['node']['id'] for edge in page['edges']]
+            if not page['pageInfo']['hasNextPage']:
+                break
+            after = page['pageInfo']['endCursor']
+        self.assertEqual(seen, self.expected)
+
+    def test_backward_page_before_cursor(self):
+        """
+        Test that last/before returns the posts just before the cursor.
+        """
+        first_page = self.page(first=5)
+        page = self.page(last=2, before=first_page['pageInfo']['endCursor'])
+        ids = [edge['node']['id'] for edge in page['edges']]
+        self.assertEqual(ids, self.expected[2:4])
+        self.assertTrue(page['pageInfo']['hasPreviousPage'])
+        self.assertTrue(page['pageInfo']['hasNextPage'])
+
+    def test_all_posts_after_follows_feed_order(self):
+        """
+        Test that allPosts(after: id) continues after that post.
+        """
+        response = self.client.post(
+            '/graphql/',
+            json.dumps({'query': '{ allPosts(first: 3, after: "%s") { id } }'
+                        % self.expected[1]}),
+            content_type='application/json'
+        )
+        ids = [p['id'] for p in response.json()['data']['allPosts']]
+        self.assertEqual(ids, self.expected[2:5])
@@ -0,0 +1,89 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from ..models import Post
+from ..search import search_posts
+
+User = get_user_model()
+
+SEARCH_QUERY = """
+    query Search($query: String!, $first: Int, $after: String) {
+        searchPosts(query: $query, first: $first, after: $after) {
+            edges { node { id title } }
+            pageInfo { hasNextPage endCursor }
+        }
+    }
+"""
+
+
+class SearchPostsTest(TestCase):
+    """
+    Test full-text search over post titles and content.
+    """
+
+    def setUp(self):
+        """
+        Create posts with and without the search term.
+        """
+        self.user = User.objects.create_user(
+            username='testuser', password='testpass'
+        )
+        self.in_title = Post.objects.create(
+            user=self.user, title='Gardening tips',
+            content='Water the tomatoes every morning.'
+        )
+        self.in_content = Post.objects.create(
+            user=self.user, title='Weekend',
+            content='Spent the weekend gardening with friends.'
+        )
+        self.unrelated = Post.objects.create(
+            user=self.user, title='Cooking', content='Pasta recipes.'
+        )
+
+    def test_search_ranks_title_matches_first(self):
+        """
+        Test that matching posts are returned, best match first.
+        """
+        results = search_posts('gardening', 10)
+        self.assertEqual(
+            [post.id for post in results],
+            [self.in_title.id, self.in_content.id]
+        )
+
+    def test_index_follows_updates_and_deletes(self):
+        """
+        Test that the search index is kept current on save and delete.
+        """
+        self.unrelated.content = 'Gardening on a balcony.'
+        self.unrelated.save()
+        self.in_content.delete()
+        ids = {post.id for post in search_posts('gardening', 10)}
+        self.assertEqual(ids, {self.in_title.id, self.unrelated.id})
+
+    def test_search_syntax_is_not_interpreted(self):
+        """
+        Test that punctuation in user input does not break the query.
+        """
+        results = search_posts('"gardening" (tips*', 10)
+        self.assertEqual([post.id for post in results], [self.in_title.id])
+
+    def test_search_posts_field_paginates(self):
+        """
+        Test that searchPosts pages through results with cursors.
+        """
+        titles, after = [], None
+        while True:
+            response = self.client.post(
+                '/graphql/',
+                json.dumps({'query': SEARCH_QUERY, 'variables': {
+                    'query': 'gardening', 'first': 1, 'after': after
+                }}),
+                content_type='application/json'
+            )
+            page = response.json()['data']['searchPosts']
+            titles += [edge['node']['title'] for edge in page['edges']]
+            if not page['pageInfo']['hasNextPage']:
+                break
+            after = page['pageInfo']['endCursor']
+        self.assertEqual(titles, ['Gardening tips', 'Weekend'])
@@ -0,0 +1,113 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db.models import Count, F
+from django.test import TestCase
+from interactions.models import Interaction, ReactionCount
+from users.models import Follow
+from ..counters import reconcile
+from ..models import Comment, Post, Share
+from ..seeding import make_plan, seed
+
+User = get_user_model()
+
+
+class SeedFeedTest(TestCase):
+    """
+    Test the synthetic feed seeding for load tests.
+    """
+
+    def setUp(self):
+        """
+        Seed a small feed in several chunks, after an existing post.
+        """
+        user = User.objects.create_user(
+            username='testuser', password='testpass'
+        )
+        self.existing = Post.objects.create(
+            user=user, title='Existing', content='c'
+        )
+        self.out = StringIO()
+        call_command(
+            'seed_feed', users=60, posts=200, followers=5, comments=4,
+            reactions=8, shares=1, chunk_size=50, stdout=self.out,
+        )
+
+    def test_rows_are_created(self):
+        """
+        Test that every kind of row is seeded and reported.
+        """
+        self.assertEqual(User.objects.count(), 61)
+        self.assertEqual(Post.objects.count(), 201)
+        for model in (Follow, Comment, Interaction, Share):
+            with self.subTest(model=model.__name__):
+                self.assertTrue(model.objects.exists())
+        self.assertIn('60 users', self.out.getvalue())
+        self.assertIn('200 posts', self.out.getvalue())
+        seeded = User.objects.get(username='seed2')
+        self.assertTrue(seeded.check_password('password'))
+        self.assertTrue(seeded.is_active)
+
+    def test_counters_are_consistent(self):
+        """
+        Test that the denormalized counters match the seeded rows.
+        """
+        self.assertEqual(reconcile().fixed, 0)
+        self.assertFalse(
+            Follow.objects.filter(follower=F('followee')).exists()
+        )
+        followers = dict(
+            Follow.objects.values('followee').annotate(
+                total=Count('*')).values_list('followee', 'total')
+        )
+        for pk, count in User.objects.values_list('pk', 'followers_count'):
+            self.assertEqual(count, followers.get(pk, 0))
+        reactions = {
+            (row['post'], row['interaction_type']): row['total']
+            for row in Interaction.objects.values(
+                'post', 'interaction_type').annotate(total=Count('*'))
+        }
+        self.assertEqual(
+            {
+                (row.post_id, row.interaction_type): row.count
+                for row in ReactionCount.objects.all()
+            },
+            reactions,
+        )
+
+    def test_comment_threads(self):
+        """
+        Test that replies extend their parent's path and follow it.
+        """
+        self.assertTrue(Comment.objects.exclude(parent=None).exists())
+        for comment in Comment.objects.select_related('parent'):
+            self.assertTrue(comment.path.endswith(str(comment.pk).zfill(10)))
+            if comment.parent:
+                self.assertEqual(comment.parent.post_id, comment.post_id)
+                self.assertTrue(comment.path.startswith(comment.parent.path))
+                self.assertGreaterEqual(
+                    comment.created_at, comment.parent.created_at
+                )
+
+    def test_same_seed_same_data(self):
+        """
+        Test that seeding again with the same seed repeats the data, with
+        new ids.
+        """
+        def shape(first_post):
+            posts = Post.objects.filter(
+                pk__gte=first_post, pk__lt=first_post + 200).order_by('pk')
+            return [
+                (post.title, post.interactions_count, post.comments_count,
+                 post.shares_count)
+                for post in posts
+            ]
+
+        plan = make_plan(60, 200, followers=5, comments=4, reactions=8,
+                         shares=1, chunk_size=50, prefix='again')
+        self.assertEqual(plan.first_post, self.existing.pk + 201)
+        list(seed(plan))
+        self.assertEqual(shape(plan.first_post),
+                         shape(self.existing.pk + 1))
+        self.assertEqual(reconcile().fixed, 0)
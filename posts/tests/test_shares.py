@@ -0,0 +1,110 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from graphql_jwt.shortcuts import get_token
+from ..models import Post, Share
+
+User = get_user_model()
+
+INBOX_QUERY = """
+    query Inbox($first: Int, $after: String) {
+        sharesInbox(first: $first, after: $after) {
+            edges { node {
+                user { username }
+                post { title user { username } }
+            } }
+            pageInfo { hasNextPage endCursor }
+        }
+    }
+"""
+
+
+class SharesInboxTest(TestCase):
+    """
+    Test the paginated sharesInbox and sharesSent connections.
+    """
+
+    def setUp(self):
+        """
+        Create posts shared by several users with one reader.
+        """
+        self.reader = User.objects.create_user(
+            username='reader', password='pass'
+        )
+        self.senders = [
+            User.objects.create_user(username=f'sender{i}', password='pass')
+            for i in range(3)
+        ]
+        for i in range(9):
+            sender = self.senders[i % 3]
+            post = Post.objects.create(
+                user=sender, title=f'Post {i}', content='content'
+            )
+            Share.objects.create(
+                post=post, user=sender, shared_with=self.reader
+            )
+
+    def execute(self, query, variables=None, user=None):
+        """Post an operation as ``user`` and return (body, queries)."""
+        headers = {}
+        if user is not None:
+            headers['HTTP_AUTHORIZATION'] = f'JWT {get_token(user)}'
+        with CaptureQueriesContext(connection) as queries:
+            body = self.client.post(
+                '/graphql/',
+                json.dumps({'query': query, 'variables': variables or {}}),
+                content_type='application/json',
+                **headers
+            ).json()
+        return body, len(queries)
+
+    def test_inbox_pages_newest_first(self):
+        """
+        Test that walking the inbox returns every share once, newest first.
+        """
+        titles, after = [], None
+        while True:
+            body, _ = self.execute(
+                INBOX_QUERY, {'first': 4, 'after': after}, self.reader
+            )
+            inbox = body['data']['sharesInbox']
+            titles += [e['node']['post']['title'] for e in inbox['edges']]
+            if not inbox['pageInfo']['hasNextPage']:
+                break
+            after = inbox['pageInfo']['endCursor']
+        self.assertEqual(titles, [f'Post {i}' for i in reversed(range(9))])
+
+    def test_query_count_independent_of_page_size(self):
+        """
+        Test that posts and senders are batch loaded per page.
+        """
+        _, small = self.execute(INBOX_QUERY, {'first': 2}, self.reader)
+        body, large = self.execute(INBOX_QUERY, {'first': 9}, self.reader)
+        self.assertEqual(len(body['data']['sharesInbox']['edges']), 9)
+        self.assertEqual(small, large)
+
+    def test_sent_shares(self):
+        """
+        Test that sharesSent only lists the logged-in user's shares.
+        """
+        body, _ = self.execute(
+            '{ sharesSent { edges { node { post { title } } } } }',
+            user=self.senders[0]
+        )
+        titles = [
+            e['node']['post']['title']
+            for e in body['data']['sharesSent']['edges']
+        ]
+        self.assertEqual(titles, ['Post 6', 'Post 3', 'Post 0'])
+
+    def test_requires_authentication(self):
+        """
+        Test that anonymous users can't read an inbox.
+        """
+        body, _ = self.execute(INBOX_QUERY)
+        self.assertEqual(
+            body['errors'][0]['message'], 'Not authenticated!'
+        )
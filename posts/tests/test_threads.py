@@ -0,0 +1,247 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from graphql_jwt.shortcuts import get_token
+from ..models import Post, Comment
+from ..threads import backfill_paths
+
+User = get_user_model()
+
+COMMENTS_QUERY = """
+    query Comments($post: ID!, $first: Int, $after: String, $preview: Int) {
+        commentsForPost(
+            postId: $post, first: $first, after: $after,
+            replyPreview: $preview
+        ) {
+            edges { node {
+                content replyCount
+                replyPreview { content depth user { username } }
+            } }
+            pageInfo { hasNextPage endCursor }
+        }
+    }
+"""
+
+
+class ThreadedCommentsTest(TestCase):
+    """
+    Test threaded comments and the paginated commentsForPost connection.
+    """
+
+    def setUp(self):
+        """
+        Create a post with three threads of replies.
+        """
+        self.user = User.objects.create_user(
+            username='testuser', password='testpass'
+        )
+        self.post = Post.objects.create(
+            user=self.user, title='Post', content='content'
+        )
+        self.threads = []
+        for i in range(3):
+            root = Comment.objects.create(
+                post=self.post, user=self.user, content=f'thread {i}'
+            )
+            self.threads.append(root)
+            for j in range(i * 2):
+                reply = Comment.objects.create(
+                    post=self.post, user=self.user, parent=root,
+                    content=f'reply {i}.{j}'
+                )
+                Comment.objects.create(
+                    post=self.post, user=self.user, parent=reply,
+                    content=f'reply {i}.{j}.0'
+                )
+
+    def execute(self, query, variables, user=None):
+        """Post an operation and return (body, number of queries)."""
+        headers = {}
+        if user is not None:
+            headers['HTTP_AUTHORIZATION'] = f'JWT {get_token(user)}'
+        with CaptureQueriesContext(connection) as queries:
+            body = self.client.post(
+                '/graphql/',
+                json.dumps({'query': query, 'variables': variables}),
+                content_type='application/json',
+                **headers
+            ).json()
+        self.assertNotIn('errors', body)
+        return body['data'], len(queries)
+
+    def test_paths_follow_the_thread(self):
+        """
+        Test that a reply's path extends its parent's path.
+        """
+        reply = self.threads[1].replies.first()
+        nested = reply.replies.get()
+        self.assertTrue(nested.path.startswith(reply.path))
+        self.assertTrue(reply.path.startswith(self.threads[1].path))
+        self.assertEqual(nested.depth, 2)
+
+    def test_top_level_pages_with_reply_preview(self):
+        """
+        Test that threads page oldest first with a bounded reply preview.
+        """
+        data, _ = self.execute(
+            COMMENTS_QUERY, {'post': self.post.id, 'first': 2, 'preview': 3}
+        )
+        page = data['commentsForPost']
+        nodes = [edge['node'] for edge in page['edges']]
+        self.assertEqual(
+            [n['content'] for n in nodes], ['thread 0', 'thread 1']
+        )
+        self.assertEqual(nodes[0]['replyPreview'], [])
+        self.assertEqual(nodes[1]['replyCount'], 4)
+        self.assertEqual(
+            [(r['content'], r['depth']) for r in nodes[1]['replyPreview']],
+            [('reply 1.0', 1), ('reply 1.0.0', 2), ('reply 1.1', 1)]
+        )
+        self.assertTrue(page['pageInfo']['hasNextPage'])
+
+        data, _ = self.execute(COMMENTS_QUERY, {
+            'post': self.post.id, 'first': 2,
+            'after': page['pageInfo']['endCursor'],
+        })
+        nodes = [e['node'] for e in data['commentsForPost']['edges']]
+        self.assertEqual([n['content'] for n in nodes], ['thread 2'])
+        self.assertEqual(nodes[0]['replyCount'], 8)
+
+    def test_query_count_independent_of_page_size(self):
+        """
+        Test that previews and their authors are loaded per page.
+        """
+        _, small = self.execute(
+            COMMENTS_QUERY, {'post': self.post.id, 'first': 2}
+        )
+        _, large = self.execute(
+            COMMENTS_QUERY, {'post': self.post.id, 'first': 3}
+        )
+        self.assertEqual(small, large)
+
+    def test_reply_preview_reads_only_the_preview(self):
+        """
+        Test that previews are limited per thread in SQL instead of
+        reading every reply and dropping the rest.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            data, _ = self.execute(
+                COMMENTS_QUERY, {'post': self.post.id, 'preview': 1}
+            )
+        nodes = [e['node'] for e in data['commentsForPost']['edges']]
+        self.assertEqual(
+            [len(n['replyPreview']) for n in nodes], [0, 1, 1]
+        )
+        self.assertEqual([n['replyCount'] for n in nodes], [0, 4, 8])
+        previews = [
+            q['sql'] for q in queries
+            if '"posts_comment"."content"' in q['sql'] and ' IN (' in q['sql']
+        ]
+        self.assertEqual(len(previews), 1)
+        # Only the two threads with replies are previewed
+        self.assertEqual(previews[0].count('LIMIT 1'), 2)
+
+    def test_comment_thread(self):
+        """
+        Test that commentThread walks a subtree in thread order.
+        """
+        data, _ = self.execute(
+            '''query Thread($id: ID!) {
+                commentThread(commentId: $id, first: 10) {
+                    edges { node { content } }
+                }
+            }''',
+            {'id': self.threads[2].id}
+        )
+        contents = [
+            e['node']['content'] for e in data['commentThread']['edges']
+        ]
+        self.assertEqual(contents, [
+            'reply 2.0', 'reply 2.0.0', 'reply 2.1', 'reply 2.1.0',
+            'reply 2.2', 'reply 2.2.0', 'reply 2.3', 'reply 2.3.0',
+        ])
+
+    def test_reply_and_delete_keep_the_count(self):
+        """
+        Test replying through the API and deleting a whole subtree.
+        """
+        Post.objects.filter(pk=self.post.pk).update(
+            comments_count=Comment.objects.count()
+        )
+        data, _ = self.execute(
+            '''mutation Reply($post: ID!, $parent: ID!) {
+                Post_Comment_Add(
+                    postId: $post, parentId: $parent, content: "hi"
+                ) { success comment { depth parent { id } } }
+            }''',
+            {'post': self.post.id, 'parent': self.threads[0].id},
+            user=self.user
+        )
+        added = data['Post_Comment_Add']
+        self.assertTrue(added['success'])
+        self.assertEqual(added['comment']['depth'], 1)
+
+        self.execute(
+            '''mutation Delete($id: ID!) {
+                Post_Comment_Delete(commentId: $id) { success }
+            }''',
+            {'id': self.threads[2].id}, user=self.user
+        )
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 7)
+        self.assertEqual(Comment.objects.count(), 7)
+
+    def test_backfill_restores_paths(self):
+        """
+        Test that comments written before paths existed get theirs back.
+        """
+        paths = dict(Comment.objects.values_list('pk', 'path'))
+        Comment.objects.update(path='')
+        backfill_paths(batch_size=2)
+        self.assertEqual(dict(Comment.objects.values_list('pk', 'path')),
+                         paths)
+
+    def test_reply_to_comment_without_path(self):
+        """
+        Test that replying to a comment written before paths existed
+        builds the thread's paths first, with both comment mutations.
+        """
+        root = self.threads[1]
+        Comment.objects.filter(post=self.post).update(path='')
+        parent = root.replies.first()
+        variables = {'post': self.post.id, 'parent': parent.id}
+        data, _ = self.execute(
+            '''mutation Reply($post: ID!, $parent: ID!) {
+                Post_Comment_Add(
+                    postId: $post, parentId: $parent, content: "one"
+                ) { comment { depth } }
+            }''',
+            variables, user=self.user
+        )
+        self.assertEqual(data['Post_Comment_Add']['comment']['depth'], 2)
+
+        Comment.objects.filter(post=self.post).update(path='')
+        data, _ = self.execute(
+            '''mutation Replies($post: ID!, $parent: ID!) {
+                Post_Comments_Add(items: [{
+                    postId: $post, parentId: $parent, content: "two"
+                }]) { results { comment { depth } } }
+            }''',
+            variables, user=self.user
+        )
+        result = data['Post_Comments_Add']['results'][0]
+        self.assertEqual(result['comment']['depth'], 2)
+
+        data, _ = self.execute(
+            '''query Thread($id: ID!) {
+                commentThread(commentId: $id) { edges { node { content } } }
+            }''',
+            {'id': root.id}
+        )
+        self.assertEqual(
+            [e['node']['content'] for e in data['commentThread']['edges']],
+            ['reply 1.0', 'two'],
+        )
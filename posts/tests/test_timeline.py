@@ -0,0 +1,158 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from graphql_jwt.shortcuts import get_token
+from users.models import Follow
+from ..models import Post, TimelineEntry
+
+User = get_user_model()
+
+HOME_FEED_QUERY = """
+    query Home($first: Int, $after: String) {
+        homeFeed(first: $first, after: $after) {
+            edges { node { title } }
+            pageInfo { hasNextPage endCursor }
+        }
+    }
+"""
+
+
+@override_settings(
+    BACKGROUND_TASKS_EAGER=True,
+    FEED={'CELEBRITY_FOLLOWER_THRESHOLD': 2},
+)
+class HomeFeedTest(TestCase):
+    """
+    Test follows, fan-out on write and the merged home feed.
+    """
+
+    def setUp(self):
+        """
+        Create a reader, an ordinary author and a celebrity author.
+        """
+        self.reader = User.objects.create_user(
+            username='reader', password='pass'
+        )
+        self.author = User.objects.create_user(
+            username='author', password='pass'
+        )
+        self.celebrity = User.objects.create_user(
+            username='celebrity', password='pass'
+        )
+        fan = User.objects.create_user(username='fan', password='pass')
+        self.execute('mutation { UserFollow(username: "celebrity") '
+                     '{ success } }', user=fan)
+
+    def execute(self, query, user=None, variables=None):
+        """Run a GraphQL operation, optionally as ``user``."""
+        headers = {}
+        if user is not None:
+            headers['HTTP_AUTHORIZATION'] = f'JWT {get_token(user)}'
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                '/graphql/',
+                json.dumps({'query': query, 'variables': variables or {}}),
+                content_type='application/json',
+                **headers
+            )
+        body = response.json()
+        self.assertNotIn('errors', body)
+        return body['data']
+
+    def create_post(self, user, title):
+        """Publish a post through the PostCreate mutation."""
+        self.execute(
+            'mutation($t: String!) { PostCreate(title: $t, content: "c") '
+            '{ success } }',
+            user=user, variables={'t': title}
+        )
+
+    def home_titles(self, first=10, after=None):
+        """Return the titles on one home feed page and its page info."""
+        data = self.execute(
+            HOME_FEED_QUERY, user=self.reader,
+            variables={'first': first, 'after': after}
+        )['homeFeed']
+        titles = [edge['node']['title'] for edge in data['edges']]
+        return titles, data['pageInfo']
+
+    def test_follow_updates_follower_count(self):
+        """
+        Test that follow and unfollow keep followers_count current.
+        """
+        data = self.execute('mutation { UserFollow(username: "author") '
+                            '{ success } }', user=self.reader)
+        self.assertTrue(data['UserFollow']['success'])
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.followers_count, 1)
+
+        self.execute('mutation { UserUnfollow(username: "author") '
+                     '{ success } }', user=self.reader)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.followers_count, 0)
+        self.assertFalse(
+            Follow.objects.filter(follower=self.reader).exists()
+        )
+
+    def test_posts_are_fanned_out_and_celebrities_merged(self):
+        """
+        Test that the feed merges pushed and pulled posts in order.
+        """
+        self.execute('mutation { UserFollow(username: "author") '
+                     '{ success } }', user=self.reader)
+        self.execute('mutation { UserFollow(username: "celebrity") '
+                     '{ success } }', user=self.reader)
+        self.create_post(self.author, 'a1')
+        self.create_post(self.celebrity, 'c1')
+        self.create_post(self.author, 'a2')
+        self.create_post(self.reader, 'r1')
+
+        # The celebrity's post is never pushed to followers
+        self.assertFalse(TimelineEntry.objects.filter(
+            owner=self.reader, post__user=self.celebrity
+        ).exists())
+
+        titles, page_info = self.home_titles(first=3)
+        self.assertEqual(titles, ['r1', 'a2', 'c1'])
+        self.assertTrue(page_info['hasNextPage'])
+        titles, page_info = self.home_titles(after=page_info['endCursor'])
+        self.assertEqual(titles, ['a1'])
+        self.assertFalse(page_info['hasNextPage'])
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        """
+        Test that following copies recent posts and unfollowing drops them.
+        """
+        Post.objects.create(user=self.author, title='old', content='c')
+        self.execute('mutation { UserFollow(username: "author") '
+                     '{ success } }', user=self.reader)
+        self.assertEqual(self.home_titles()[0], ['old'])
+
+        self.execute('mutation { UserUnfollow(username: "author") '
+                     '{ success } }', user=self.reader)
+        self.assertEqual(self.home_titles()[0], [])
+
+    def test_pages_through_tied_timestamps(self):
+        """
+        Test that posts created at the same instant are neither skipped
+        nor repeated between pages.
+        """
+        posts = [
+            Post.objects.create(user=self.author, title=f'p{i}', content='c')
+            for i in range(5)
+        ]
+        Post.objects.filter(user=self.author).update(
+            created_at=posts[0].created_at
+        )
+        self.execute('mutation { UserFollow(username: "author") '
+                     '{ success } }', user=self.reader)
+
+        seen, after = [], None
+        while True:
+            titles, page_info = self.home_titles(first=2, after=after)
+            seen += titles
+            if not page_info['hasNextPage']:
+                break
+            after = page_info['endCursor']
+        self.assertEqual(seen, ['p4', 'p3', 'p2', 'p1', 'p0'])
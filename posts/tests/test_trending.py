@@ -0,0 +1,100 @@
+import json
+import time
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from interactions.models import Interaction
+from ..models import Post, Comment, TrendingScore, TrendingWindow
+from ..trending import rebuild, record_activity, rescale, top_posts
+
+User = get_user_model()
+
+
+@override_settings(TRENDING={'HALF_LIVES': {'hour': 3600}})
+class TrendingTest(TestCase):
+    """
+    Test the incrementally maintained trending ranking.
+    """
+
+    def setUp(self):
+        """
+        Create a few posts and pin the window epoch.
+        """
+        self.user = User.objects.create_user(
+            username='testuser', password='testpass'
+        )
+        self.posts = [
+            Post.objects.create(user=self.user, title=f'{i}', content='c')
+            for i in range(3)
+        ]
+        self.now = time.time()
+        TrendingWindow.objects.update_or_create(
+            name='hour', defaults={'epoch': self.now}
+        )
+
+    def scores(self):
+        """Return the hour scores keyed by post id."""
+        return dict(TrendingScore.objects.filter(
+            window='hour').values_list('post_id', 'score'))
+
+    def test_recent_activity_outranks_older_activity(self):
+        """
+        Test that one fresh event beats one event from two half-lives ago.
+        """
+        old, fresh, quiet = self.posts
+        record_activity(old.id, 'interaction', now=self.now)
+        record_activity(old.id, 'interaction', now=self.now)
+        record_activity(fresh.id, 'interaction', now=self.now + 3 * 3600)
+        self.assertEqual(top_posts('hour', 10), [fresh, old])
+        scores = self.scores()
+        self.assertAlmostEqual(scores[fresh.id] / scores[old.id], 4.0)
+
+    def test_rescale_keeps_order_and_ratios(self):
+        """
+        Test that rescaling changes the scale but not the ranking.
+        """
+        for i, post in enumerate(self.posts):
+            for _ in range(i + 1):
+                record_activity(post.id, 'comment', now=self.now + 7200)
+        before = self.scores()
+        self.assertEqual(
+            rescale(now=self.now + 7200, force=True), ['hour']
+        )
+        after = self.scores()
+        for post in self.posts:
+            self.assertAlmostEqual(after[post.id], before[post.id] / 4)
+
+    def test_rebuild_matches_incremental_scores(self):
+        """
+        Test that the NumPy rebuild reproduces the incremental scores.
+        """
+        first, second, _ = self.posts
+        Interaction.objects.create(
+            user=self.user, post=first, interaction_type='love'
+        )
+        Comment.objects.create(post=second, user=self.user, content='c')
+        record_activity(first.id, 'interaction')
+        record_activity(second.id, 'comment')
+        incremental = self.scores()
+
+        rebuild()
+        rebuilt = self.scores()
+        ratio = incremental[second.id] / incremental[first.id]
+        self.assertAlmostEqual(
+            rebuilt[second.id] / rebuilt[first.id], ratio, places=3
+        )
+
+    def test_trending_posts_query(self):
+        """
+        Test that trendingPosts returns the hottest posts first.
+        """
+        record_activity(self.posts[1].id, 'share', now=self.now)
+        record_activity(self.posts[2].id, 'comment', now=self.now)
+        response = self.client.post(
+            '/graphql/',
+            json.dumps({'query': '{ trendingPosts(window: HOUR, first: 5) '
+                                 '{ title } }'}),
+            content_type='application/json'
+        )
+        titles = [p['title'] for p in response.json()['data']['trendingPosts']]
+        self.assertEqual(titles, ['1', '2'])
@@ -0,0 +1,121 @@
+"""
+Threaded comments.
+
+Every comment stores the materialized path of its thread (the zero-padded
+ids from the top-level comment down to itself), so the descendants of a
+comment are the comments whose path lies strictly between its own path and
+the next path of the same length. Paths only hold digits, so that range is
+ordered the same way by every collation and is one scan of the path index,
+in thread order.
+
+Comments written before comments had paths get theirs from the
+``backfill_paths`` migration hook, or from ``Comment.thread_path`` when
+they are replied to first.
+"""
+from django.db import connections
+from django.db.models import Count, Q
+from django.db.models.functions import Substr
+from .models import PATH_SEGMENT, Comment
+
+DEFAULT_REPLY_PREVIEW = 3
+MAX_REPLY_PREVIEW = 10
+MAX_PATH_LENGTH = Comment._meta.get_field('path').max_length
+
+# Keyset orderings: top-level comments oldest first, threads by path
+TOP_LEVEL_KEYS = ('created_at', 'id')
+THREAD_KEYS = ('path',)
+
+
+def subtree(path):
+    """Return a filter selecting the descendants of the comment at ``path``."""
+    if not path:
+        # Rows bulk inserted without a path have no known subtree
+        return Q(pk__in=[])
+    upper = str(int(path) + 1).zfill(len(path))
+    if len(upper) > len(path):
+        # All nines: nothing sorts after the subtree at this length
+        return Q(path__gt=path)
+    return Q(path__gt=path, path__lt=upper)
+
+
+def backfill_paths(sender=None, using='default', batch_size=1000,
+                   **kwargs):
+    """
+    ``post_migrate`` receiver giving a path to every comment without one,
+    one level of the threads after the other.
+    """
+    if Comment._meta.db_table not in (
+        connections[using].introspection.table_names()
+    ):
+        return
+    comments = Comment.objects.using(using)
+    missing = comments.filter(path='').filter(
+        Q(parent__isnull=True) | ~Q(parent__path='')
+    ).values_list('pk', 'parent__path')
+    while True:
+        batch = list(missing[:batch_size])
+        if not batch:
+            return
+        comments.bulk_update(
+            [
+                Comment(pk=pk, path=(prefix or '') + str(pk).zfill(
+                    PATH_SEGMENT
+                ))
+                for pk, prefix in batch
+            ],
+            ['path'],
+        )
+
+
+def ancestor_ids(path):
+    """Return the ids of the comments above the one at ``path``."""
+    return [
+        int(path[start:start + PATH_SEGMENT])
+        for start in range(0, len(path) - PATH_SEGMENT, PATH_SEGMENT)
+    ]
+
+
+def attach_reply_previews(comments, limit=DEFAULT_REPLY_PREVIEW):
+    """
+    Load the first ``limit`` replies of each thread and count the replies.
+
+    Top-level comments among ``comments`` get ``reply_preview`` (replies in
+    thread order) and ``reply_count`` (all replies in the thread); other
+    comments get an empty preview. Returns the loaded replies.
+
+    Each preview is a ``LIMIT`` on the path range of its thread, so only
+    the previewed replies are read however long the threads are; the
+    counts are a second query answered from the path index alone.
+    """
+    roots = {}
+    for comment in comments:
+        comment.reply_preview, comment.reply_count = [], 0
+        if comment.parent_id is None and comment.path:
+            roots[comment.path] = comment
+    if not roots:
+        return []
+
+    threads = Q()
+    for path in roots:
+        threads |= subtree(path)
+    counts = Comment.objects.filter(threads).annotate(
+        thread=Substr('path', 1, PATH_SEGMENT)
+    ).values_list('thread').annotate(size=Count('*')).order_by()
+    for path, size in counts:
+        roots[path].reply_count = size
+    if limit <= 0:
+        return []
+
+    first_replies = Q()
+    for path, root in roots.items():
+        if root.reply_count:
+            first_replies |= Q(pk__in=Comment.objects.filter(
+                subtree(path)
+            ).order_by('path').values('pk')[:limit])
+    if not first_replies:
+        return []
+
+    preview = list(Comment.objects.filter(first_replies).order_by('path'))
+    for reply in preview:
+        roots[reply.path[:PATH_SEGMENT]].reply_preview.append(reply)
+    return preview
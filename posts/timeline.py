@@ -0,0 +1,129 @@
+"""
+Materialized home timelines (hybrid fan-out).
+
+When an ordinary user posts, the post is pushed into the ``TimelineEntry``
+rows of every follower (fan-out on write). Authors with at least
+``FEED['CELEBRITY_FOLLOWER_THRESHOLD']`` followers are skipped on write;
+their newest posts are pulled and merged in when a feed is read. A feed page
+therefore costs two bounded range scans, however many accounts the reader
+follows.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from users.models import Follow
+from core.pagination import FEED_KEYS, Page, keyset_condition, page_size
+from .models import Post, TimelineEntry
+
+User = get_user_model()
+
+DEFAULTS = {
+    'CELEBRITY_FOLLOWER_THRESHOLD': 10000,
+    'FANOUT_BATCH_SIZE': 1000,
+    'BACKFILL_POSTS': 50,
+}
+
+
+def feed_setting(name):
+    """Return a ``FEED`` setting, falling back to the default."""
+    return getattr(settings, 'FEED', {}).get(name, DEFAULTS[name])
+
+
+def is_celebrity(user):
+    """Whether posts by ``user`` are merged at read time."""
+    threshold = feed_setting('CELEBRITY_FOLLOWER_THRESHOLD')
+    return user.followers_count >= threshold
+
+
+def fan_out_post(post_id):
+    """Push a new post into its author's and followers' timelines."""
+    post = Post.objects.select_related('user').filter(id=post_id).first()
+    if post is None:
+        return
+
+    entry = dict(post_id=post.id, created_at=post.created_at)
+    # Authors always see their own posts in their home feed
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(owner_id=post.user_id, **entry)],
+        ignore_conflicts=True
+    )
+    if is_celebrity(post.user):
+        return
+
+    batch_size = feed_setting('FANOUT_BATCH_SIZE')
+    followers = Follow.objects.filter(followee_id=post.user_id).order_by(
+        'follower_id'
+    ).values_list('follower_id', flat=True)
+
+    last_id = 0
+    while True:
+        batch = list(followers.filter(follower_id__gt=last_id)[:batch_size])
+        if not batch:
+            break
+        TimelineEntry.objects.bulk_create(
+            [TimelineEntry(owner_id=owner, **entry) for owner in batch],
+            ignore_conflicts=True
+        )
+        last_id = batch[-1]
+
+
+def backfill_timeline(follower_id, followee_id):
+    """Copy a newly followed user's recent posts into the timeline."""
+    followee = User.objects.filter(id=followee_id).first()
+    if followee is None or is_celebrity(followee):
+        return
+
+    recent = Post.objects.filter(user_id=followee_id).values_list(
+        'id', 'created_at'
+    )[:feed_setting('BACKFILL_POSTS')]
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(owner_id=follower_id, post_id=pk, created_at=at)
+            for pk, at in recent
+        ],
+        ignore_conflicts=True
+    )
+
+
+def prune_timeline(follower_id, followee_id):
+    """Remove an unfollowed user's posts from the timeline."""
+    TimelineEntry.objects.filter(
+        owner_id=follower_id, post__user_id=followee_id
+    ).delete()
+
+
+def home_feed(user, first=None, seek=None):
+    """
+    Return a ``Page`` of ``user``'s home feed, newest first.
+
+    ``seek`` holds the decoded ``(created_at, id)`` of the last post of the
+    previous page.
+    """
+    size = page_size(first)
+
+    entries = TimelineEntry.objects.filter(owner=user).order_by(
+        '-created_at', '-post_id'
+    )
+    if seek:
+        entries = entries.filter(
+            keyset_condition(('created_at', 'post_id'), seek)
+        )
+    pushed = list(entries.values_list('post_id', flat=True)[:size + 1])
+
+    # Celebrity posts are pulled instead of pushed
+    celebrities = Follow.objects.filter(
+        follower=user,
+        followee__followers_count__gte=feed_setting(
+            'CELEBRITY_FOLLOWER_THRESHOLD'
+        ),
+    ).values('followee_id')
+    pulled = Post.objects.filter(user_id__in=celebrities)
+    if seek:
+        pulled = pulled.filter(keyset_condition(FEED_KEYS, seek))
+
+    posts = {post.id: post for post in pulled[:size + 1]}
+    posts.update(Post.objects.in_bulk(pushed))
+    rows = sorted(
+        posts.values(), key=lambda post: (post.created_at, post.id),
+        reverse=True
+    )
+    return Page(rows[:size], FEED_KEYS, len(rows) > size, bool(seek))
@@ -0,0 +1,197 @@
+"""
+Incrementally maintained, time-decayed trending ranking.
+
+Each activity on a post (reaction, comment, share) adds
+``weight * 2 ** ((now - epoch) / half_life)`` to the post's score in every
+window. Because all scores of a window share the same epoch, ordering by the
+stored score is the same as ordering by the score decayed to "now", so the
+top-K read is a single range scan over the ``(window, -score)`` index and no
+aggregation over the activity tables ever happens on the read path.
+
+Scores double every half-life, so ``rescale`` periodically moves the epoch
+forward and multiplies the window's scores down by the same factor. An event
+whose UPDATE races a rescale can be over-weighted once; ``rebuild`` recomputes
+every score from the activity history (vectorized with NumPy) and is the
+repair path for that or for changed weights.
+"""
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import (
+    Case, ExpressionWrapper, F, FloatField, OuterRef, Subquery, Value, When
+)
+from django.db.models.functions import Power
+from core.response_cache import invalidate
+from interactions.models import Interaction
+from .models import Comment, Share, TrendingScore, TrendingWindow
+
+DEFAULTS = {
+    'HALF_LIVES': {'hour': 3600, 'day': 86400, 'week': 604800},
+    'WEIGHTS': {'interaction': 1.0, 'comment': 2.0, 'share': 3.0},
+    'RESCALE_HALF_LIVES': 64,
+    'HISTORY_HALF_LIVES': 20,
+    'PRUNE_BELOW': 1e-3,
+    'BATCH_SIZE': 5000,
+}
+
+
+def trending_setting(name):
+    """Return a ``TRENDING`` setting, falling back to the default."""
+    return getattr(settings, 'TRENDING', {}).get(name, DEFAULTS[name])
+
+
+def ensure_windows(now=None):
+    """Create the epoch row of every configured window."""
+    now = time.time() if now is None else now
+    for name in trending_setting('HALF_LIVES'):
+        TrendingWindow.objects.get_or_create(
+            name=name, defaults={'epoch': now}
+        )
+
+
+def install_trending(sender, using='default', **kwargs):
+    """``post_migrate`` receiver creating the window rows."""
+    ensure_windows()
+
+
+def record_activity(post_id, kind, now=None, count=1):
+    """Add ``count`` events of ``kind`` on ``post_id`` to every window."""
+    now = time.time() if now is None else now
+    weight = trending_setting('WEIGHTS')[kind] * count
+    half_life = Case(
+        *[
+            When(window=name, then=Value(float(seconds)))
+            for name, seconds in trending_setting('HALF_LIVES').items()
+        ],
+        output_field=FloatField(),
+    )
+    epoch = Subquery(
+        TrendingWindow.objects.filter(name=OuterRef('window')).values(
+            'epoch'
+        )[:1]
+    )
+    increment = ExpressionWrapper(
+        F('score') + Value(weight) * Power(
+            Value(2.0), (Value(now) - epoch) / half_life
+        ),
+        output_field=FloatField(),
+    )
+
+    scores = TrendingScore.objects.filter(post_id=post_id)
+    if not scores.update(score=increment):
+        # First activity on the post: create its rows, then add to them
+        TrendingScore.objects.bulk_create(
+            [
+                TrendingScore(post_id=post_id, window=name)
+                for name in trending_setting('HALF_LIVES')
+            ],
+            ignore_conflicts=True,
+        )
+        scores.update(score=increment)
+
+
+def top_posts(window, limit):
+    """Return the ``limit`` highest scoring posts of ``window``."""
+    scores = TrendingScore.objects.filter(window=window).select_related(
+        'post'
+    ).order_by('-score')[:limit]
+    return [score.post for score in scores]
+
+
+def rescale(now=None, force=False):
+    """
+    Move each window's epoch to ``now`` once its scores have grown by more
+    than ``2 ** RESCALE_HALF_LIVES``, and drop scores that decayed to noise.
+    """
+    now = time.time() if now is None else now
+    ensure_windows(now)
+    rescaled = []
+    for name, seconds in trending_setting('HALF_LIVES').items():
+        with transaction.atomic():
+            state = TrendingWindow.objects.select_for_update().get(name=name)
+            half_lives = (now - state.epoch) / seconds
+            limit = trending_setting('RESCALE_HALF_LIVES')
+            if not force and half_lives < limit:
+                continue
+
+            scores = TrendingScore.objects.filter(window=name)
+            scores.update(score=F('score') * 2.0 ** -half_lives)
+            scores.filter(score__lt=trending_setting('PRUNE_BELOW')).delete()
+            state.epoch = now
+            state.save(update_fields=['epoch'])
+            rescaled.append(name)
+    return rescaled
+
+
+def activity_arrays(since):
+    """
+    Return ``(post ids, unix times, weights)`` of all activity since
+    ``since`` as NumPy arrays.
+    """
+    weights = trending_setting('WEIGHTS')
+    sources = [
+        (Interaction.objects, weights['interaction']),
+        (Comment.objects, weights['comment']),
+        (Share.objects, weights['share']),
+    ]
+    post_ids, times, scale = [], [], []
+    for manager, weight in sources:
+        rows = manager.filter(created_at__gte=since).order_by().values_list(
+            'post_id', 'created_at'
+        ).iterator(chunk_size=trending_setting('BATCH_SIZE'))
+        ids, stamps = [], []
+        for post_id, created_at in rows:
+            ids.append(post_id)
+            stamps.append(created_at.timestamp())
+        post_ids.append(np.asarray(ids, dtype=np.int64))
+        times.append(np.asarray(stamps, dtype=np.float64))
+        scale.append(np.full(len(ids), weight, dtype=np.float64))
+    return (
+        np.concatenate(post_ids), np.concatenate(times),
+        np.concatenate(scale),
+    )
+
+
+def decayed_totals(post_ids, times, weights, epoch, half_life):
+    """Sum each post's decayed activity relative to ``epoch``."""
+    contributions = weights * np.exp2((times - epoch) / half_life)
+    unique_ids, inverse = np.unique(post_ids, return_inverse=True)
+    totals = np.bincount(inverse, weights=contributions)
+    return unique_ids, totals
+
+
+def rebuild(now=None):
+    """Recompute every window's scores from the activity history."""
+    now = time.time() if now is None else now
+    half_lives = trending_setting('HALF_LIVES')
+    horizon = trending_setting('HISTORY_HALF_LIVES') * max(
+        half_lives.values()
+    )
+    post_ids, times, weights = activity_arrays(
+        datetime.fromtimestamp(now - horizon, tz=timezone.utc)
+    )
+
+    for name, seconds in half_lives.items():
+        keep = times >= now - trending_setting('HISTORY_HALF_LIVES') * seconds
+        unique_ids, totals = decayed_totals(
+            post_ids[keep], times[keep], weights[keep], now, seconds
+        )
+        significant = totals >= trending_setting('PRUNE_BELOW')
+        unique_ids, totals = unique_ids[significant], totals[significant]
+        with transaction.atomic():
+            TrendingWindow.objects.update_or_create(
+                name=name, defaults={'epoch': now}
+            )
+            TrendingScore.objects.filter(window=name).delete()
+            TrendingScore.objects.bulk_create(
+                (
+                    TrendingScore(post_id=int(pk), window=name,
+                                  score=float(total))
+                    for pk, total in zip(unique_ids, totals)
+                ),
+                batch_size=trending_setting('BATCH_SIZE'),
+            )
+            invalidate('trending')
@@ -1,3 +1,172 @@
-from django.shortcuts import render
+"""
+Serving of media files.
 
-# Create your views here.
+Content-addressed files (see ``posts.storage``) never change, so they get a
+strong ETag taken from their name and are cached as immutable; other files
+get an ETag from their modification time and size and must be revalidated.
+Depending on the ``MEDIA_SERVING`` setting the file is sent by Django
+(``FileResponse``, which uses the server's ``sendfile`` when it can, or a
+206 response for a byte range) or handed to the web server with
+``X-Sendfile`` / ``X-Accel-Redirect``, which then deals with ranges itself.
+"""
+import mimetypes
+import os
+import re
+import stat
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import (
+    FileResponse, Http404, HttpResponse, HttpResponseNotModified,
+    StreamingHttpResponse,
+)
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_etags
+from django.views.decorators.http import require_safe
+from .storage import content_digest
+
+DEFAULTS = {
+    'BACKEND': 'django',
+    'ACCEL_REDIRECT_PREFIX': '/protected-media/',
+    # One year, the longest lifetime caches are expected to honour
+    'MAX_AGE': 31536000,
+    'CHUNK_SIZE': 64 * 1024,
+}
+
+BYTE_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def media_setting(name):
+    """Return a ``MEDIA_SERVING`` setting, or its default."""
+    return getattr(settings, 'MEDIA_SERVING', {}).get(name, DEFAULTS[name])
+
+
+def parse_range(header, size):
+    """
+    Return the ``(start, end)`` byte positions (inclusive) requested by a
+    ``Range`` header, or ``None`` to send the whole file. Multiple ranges
+    are not supported and get the whole file, which the RFC allows.
+    Raises ``ValueError`` when the range lies past the end of the file.
+    """
+    match = BYTE_RANGE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first:
+        # Suffix range: the last ``last`` bytes
+        if not last:
+            return None
+        length = int(last)
+        if not length or not size:
+            raise ValueError(header)
+        return max(size - length, 0), size - 1
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise ValueError(header)
+    end = int(last) if last else size - 1
+    return start, min(end, size - 1)
+
+
+def read_range(path, start, length, chunk_size):
+    """Yield ``length`` bytes of the file at ``path`` from ``start``."""
+    with open(path, 'rb') as source:
+        source.seek(start)
+        while length > 0:
+            chunk = source.read(min(chunk_size, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def etag_matches(header, etag):
+    """Weak comparison of ``etag`` with an ``If-None-Match`` header."""
+    etags = parse_etags(header)
+    return '*' in etags or etag in [tag.removeprefix('W/') for tag in etags]
+
+
+@require_safe
+def serve_media(request, path):
+    """Serve the file at ``path`` under ``MEDIA_ROOT``."""
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+        info = os.stat(full_path)
+    except (SuspiciousFileOperation, OSError):
+        raise Http404("Media file not found.")
+    if not stat.S_ISREG(info.st_mode):
+        raise Http404("Media file not found.")
+
+    digest = content_digest(path)
+    if digest is not None:
+        etag = f'"{digest}"'
+        cache_control = (
+            f"public, max-age={media_setting('MAX_AGE')}, immutable"
+        )
+    else:
+        etag = f'"{info.st_mtime_ns:x}-{info.st_size:x}"'
+        cache_control = 'public, no-cache'
+    headers = {
+        'ETag': etag,
+        'Cache-Control': cache_control,
+        'Last-Modified': http_date(info.st_mtime),
+    }
+
+    if etag_matches(request.headers.get('If-None-Match', ''), etag):
+        response = HttpResponseNotModified()
+        for header, value in headers.items():
+            response[header] = value
+        return response
+
+    content_type, encoding = mimetypes.guess_type(full_path)
+    content_type = content_type or 'application/octet-stream'
+    backend = media_setting('BACKEND')
+    if backend in ('x-sendfile', 'x-accel-redirect'):
+        response = HttpResponse(content_type=content_type)
+        if backend == 'x-sendfile':
+            response['X-Sendfile'] = full_path
+        else:
+            response['X-Accel-Redirect'] = (
+                media_setting('ACCEL_REDIRECT_PREFIX') + quote(path)
+            )
+    else:
+        response = file_response(request, full_path, info.st_size, etag,
+                                 content_type)
+
+    for header, value in headers.items():
+        response[header] = value
+    response['Accept-Ranges'] = 'bytes'
+    if encoding:
+        response['Content-Encoding'] = encoding
+    return response
+
+
+def file_response(request, full_path, size, etag, content_type):
+    """Return the whole file, or the byte range the request asks for."""
+    byte_range = None
+    header = request.headers.get('Range')
+    # A stale If-Range validator means the client wants the whole file
+    if header and request.headers.get('If-Range', etag) == etag:
+        try:
+            byte_range = parse_range(header, size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+    if byte_range is None:
+        return FileResponse(
+            open(full_path, 'rb'), content_type=content_type
+        )
+
+    start, end = byte_range
+    length = end - start + 1
+    response = StreamingHttpResponse(
+        read_range(full_path, start, length, media_setting('CHUNK_SIZE')),
+        status=206, content_type=content_type,
+    )
+    response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Content-Length'] = str(length)
+    return response
@@ -4,3 +4,13 @@ from django.apps import AppConfig
 class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'users'
+
+    def ready(self):
+        from django.contrib.auth.signals import user_logged_out
+        from django.db.models.signals import post_delete, post_save
+        from core.auth import user_changed, user_logged_out as logged_out
+        from .models import CustomUser
+
+        post_save.connect(user_changed, sender=CustomUser)
+        post_delete.connect(user_changed, sender=CustomUser)
+        user_logged_out.connect(logged_out)
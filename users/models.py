@@ -3,4 +3,44 @@ from django.db import models
 
 
 class CustomUser(AbstractUser):
-    pass
+    """
+    Application user.
+
+    Attributes:
+        followers_count (PositiveIntegerField):
+                        A count of users following this user.
+    """
+    followers_count = models.PositiveIntegerField(default=0)
+
+
+class Follow(models.Model):
+    """
+    Represents one user following another.
+
+    Attributes:
+        follower (ForeignKey): The user who follows.
+        followee (ForeignKey): The user being followed.
+        created_at (DateTimeField): Timestamp when the follow was created.
+    """
+    follower = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='following'
+    )
+    followee = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='followers'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        # A user can follow another user only once
+        unique_together = ('follower', 'followee')
+        indexes = [
+            models.Index(fields=['followee']),
+        ]
+
+    def __str__(self):
+        return f"{self.follower.username} follows {self.followee.username}"
@@ -3,8 +3,14 @@ from django.contrib.auth import get_user_model
 from graphql_jwt.shortcuts import get_token
 from .types import UserType
 from django.core.exceptions import ValidationError
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction
+from django.db.models import F
 import graphql_jwt
+from core.auth import forget_user
+from core.background import submit
+from core.response_cache import invalidate, tag_for
+from posts.timeline import backfill_timeline, prune_timeline
+from ..models import Follow
 
 User = get_user_model()
 
@@ -87,6 +93,92 @@ class LoginUser(graphene.Mutation):
         )
 
 
+class FollowUser(graphene.Mutation):
+    """ Mutation to follow another user."""
+
+    success = graphene.Boolean()
+    error = graphene.String()
+
+    class Arguments:
+        username = graphene.String(required=True)
+
+    def mutate(self, info, username):
+        user = info.context.user
+        if not user.is_authenticated:
+            return FollowUser(success=False, error="User must be logged in.")
+
+        followee = User.objects.filter(username=username).first()
+        if not followee:
+            return FollowUser(success=False, error="User  not found.")
+        if followee.pk == user.pk:
+            return FollowUser(
+                    success=False,
+                    error="Users cannot follow themselves."
+            )
+
+        with transaction.atomic():
+            _, created = Follow.objects.get_or_create(
+                    follower=user,
+                    followee=followee
+            )
+            if not created:
+                return FollowUser(
+                        success=False,
+                        error="User is already followed."
+                )
+            User.objects.filter(pk=followee.pk).update(
+                    followers_count=F('followers_count') + 1
+            )
+            invalidate(tag_for(User, followee.pk))
+            forget_user(followee)
+
+        # Fill the timeline with the followee's recent posts
+        submit(backfill_timeline, user.pk, followee.pk)
+        return FollowUser(success=True, error=None)
+
+
+class UnfollowUser(graphene.Mutation):
+    """ Mutation to stop following a user."""
+
+    success = graphene.Boolean()
+    error = graphene.String()
+
+    class Arguments:
+        username = graphene.String(required=True)
+
+    def mutate(self, info, username):
+        user = info.context.user
+        if not user.is_authenticated:
+            return UnfollowUser(
+                    success=False,
+                    error="User must be logged in."
+            )
+
+        followee = User.objects.filter(username=username).first()
+        if not followee:
+            return UnfollowUser(success=False, error="User  not found.")
+
+        with transaction.atomic():
+            deleted, _ = Follow.objects.filter(
+                    follower=user,
+                    followee=followee
+            ).delete()
+            if not deleted:
+                return UnfollowUser(
+                        success=False,
+                        error="User is not followed."
+                )
+            User.objects.filter(pk=followee.pk).update(
+                    followers_count=F('followers_count') - 1
+            )
+            invalidate(tag_for(User, followee.pk))
+            forget_user(followee)
+
+        # Drop the followee's posts from the timeline
+        submit(prune_timeline, user.pk, followee.pk)
+        return UnfollowUser(success=True, error=None)
+
+
 class Mutation(graphene.ObjectType):
     token_auth = graphql_jwt.ObtainJSONWebToken.Field()
     verify_token = graphql_jwt.Verify.Field()
@@ -94,3 +186,5 @@ class Mutation(graphene.ObjectType):
 
     create_user = CreateUser.Field(name="UserCreate")
     login_user = LoginUser.Field(name="UserToken")
+    follow_user = FollowUser.Field(name="UserFollow")
+    unfollow_user = UnfollowUser.Field(name="UserUnfollow")
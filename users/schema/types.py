@@ -1,5 +1,8 @@
 from graphene_django.types import DjangoObjectType
 from django.contrib.auth import get_user_model
+from core.loaders import get_loaders
+from interactions.models import Interaction
+from posts.models import Post, Comment, Share
 
 User = get_user_model()
 
@@ -7,3 +10,18 @@ User = get_user_model()
 class UserType(DjangoObjectType):
     class Meta:
         model = User
+
+    def resolve_posts(self, info):
+        return get_loaders(info).related(Post, 'user').load(self)
+
+    def resolve_comments(self, info):
+        return get_loaders(info).related(Comment, 'user').load(self)
+
+    def resolve_sent_shares(self, info):
+        return get_loaders(info).related(Share, 'user').load(self)
+
+    def resolve_received_shares(self, info):
+        return get_loaders(info).related(Share, 'shared_with').load(self)
+
+    def resolve_interactions(self, info):
+        return get_loaders(info).related(Interaction, 'user').load(self)